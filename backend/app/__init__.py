@@ -19,12 +19,57 @@ def create_app(config_name='default'):
     # Inicialização das extensões com a aplicação
     db.init_app(app)
     jwt.init_app(app)
+
+    # Contagem de SQL por requisição (headers de debug e log de requisições lentas)
+    from app import instrumentation
+    instrumentation.init_app(app)
+
+    # Métricas Prometheus (/api/metrics)
+    from app import metrics
+    metrics.init_app(app)
+
+    # Profiling sob demanda para administradores
+    from app import profiling
+    profiling.init_app(app)
+
+    # Log de consultas lentas com EXPLAIN
+    from app import slow_queries
+    slow_queries.init_app(app)
+
+    # Cache de representações com invalidação por tags
+    from app import cache
+    cache.init_app(app)
+
+    # Repasse das invalidações do cache para os demais workers
+    from app import barramento
+    barramento.init_app(app)
+
+    # Respostas gravadas por Idempotency-Key
+    from app import idempotencia
+    idempotencia.init_app(app)
+
+    # Rotação de refresh tokens e revogação de JWT
+    from app import revogacao
+    revogacao.init_app(app)
+
+    # Limite de requisições no login, registro e entrada em turma
+    from app import limites
+    limites.init_app(app)
+
+    # Estatísticas das turmas mantidas incrementalmente (e o verificador)
+    from app import estatisticas
+    estatisticas.init_app(app)
+
+    # Eventos dos alunos para o stream SSE do professor
+    from app import eventos
+    eventos.init_app(app)
+
     # Configuração mais específica do CORS
     CORS(app,
          resources={r"/api/*": {"origins": "*"}},
          supports_credentials=True,
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization"])
+         allow_headers=["Content-Type", "Authorization", "Idempotency-Key"])
     # Handler global para ignorar JWT no preflight (OPTIONS)
     @jwt.unauthorized_loader
     def custom_unauthorized_response(err_str):
@@ -42,6 +87,12 @@ def create_app(config_name='default'):
         if request.method == 'OPTIONS':
             return '', 200
         return jsonify({'message': 'Token expired'}), 401
+
+    @jwt.revoked_token_loader
+    def custom_revoked_token_response(jwt_header, jwt_payload):
+        if request.method == 'OPTIONS':
+            return '', 200
+        return jsonify({'message': 'Token revoked'}), 401
     # Registro dos blueprints
     from app.resources.auth import auth_bp
     from app.resources.user import user_bp
@@ -50,6 +101,7 @@ def create_app(config_name='default'):
     from app.resources.professor import professor_bp
     from app.resources.turma import turma_bp
     from app.resources.teste_likert import teste_likert_bp
+    from app.resources.batch import batch_bp
     
     @app.after_request
     def after_request(response):
@@ -66,14 +118,13 @@ def create_app(config_name='default'):
     app.register_blueprint(professor_bp, url_prefix='/api/professor')
     app.register_blueprint(turma_bp, url_prefix='/api/turma')
     app.register_blueprint(teste_likert_bp, url_prefix='/api/teste-likert')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
 
     # Rota de teste para verificar se a API está funcionando
     @app.route('/api/ping', methods=['GET'])
     def ping():
         return {'message': 'API HUMANIQ esta online!'}, 200
 
-    # Criação das tabelas do banco de dados
-    with app.app_context():
-        db.create_all()
-
-    return app
\ No newline at end of file
+    # O schema e os dados iniciais são criados uma única vez pelo bootstrap.py,
+    # fora dos workers, para não atrasar a inicialização de cada processo.
+    return app
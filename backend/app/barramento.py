@@ -0,0 +1,213 @@
+"""
+Barramento de invalidação entre workers (e entre máquinas).
+
+O cache local (app/cache.py) e o catálogo (app/catalogo.py) ficam em memória
+em cada worker: sem aviso, um desafio editado pelo worker A continuaria sendo
+servido na versão antiga pelo worker B até o TTL expirar. O barramento repassa
+as tags invalidadas por `invalidar_tags` a todos os processos:
+
+- Postgres: no before_commit a transação executa pg_notify com as tags. O
+  Postgres só entrega a notificação se houver commit, e cada worker mantém uma
+  conexão dedicada em LISTEN, acordada na hora.
+- SQLite (e outros bancos): as tags viram uma linha de invalidacoes_cache,
+  gravada na mesma transação da escrita, e cada worker consulta as linhas novas
+  a cada CACHE_BUS_POLL_INTERVAL segundos. Linhas mais antigas que
+  CACHE_BUS_RETENCAO segundos são removidas pelos próprios workers.
+
+Quem invalidou já aplicou as tags no after_commit e ignora as próprias
+mensagens. Se o worker fica sem ouvir (conexão perdida), descarta o cache local
+ao voltar. CACHE_BUS=false desativa o barramento (ex.: um único processo).
+"""
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, select as sql_select, text
+from sqlalchemy.orm import Session
+from app import db
+from app.cache import cache, TODAS
+from app.warmup import registrar_aquecimento
+
+CANAL = 'humaniq_invalidacao'
+LIMITE_PAYLOAD = 7900  # o pg_notify aceita até 8000 bytes
+LIMITE_POR_LEITURA = 500
+
+logger = logging.getLogger(__name__)
+
+_ativo = False
+_ouvinte = None
+_lock = threading.Lock()
+_origem = (None, None)
+
+
+def origem():
+    """Identificador deste processo nas mensagens (muda após o fork do worker)"""
+    global _origem
+    pid = os.getpid()
+    if _origem[0] != pid:
+        _origem = (pid, f'{socket.gethostname()[:50]}:{pid}:{uuid.uuid4().hex[:8]}')
+    return _origem[1]
+
+
+@event.listens_for(Session, 'before_commit')
+def _publicar(session):
+    tags = session.info.get('tags_invalidadas')
+    if not _ativo or not tags:
+        return
+    if session.get_bind().dialect.name == 'postgresql':
+        payload = json.dumps({'o': origem(), 't': sorted(tags)})
+        if len(payload) > LIMITE_PAYLOAD:
+            payload = json.dumps({'o': origem(), 't': [TODAS]})
+        session.execute(text('SELECT pg_notify(:canal, :payload)'), {'canal': CANAL, 'payload': payload})
+    else:
+        from app.models import InvalidacaoCache
+        session.execute(InvalidacaoCache.__table__.insert().values(
+            tags=sorted(tags), origem=origem(), data_criacao=datetime.utcnow()
+        ))
+
+
+def _aplicar(mensagens):
+    """Reaplica as tags de [(origem, tags)] vindas de outros processos"""
+    propria = origem()
+    tags = set()
+    for origem_mensagem, tags_mensagem in mensagens:
+        if origem_mensagem != propria:
+            tags.update(tags_mensagem)
+    if TODAS in tags:
+        cache.limpar_local()
+    elif tags:
+        cache.aplicar_remotas(tags)
+
+
+class Ouvinte(threading.Thread):
+    """Thread do worker que recebe as invalidações dos demais processos"""
+
+    def __init__(self, app):
+        super().__init__(name='barramento-invalidacao', daemon=True)
+        self.app = app
+        self.pid = os.getpid()
+        self.intervalo = app.config['CACHE_BUS_POLL_INTERVAL']
+        self.retencao = app.config['CACHE_BUS_RETENCAO']
+        self.postgres = None
+        self.conexao = None
+        self.ultimo_id = None
+        self.proxima_limpeza = 0
+
+    @property
+    def pronto(self):
+        return self.conexao is not None if self.postgres else self.ultimo_id is not None
+
+    def preparar(self):
+        """Começa a ouvir a partir de agora (LISTEN no Postgres, último id no SQLite)"""
+        self.postgres = db.engine.dialect.name == 'postgresql'
+        if self.postgres:
+            conexao = db.engine.raw_connection()
+            conexao.detach()  # conexão dedicada: não volta para o pool
+            conexao = conexao.driver_connection
+            conexao.autocommit = True
+            with conexao.cursor() as cursor:
+                cursor.execute(f'LISTEN {CANAL}')
+            self.conexao = conexao
+        else:
+            from app.models import InvalidacaoCache
+            with db.engine.connect() as conn:
+                self.ultimo_id = conn.execute(sql_select(func.max(InvalidacaoCache.id))).scalar() or 0
+
+    def run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    if not self.pronto:
+                        self.preparar()
+                        # O que chegou enquanto não ouvia se perdeu
+                        cache.limpar_local()
+                    if self.postgres:
+                        self._receber_notificacoes()
+                    else:
+                        self._consultar_tabela()
+            except Exception:
+                logger.exception('Barramento de invalidação: nova tentativa em %s s', self.intervalo)
+                self._fechar()
+                time.sleep(self.intervalo)
+
+    def _receber_notificacoes(self):
+        while True:
+            if select.select([self.conexao], [], [], self.intervalo)[0]:
+                self.conexao.poll()
+                mensagens = [json.loads(n.payload) for n in self.conexao.notifies]
+                del self.conexao.notifies[:]
+                _aplicar([(m['o'], m['t']) for m in mensagens])
+
+    def _consultar_tabela(self):
+        from app.models import InvalidacaoCache
+
+        tabela = InvalidacaoCache.__table__
+        while True:
+            time.sleep(self.intervalo)
+            with db.engine.connect() as conn:
+                linhas = conn.execute(
+                    sql_select(tabela.c.id, tabela.c.origem, tabela.c.tags)
+                    .where(tabela.c.id > self.ultimo_id)
+                    .order_by(tabela.c.id)
+                    .limit(LIMITE_POR_LEITURA)
+                ).all()
+                if time.monotonic() >= self.proxima_limpeza:
+                    self._limpar_antigas(conn, tabela)
+            if linhas:
+                _aplicar([(linha.origem, linha.tags) for linha in linhas])
+                self.ultimo_id = linhas[-1].id
+
+    def _limpar_antigas(self, conn, tabela):
+        limite = datetime.utcnow() - timedelta(seconds=self.retencao)
+        # Mantém a linha mais recente: sem ela o SQLite reaproveitaria ids já lidos
+        maior_id = sql_select(func.max(tabela.c.id)).scalar_subquery()
+        conn.execute(tabela.delete().where(tabela.c.data_criacao < limite, tabela.c.id < maior_id))
+        conn.commit()
+        self.proxima_limpeza = time.monotonic() + 60
+
+    def _fechar(self):
+        if self.conexao is not None:
+            try:
+                self.conexao.close()
+            except Exception:
+                pass
+            self.conexao = None
+
+
+def iniciar_ouvinte(app):
+    """Inicia, uma vez por processo, a thread que recebe as invalidações dos outros workers"""
+    global _ouvinte
+    if not _ativo or (_ouvinte is not None and _ouvinte.pid == os.getpid()):
+        return
+    with _lock:
+        if _ouvinte is not None and _ouvinte.pid == os.getpid():
+            return
+        ouvinte = Ouvinte(app)
+        try:
+            # Antes de devolver: nada que este worker guardar depois fica sem aviso
+            with app.app_context():
+                ouvinte.preparar()
+        except Exception:
+            logger.exception('Barramento de invalidação indisponível; a thread tentará de novo')
+        ouvinte.start()
+        _ouvinte = ouvinte
+
+
+@registrar_aquecimento
+def iniciar_no_aquecimento():
+    # Registrado antes dos caches: começa a ouvir antes de eles se popularem
+    iniciar_ouvinte(current_app._get_current_object())
+
+
+def init_app(app):
+    global _ativo
+    _ativo = app.config['CACHE_BUS']
+    # Workers sem aquecimento (ou fora do gunicorn) iniciam na primeira requisição
+    app.before_request(lambda: iniciar_ouvinte(app))
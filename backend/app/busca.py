@@ -0,0 +1,137 @@
+"""
+Busca de alunos nas turmas de um professor por nome ou email.
+
+O termo casa com prefixos e com trechos do nome ou do email, sem diferenciar
+maiúsculas. Os resultados vêm ordenados por relevância (nome igual ao termo,
+nome começando por ele, palavra do nome começando por ele, email começando por
+ele, trecho em qualquer posição) e depois por nome.
+
+- Postgres: índices GIN com pg_trgm em lower(nome) e lower(email), usados pelo
+  LIKE '%termo%'.
+- SQLite: tabela FTS5 usuarios_busca com tokenizer trigram, mantida por
+  triggers em usuarios; o termo vira uma frase do MATCH.
+
+No SQLite o caminho é escolhido pelo custo. Com até BUSCA_VARREDURA_MAX_ALUNOS
+alunos nas turmas do professor (contados em turma_stats), percorrer esses
+alunos pelo índice turma_id de usuarios custa pouco. Acima disso, o FTS5 só é
+usado se o termo casar com menos usuários do que o professor tem de alunos (a
+contagem para nesse limite). Um termo comum, como o domínio do email, casaria
+com a escola inteira. O Postgres faz essa escolha pelas próprias estatísticas.
+Com menos de 3 caracteres não há trigrama, e a busca fica só nos prefixos,
+também entre os alunos do professor.
+"""
+from flask import current_app
+from sqlalchemy import case, func, literal_column, select, text
+from app import db
+
+TAMANHO_TRIGRAMA = 3
+
+DDL_POSTGRES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_usuarios_nome_trgm ON usuarios USING gin (lower(nome) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_usuarios_email_trgm ON usuarios USING gin (lower(email) gin_trgm_ops)',
+)
+
+DDL_SQLITE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS usuarios_busca USING fts5("
+    "nome, email, content='usuarios', content_rowid='id', tokenize='trigram')",
+    # Tabela de conteúdo externo: os triggers repassam as mudanças de usuarios
+    """CREATE TRIGGER IF NOT EXISTS usuarios_busca_ai AFTER INSERT ON usuarios BEGIN
+        INSERT INTO usuarios_busca(rowid, nome, email) VALUES (new.id, new.nome, new.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usuarios_busca_ad AFTER DELETE ON usuarios BEGIN
+        INSERT INTO usuarios_busca(usuarios_busca, rowid, nome, email) VALUES ('delete', old.id, old.nome, old.email);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS usuarios_busca_au AFTER UPDATE OF nome, email ON usuarios BEGIN
+        INSERT INTO usuarios_busca(usuarios_busca, rowid, nome, email) VALUES ('delete', old.id, old.nome, old.email);
+        INSERT INTO usuarios_busca(rowid, nome, email) VALUES (new.id, new.nome, new.email);
+    END""",
+    "INSERT INTO usuarios_busca(usuarios_busca) VALUES ('rebuild')",
+)
+
+
+def criar_indices_busca():
+    """Cria os índices de busca do banco atual (chamado pelo bootstrap)"""
+    comandos = DDL_POSTGRES if db.engine.dialect.name == 'postgresql' else DDL_SQLITE
+    with db.engine.begin() as conn:
+        for comando in comandos:
+            conn.execute(text(comando))
+
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _alunos_do_professor(professor_id):
+    """Total de alunos nas turmas do professor, pela estatística materializada"""
+    from app.models import Turma, TurmaStats
+    return db.session.execute(
+        select(func.coalesce(func.sum(TurmaStats.total_alunos), 0))
+        .join(Turma, Turma.id == TurmaStats.turma_id)
+        .where(Turma.professor_id == professor_id)
+    ).scalar()
+
+
+def _frase_fts(termo):
+    """Termo como frase do MATCH: cada trigrama, na ordem (trecho contíguo)"""
+    return '"' + termo.replace('"', '""') + '"'
+
+
+def _fts_mais_seletivo(termo, alunos):
+    """Se o termo casa com menos usuários do que `alunos` (contagem interrompida nesse limite)"""
+    casados = db.session.execute(
+        text('SELECT count(*) FROM (SELECT rowid FROM usuarios_busca WHERE usuarios_busca MATCH :frase LIMIT :limite)'),
+        {'frase': _frase_fts(termo), 'limite': alunos}
+    ).scalar()
+    return casados < alunos
+
+
+def _usar_fts(professor_id, termo):
+    """SQLite: o FTS5 compensa só para professores com muitos alunos e termos seletivos"""
+    alunos = _alunos_do_professor(professor_id)
+    return alunos > current_app.config['BUSCA_VARREDURA_MAX_ALUNOS'] and _fts_mais_seletivo(termo, alunos)
+
+
+def buscar_alunos(professor_id, termo, pagina, por_pagina):
+    """Página `pagina` (a partir de 1) dos alunos do professor que casam com `termo`; retorna (linhas, tem_mais)"""
+    from app.models import Usuario, Turma
+
+    termo = termo.strip().lower()
+    nome, email = func.lower(Usuario.nome), func.lower(Usuario.email)
+    prefixo = _escapar_like(termo) + '%'
+    trecho = '%' + _escapar_like(termo) + '%'
+
+    turmas = select(Turma.id).where(Turma.professor_id == professor_id)
+    consulta = (
+        select(Usuario.id, Usuario.nome, Usuario.email, Usuario.nivel, Usuario.xp,
+               Usuario.turma_id, Turma.nome.label('turma_nome'))
+        .join(Turma, Turma.id == Usuario.turma_id)
+        # IN nas turmas (e não só o join) para o SQLite partir do índice turma_id
+        .where(Usuario.turma_id.in_(turmas), Usuario.tipo_usuario == 'aluno')
+    )
+
+    if len(termo) < TAMANHO_TRIGRAMA:
+        consulta = consulta.where(nome.like(prefixo, escape='\\') | nome.like('% ' + prefixo, escape='\\')
+                                  | email.like(prefixo, escape='\\'))
+    elif db.session.get_bind().dialect.name != 'postgresql' and _usar_fts(professor_id, termo):
+        correspondencias = (select(literal_column('rowid'))
+                            .select_from(text('usuarios_busca'))
+                            .where(text('usuarios_busca MATCH :frase').bindparams(frase=_frase_fts(termo))))
+        consulta = consulta.where(Usuario.id.in_(correspondencias))
+    else:
+        # Postgres escolhe entre o índice trigram e o turma_id pelas estatísticas
+        consulta = consulta.where(nome.like(trecho, escape='\\') | email.like(trecho, escape='\\'))
+
+    relevancia = case(
+        (nome == termo, 0),
+        (nome.like(prefixo, escape='\\'), 1),
+        (nome.like('% ' + prefixo, escape='\\'), 2),
+        (email.like(prefixo, escape='\\'), 3),
+        else_=4
+    )
+    # Uma linha a mais diz se há próxima página sem contar todos os resultados
+    linhas = db.session.execute(
+        consulta.order_by(relevancia, Usuario.nome, Usuario.id)
+        .limit(por_pagina + 1).offset((pagina - 1) * por_pagina)
+    ).all()
+    return linhas[:por_pagina], len(linhas) > por_pagina
@@ -0,0 +1,266 @@
+"""
+Cache de dois níveis para representações montadas pelos endpoints.
+
+    obter_cache('desafio', (desafio_id, campos), calcular, tags=[f'desafio:{desafio_id}'])
+
+- Camada local: LRU em memória por processo (CACHE_LOCAL_MAX_ITENS), com TTL.
+- Camada compartilhada (opcional): Redis ou compatível em CACHE_REDIS_URL,
+  com os valores serializados em JSON. Um acerto nela repovoa a camada local.
+
+Invalidação por tags (`turma:<id>`, `desafio:<id>`, `usuario:<id>`): cada tag
+tem uma versão, e cada entrada guarda as versões das suas tags no momento em
+que foi calculada. `invalidar_tags` incrementa as versões após o commit da
+transação atual, o que torna obsoletas todas as entradas com essas tags. Com a
+camada compartilhada, as versões ficam no Redis e valem para todos os workers;
+sem ela, app/barramento.py repassa as invalidações aos demais workers.
+Outros caches em memória (como o catálogo) recebem as tags via `assinar`.
+
+Proteção contra stampede: quando uma chave expira, só uma thread do processo
+recalcula; as demais esperam o resultado. Acertos e falhas de cada recurso
+são contados em humaniq_cache_requests_total (app/metrics.py).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.metrics import registrar_cache
+
+ESPERA_CALCULO = 10  # segundos que uma thread espera o cálculo de outra antes de calcular ela mesma
+TODAS = '*'  # tag recebida pelos assinantes quando tudo deve ser descartado
+
+
+class VersoesLocais:
+    """Versões das tags no processo atual"""
+
+    def __init__(self):
+        self._versoes = {}
+        self._lock = threading.Lock()
+        self.geracao = 0  # muda a cada invalidação, de qualquer tag
+
+    def obter(self, tags):
+        return tuple(self._versoes.get(tag, 0) for tag in tags)
+
+    def incrementar(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versoes[tag] = self._versoes.get(tag, 0) + 1
+            self.geracao += 1
+
+    def geracao_atual(self):
+        return self.geracao
+
+
+class VersoesRedis:
+    """Versões das tags no Redis, compartilhadas por todos os workers"""
+
+    def __init__(self, cliente, prefixo):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def obter(self, tags):
+        if not tags:
+            return ()
+        valores = self.cliente.mget([f'{self.prefixo}tag:{tag}' for tag in tags])
+        return tuple(int(valor or 0) for valor in valores)
+
+    def incrementar(self, tags):
+        pipe = self.cliente.pipeline()
+        for tag in tags:
+            pipe.incr(f'{self.prefixo}tag:{tag}')
+        pipe.incr(f'{self.prefixo}geracao')
+        pipe.execute()
+
+    def geracao_atual(self):
+        return int(self.cliente.get(f'{self.prefixo}geracao') or 0)
+
+
+class CamadaLocal:
+    """LRU com TTL; cada entrada é (valor, tags, versões, expira_em)"""
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is None:
+                return None
+            if entrada[3] <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return entrada
+
+    def gravar(self, chave, valor, tags, versoes, ttl):
+        with self._lock:
+            self._itens[chave] = (valor, tags, versoes, time.monotonic() + ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class CamadaRedis:
+    """Camada compartilhada; valores em JSON com as tags e versões junto"""
+
+    def __init__(self, cliente, prefixo):
+        self.cliente = cliente
+        self.prefixo = prefixo
+
+    def obter(self, chave):
+        bruto = self.cliente.get(self.prefixo + chave)
+        if bruto is None:
+            return None
+        entrada = json.loads(bruto)
+        return entrada['v'], tuple(entrada['t']), tuple(entrada['n'])
+
+    def gravar(self, chave, valor, tags, versoes, ttl):
+        bruto = json.dumps({'v': valor, 't': list(tags), 'n': list(versoes)})
+        self.cliente.set(self.prefixo + chave, bruto, px=int(ttl * 1000))
+
+
+class Cache:
+    def __init__(self):
+        self.local = CamadaLocal(2048)
+        self.compartilhada = None
+        self.versoes = VersoesLocais()
+        self.ttl = 300
+        self.assinantes = []
+        self._calculando = {}
+        self._lock = threading.Lock()
+
+    def configurar(self, app):
+        self.local = CamadaLocal(app.config['CACHE_LOCAL_MAX_ITENS'])
+        self.ttl = app.config['CACHE_TTL']
+        url = app.config['CACHE_REDIS_URL']
+        if url:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError('CACHE_REDIS_URL definido, mas o pacote redis não está instalado')
+            cliente = redis.Redis.from_url(url)
+            prefixo = app.config['CACHE_REDIS_PREFIX']
+            self.compartilhada = CamadaRedis(cliente, prefixo)
+            self.versoes = VersoesRedis(cliente, prefixo)
+
+    def _valida(self, tags, versoes):
+        return self.versoes.obter(tags) == versoes
+
+    def obter(self, recurso, chave, calcular, tags=None, ttl=None):
+        chave = f'{recurso}:{chave}'
+
+        entrada = self.local.obter(chave)
+        if entrada is not None and self._valida(entrada[1], entrada[2]):
+            registrar_cache(recurso, True)
+            return entrada[0]
+
+        if self.compartilhada is not None:
+            entrada = self.compartilhada.obter(chave)
+            if entrada is not None and self._valida(entrada[1], entrada[2]):
+                valor, tags_entrada, versoes = entrada
+                self.local.gravar(chave, valor, tags_entrada, versoes, ttl or self.ttl)
+                registrar_cache(recurso, True)
+                return valor
+
+        registrar_cache(recurso, False)
+        return self._calcular(chave, calcular, tags, ttl or self.ttl)
+
+    def _calcular(self, chave, calcular, tags, ttl):
+        with self._lock:
+            pronto = self._calculando.get(chave)
+            if pronto is None:
+                self._calculando[chave] = threading.Event()
+        if pronto is not None:
+            # Outra thread já está calculando esta chave: usa o resultado dela
+            pronto.wait(ESPERA_CALCULO)
+            entrada = self.local.obter(chave)
+            if entrada is not None and self._valida(entrada[1], entrada[2]):
+                return entrada[0]
+            return calcular()
+
+        try:
+            geracao = self.versoes.geracao_atual()
+            valor = calcular()
+            if valor is None:
+                return None
+            tags = tuple(tags(valor) if callable(tags) else tags or ())
+            versoes = self.versoes.obter(tags)
+            # Não grava se alguma tag foi invalidada durante o cálculo
+            if self.versoes.geracao_atual() == geracao:
+                self.local.gravar(chave, valor, tags, versoes, ttl)
+                if self.compartilhada is not None:
+                    self.compartilhada.gravar(chave, valor, tags, versoes, ttl)
+            return valor
+        finally:
+            with self._lock:
+                self._calculando.pop(chave).set()
+
+    def invalidar(self, tags):
+        self.versoes.incrementar(tags)
+        self._avisar(tags)
+
+    def aplicar_remotas(self, tags):
+        """Invalidações feitas por outro processo (recebidas pelo barramento)"""
+        # No Redis a versão já foi incrementada por quem invalidou
+        if isinstance(self.versoes, VersoesLocais):
+            self.versoes.incrementar(tags)
+        self._avisar(tags)
+
+    def limpar_local(self):
+        """Descarta tudo que este processo guardou (ex.: ao perder invalidações)"""
+        self.local.limpar()
+        self._avisar({TODAS})
+
+    def _avisar(self, tags):
+        for assinante in self.assinantes:
+            assinante(tags)
+
+
+cache = Cache()
+
+
+def obter_cache(recurso, chave, calcular, tags=None, ttl=None):
+    """
+    Valor de `recurso`/`chave` em cache, ou o resultado de `calcular()`.
+
+    `tags` é uma lista ou uma função que recebe o valor calculado e retorna a
+    lista. Resultados None não são guardados. O valor retornado é compartilhado
+    entre requisições: copie antes de alterar.
+    """
+    return cache.obter(recurso, chave, calcular, tags, ttl)
+
+
+def assinar(funcao):
+    """Registra `funcao(tags)`, chamada a cada invalidação local ou vinda de outro worker"""
+    cache.assinantes.append(funcao)
+    return funcao
+
+
+def invalidar_tags(*tags, sessao=None):
+    """Invalida as entradas com essas tags quando a transação atual (de `sessao`, padrão db.session) fizer commit"""
+    (sessao or db.session).info.setdefault('tags_invalidadas', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_invalidacoes(session):
+    tags = session.info.pop('tags_invalidadas', None)
+    if tags:
+        cache.invalidar(tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_invalidacoes(session):
+    session.info.pop('tags_invalidadas', None)
+
+
+def init_app(app):
+    cache.configurar(app)
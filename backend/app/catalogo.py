@@ -0,0 +1,156 @@
+"""
+Catálogo de desafios serializado, compartilhado por todos os usuários.
+
+A parte do `listar_desafios` que não depende do usuário (o `to_dict()` de cada
+desafio, já convertido para JSON) fica em memória em segmentos por status,
+turma (None = desafios globais) e projeção de campos. O catálogo visível para
+um usuário é a intercalação do segmento global com os segmentos das suas
+turmas, e o desafio em destaque é o primeiro item desse catálogo.
+
+Os segmentos formam uma LRU de até CATALOGO_MAX_SEGMENTOS entradas, já que
+as combinações de ?fields= são muitas. Eles são invalidados pelas rotas de
+escrita em professor.py, com a tag `catalogo` de app/cache.py: o commit
+descarta os segmentos deste worker e o barramento de invalidação
+(app/barramento.py) os dos demais.
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app, g
+from app.cache import assinar, invalidar_tags, TODAS
+from app.metrics import registrar_cache
+from app.projecoes import opcoes_carga
+from app.warmup import registrar_aquecimento
+
+_segmentos = OrderedDict()
+_lock = threading.Lock()
+_geracao = 0
+
+
+class Segmento:
+    """Desafios de uma turma (ou globais), do mais recente ao mais antigo"""
+
+    __slots__ = ('expira_em', 'entradas')
+
+    def __init__(self, desafios, campos, ttl):
+        self.expira_em = time.monotonic() + ttl
+        self.entradas = []
+        for desafio in desafios:
+            item = desafio.to_dict(campos)
+            # JSON sem o '}' final, para anexar campos por usuário
+            fragmento = current_app.json.dumps(item)[:-1]
+            ordem = (desafio.data_criacao or datetime.min, desafio.id)
+            self.entradas.append((ordem, desafio.id, item, fragmento))
+
+
+class CatalogoVisivel:
+    """Intercalação dos segmentos visíveis para um usuário"""
+
+    __slots__ = ('entradas',)
+
+    def __init__(self, segmentos):
+        if len(segmentos) == 1:
+            self.entradas = segmentos[0].entradas
+        else:
+            self.entradas = list(heapq.merge(*(s.entradas for s in segmentos),
+                                             key=lambda entrada: entrada[0], reverse=True))
+
+    @property
+    def itens(self):
+        return [entrada[2] for entrada in self.entradas]
+
+    def primeiro(self):
+        """Dict do desafio mais recente (ou None se o catálogo estiver vazio)"""
+        return self.entradas[0][2] if self.entradas else None
+
+    def json_com(self, campo, valores, padrao='null'):
+        """Array JSON do catálogo acrescentando `campo` com valores[desafio_id] já serializados"""
+        sufixo = f', "{campo}": '
+        return '[' + ', '.join(
+            fragmento + sufixo + valores.get(desafio_id, padrao) + '}'
+            for _, desafio_id, _, fragmento in self.entradas
+        ) + ']'
+
+
+def _obter_segmento(status, turma_id, campos):
+    from app.models import Desafio
+
+    chave = (status, turma_id, campos)
+    with _lock:
+        segmento = _segmentos.get(chave)
+        if segmento is not None:
+            _segmentos.move_to_end(chave)
+    if segmento is not None and segmento.expira_em > time.monotonic():
+        registrar_cache('catalogo_desafios', True)
+        return segmento
+    registrar_cache('catalogo_desafios', False)
+
+    geracao = _geracao
+    # Igualdade em turma_id e status + ordenação por data_criacao:
+    # atendido pelo índice ix_desafios_turma_status_data
+    query = Desafio.query.options(*opcoes_carga(Desafio, campos, extras=('data_criacao',)))
+    query = query.filter(Desafio.turma_id.is_(None) if turma_id is None else Desafio.turma_id == turma_id)
+    if status:
+        query = query.filter(Desafio.status == status)
+    desafios = query.order_by(Desafio.data_criacao.desc(), Desafio.id.desc()).all()
+    segmento = Segmento(desafios, campos, current_app.config['CATALOGO_TTL'])
+
+    with _lock:
+        # Não grava um segmento montado antes de uma invalidação concorrente
+        if geracao == _geracao:
+            _segmentos[chave] = segmento
+            _segmentos.move_to_end(chave)
+            while len(_segmentos) > current_app.config['CATALOGO_MAX_SEGMENTOS']:
+                _segmentos.popitem(last=False)
+    return segmento
+
+
+def obter_catalogo(status=None, turma_ids=(), campos=None):
+    """Desafios globais mais os das turmas `turma_ids`, do mais recente ao mais antigo"""
+    segmentos = [_obter_segmento(status, None, campos)]
+    segmentos += [_obter_segmento(status, turma_id, campos) for turma_id in turma_ids]
+    return CatalogoVisivel(segmentos)
+
+
+def turmas_visiveis(usuario_id):
+    """Turmas cujos desafios o usuário enxerga: a do aluno ou as criadas pelo professor"""
+    # Memorizado no `g`: compartilhado pelas sub-requisições de um /api/batch
+    memo = g.setdefault('turmas_visiveis', {})
+    if usuario_id not in memo:
+        memo[usuario_id] = _consultar_turmas_visiveis(usuario_id)
+    return memo[usuario_id]
+
+
+def _consultar_turmas_visiveis(usuario_id):
+    from app import db
+    from app.models import Usuario, Turma
+
+    usuario = db.session.query(Usuario.tipo_usuario, Usuario.turma_id).filter_by(id=usuario_id).first()
+    if usuario is None:
+        return ()
+    if usuario.tipo_usuario == 'professor':
+        ids = db.session.query(Turma.id).filter_by(professor_id=usuario_id).order_by(Turma.id)
+        return tuple(turma_id for turma_id, in ids)
+    return (usuario.turma_id,) if usuario.turma_id else ()
+
+
+def invalidar_catalogo():
+    """Descarta os segmentos em todos os workers no commit (chamar ao criar/editar/excluir desafios)"""
+    invalidar_tags('catalogo')
+
+
+@assinar
+def _descartar_segmentos(tags):
+    global _geracao
+    if 'catalogo' in tags or TODAS in tags:
+        with _lock:
+            _geracao += 1
+            _segmentos.clear()
+
+
+@registrar_aquecimento
+def aquecer_catalogo():
+    obter_catalogo()
+    obter_catalogo('ativo')
@@ -0,0 +1,225 @@
+"""
+Estatísticas das turmas mantidas incrementalmente (turma_stats e desafio_stats).
+
+Os números exibidos ao professor (alunos matriculados, alunos com o teste
+Likert concluído, desafios da turma, participantes e conclusões de cada
+desafio) não são recontados a cada dashboard: as rotas que os alteram chamam
+`ajustar_turma` / `ajustar_desafio`, que somam deltas às linhas na mesma
+transação da escrita. Como o UPDATE é `coluna = coluna + delta`, escritas
+concorrentes não perdem incrementos. Uma linha que ainda não existe é
+calculada a partir das tabelas de origem.
+
+`verificar_estatisticas` recalcula tudo e corrige as linhas divergentes
+(escritas fora das rotas, edição manual do banco, bugs). Rode periodicamente:
+
+    flask --app run estatisticas-verificar                  # uma vez (ex.: cron)
+    flask --app run estatisticas-verificar --intervalo 600  # em laço
+"""
+import time
+from datetime import datetime
+from functools import cache
+
+import click
+from flask import current_app
+from sqlalchemy import select, func, insert, literal
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+
+class Materializacao:
+    """Tabela de estatísticas por entidade e as subconsultas que a recalculam"""
+
+    def __init__(self, nome, modelo, chave, origem, valores):
+        self.nome = nome
+        self.modelo = modelo
+        self.chave = chave          # coluna de `modelo` com o id da entidade
+        self.origem = origem        # coluna id da tabela da entidade (Turma.id, Desafio.id)
+        self.valores = valores      # função(id) -> {coluna: subconsulta com o valor correto}
+
+    @property
+    def tabela(self):
+        return self.modelo.__table__
+
+    @property
+    def colunas(self):
+        return list(self.valores(self.origem))
+
+    def ajustar(self, entidade_id, deltas):
+        valores = {coluna: self.tabela.c[coluna] + delta for coluna, delta in deltas.items() if delta}
+        if not entidade_id or not valores:
+            return
+        if self._somar(entidade_id, valores):
+            return
+        # Sem linha ainda: calcula das tabelas de origem, já com as mudanças desta transação
+        db.session.flush()
+        try:
+            with db.session.begin_nested():
+                self._inserir([entidade_id])
+        except IntegrityError:
+            # Outra transação criou a linha antes: soma o delta nela
+            self._somar(entidade_id, valores)
+
+    def _somar(self, entidade_id, valores):
+        resultado = db.session.execute(
+            self.tabela.update()
+            .where(self.tabela.c[self.chave] == entidade_id)
+            .values(data_atualizacao=datetime.utcnow(), **valores)
+        )
+        return resultado.rowcount > 0
+
+    def _inserir(self, ids):
+        colunas = self.colunas
+        db.session.execute(insert(self.tabela).from_select(
+            [self.chave, *colunas, 'data_atualizacao'],
+            select(self.origem, *self.valores(self.origem).values(), literal(datetime.utcnow())).where(self.origem.in_(ids))
+        ))
+
+    def _recalcular(self, ids):
+        # Em um único UPDATE: a janela para corrida com um delta concorrente é mínima
+        db.session.execute(
+            self.tabela.update()
+            .where(self.tabela.c[self.chave].in_(ids))
+            .values(data_atualizacao=datetime.utcnow(), **self.valores(self.tabela.c[self.chave]))
+        )
+
+    def remover(self, entidade_id):
+        db.session.execute(self.tabela.delete().where(self.tabela.c[self.chave] == entidade_id))
+
+    def obter(self, ids):
+        """{id: {coluna: valor}} das entidades `ids`; sem linha = zeros"""
+        ids = list(ids)
+        colunas = self.colunas
+        resultado = {entidade_id: dict.fromkeys(colunas, 0) for entidade_id in ids}
+        if ids:
+            linhas = db.session.execute(
+                select(self.tabela.c[self.chave], *(self.tabela.c[coluna] for coluna in colunas))
+                .where(self.tabela.c[self.chave].in_(ids))
+            )
+            for linha in linhas:
+                resultado[linha[0]] = dict(zip(colunas, linha[1:]))
+        return resultado
+
+    def verificar(self, corrigir):
+        """Divergências [(id, coluna, gravado, correto)]; com `corrigir`, regrava as linhas"""
+        colunas = self.colunas
+        corretos = self.valores(self.origem)
+        consulta = (
+            select(self.origem, self.tabela.c[self.chave].label('existe'),
+                   *(self.tabela.c[coluna] for coluna in colunas),
+                   *(corretos[coluna].label(f'correto_{coluna}') for coluna in colunas))
+            .outerjoin(self.tabela, self.tabela.c[self.chave] == self.origem)
+        )
+        divergencias, faltando, divergentes = [], [], []
+        for linha in db.session.execute(consulta):
+            dados = linha._mapping
+            entidade_id = linha[0]
+            if dados['existe'] is None:
+                faltando.append(entidade_id)
+                divergencias.extend((entidade_id, coluna, None, dados[f'correto_{coluna}']) for coluna in colunas)
+                continue
+            erradas = [(entidade_id, coluna, dados[coluna], dados[f'correto_{coluna}'])
+                       for coluna in colunas if dados[coluna] != dados[f'correto_{coluna}']]
+            if erradas:
+                divergentes.append(entidade_id)
+                divergencias.extend(erradas)
+
+        orfas = self.tabela.delete().where(self.tabela.c[self.chave].not_in(select(self.origem)))
+        if corrigir:
+            if faltando:
+                self._inserir(faltando)
+            if divergentes:
+                self._recalcular(divergentes)
+            db.session.execute(orfas)
+            db.session.commit()
+        return divergencias
+
+
+def _valores_turma(turma_id):
+    from app.models import Usuario, Desafio
+    return {
+        'total_alunos': select(func.count(Usuario.id)).where(Usuario.turma_id == turma_id).scalar_subquery(),
+        'alunos_com_teste': select(func.count(Usuario.id)).where(
+            Usuario.turma_id == turma_id, Usuario.teste_inicial_concluido == True
+        ).scalar_subquery(),
+        'total_desafios': select(func.count(Desafio.id)).where(Desafio.turma_id == turma_id).scalar_subquery(),
+    }
+
+
+def _valores_desafio(desafio_id):
+    from app.models import Resultado
+    return {
+        'participantes': select(func.count(Resultado.id)).where(Resultado.desafio_id == desafio_id).scalar_subquery(),
+        'concluidos': select(func.count(Resultado.id)).where(
+            Resultado.desafio_id == desafio_id, Resultado.status == 'concluído'
+        ).scalar_subquery(),
+    }
+
+
+@cache
+def _materializacoes():
+    from app.models import Turma, Desafio, TurmaStats, DesafioStats
+    return {
+        'turma': Materializacao('turma_stats', TurmaStats, 'turma_id', Turma.id, _valores_turma),
+        'desafio': Materializacao('desafio_stats', DesafioStats, 'desafio_id', Desafio.id, _valores_desafio),
+    }
+
+
+def ajustar_turma(turma_id, **deltas):
+    """Soma `deltas` (ex.: total_alunos=1) às estatísticas da turma na transação atual"""
+    _materializacoes()['turma'].ajustar(turma_id, deltas)
+
+
+def ajustar_desafio(desafio_id, **deltas):
+    """Soma `deltas` (participantes, concluidos) às estatísticas do desafio na transação atual"""
+    _materializacoes()['desafio'].ajustar(desafio_id, deltas)
+
+
+def remover_turma(turma_id):
+    """Remove as estatísticas da turma (chamar antes de excluí-la)"""
+    _materializacoes()['turma'].remover(turma_id)
+
+
+def remover_desafio(desafio_id):
+    """Remove as estatísticas do desafio (chamar antes de excluí-lo)"""
+    _materializacoes()['desafio'].remover(desafio_id)
+
+
+def estatisticas_turmas(turma_ids):
+    """{turma_id: {'total_alunos', 'alunos_com_teste', 'total_desafios'}}"""
+    return _materializacoes()['turma'].obter(turma_ids)
+
+
+def estatisticas_desafios(desafio_ids):
+    """{desafio_id: {'participantes', 'concluidos'}}"""
+    return _materializacoes()['desafio'].obter(desafio_ids)
+
+
+def verificar_estatisticas(corrigir=True):
+    """Recalcula as estatísticas; retorna {tabela: divergências} e corrige se `corrigir`"""
+    resultado = {}
+    for materializacao in _materializacoes().values():
+        divergencias = materializacao.verificar(corrigir)
+        if divergencias:
+            ids = sorted({entidade_id for entidade_id, *_ in divergencias})
+            current_app.logger.warning('%s: %d divergências em %d linhas (ids %s%s)', materializacao.nome,
+                                       len(divergencias), len(ids), ids[:20], '...' if len(ids) > 20 else '')
+        resultado[materializacao.nome] = divergencias
+    return resultado
+
+
+def init_app(app):
+    """Registra o comando de verificação das estatísticas"""
+
+    @app.cli.command('estatisticas-verificar')
+    @click.option('--intervalo', default=0, help='Repete a cada N segundos (0 = uma vez)')
+    @click.option('--somente-verificar', is_flag=True, help='Lista as divergências sem corrigir')
+    def verificar(intervalo, somente_verificar):
+        """Recalcula turma_stats e desafio_stats e corrige divergências"""
+        while True:
+            resultado = verificar_estatisticas(corrigir=not somente_verificar)
+            for tabela, divergencias in resultado.items():
+                click.echo(f'{tabela}: {len(divergencias)} divergências')
+            if not intervalo:
+                break
+            db.session.remove()
+            time.sleep(intervalo)
@@ -0,0 +1,147 @@
+"""
+Eventos dos alunos para o dashboard do professor em tempo real (SSE).
+
+As rotas que mudam o que o professor vê (aluno entra/sai da turma, conclui o
+teste Likert, conclui um desafio) chamam `publicar_evento` antes do commit: o
+evento é uma linha de eventos_turma gravada na mesma transação, com o delta a
+aplicar nas estatísticas já exibidas. O id da linha é o id do evento SSE, o
+que permite retomar o stream pelo header Last-Event-ID.
+
+Cada stream consulta a tabela a cada SSE_POLL_INTERVAL segundos (eventos
+publicados por outros workers) e é acordado na hora pelos commits do próprio
+worker. Comentários de heartbeat mantêm a conexão viva em proxies, e o stream
+é encerrado após SSE_MAX_DURATION segundos para o navegador reconectar.
+
+O EventSource não envia headers, então o stream não recebe o access token:
+o dashboard pede a POST /api/professor/eventos/token um token assinado que
+vale só para abrir o stream, por SSE_TOKEN_MAX_AGE segundos, e pede outro a
+cada reconexão. Na URL (e nos logs de acesso) fica só esse token.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from itsdangerous import BadSignature, TimestampSigner
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app import db
+
+LIMITE_POR_CONSULTA = 100
+SALT_TOKEN = 'humaniq-eventos'
+
+_sinal = threading.Condition()
+_versao = 0
+
+
+def publicar_evento(tipo, turma_id, aluno, delta, **dados):
+    """Adiciona à sessão o evento para o professor da turma (gravado no próximo commit)"""
+    from app.models import Turma, EventoTurma
+
+    if not turma_id:
+        return
+    professor_id = db.session.query(Turma.professor_id).filter_by(id=turma_id).scalar()
+    if professor_id is None:
+        return
+    db.session.add(EventoTurma(
+        professor_id=professor_id,
+        turma_id=turma_id,
+        tipo=tipo,
+        dados={'turma_id': turma_id, 'aluno': {'id': aluno.id, 'nome': aluno.nome}, 'delta': delta, **dados}
+    ))
+    db.session.info['eventos_publicados'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _avisar_streams(session):
+    global _versao
+    if session.info.pop('eventos_publicados', False):
+        with _sinal:
+            _versao += 1
+            _sinal.notify_all()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_aviso(session):
+    session.info.pop('eventos_publicados', None)
+
+
+def ultimo_evento(professor_id):
+    """Id do evento mais recente do professor (0 se não houver)"""
+    from app.models import EventoTurma
+    return db.session.query(func.max(EventoTurma.id)).filter_by(professor_id=professor_id).scalar() or 0
+
+
+def _signer(app):
+    return TimestampSigner(app.config['SECRET_KEY'], salt=SALT_TOKEN)
+
+
+def gerar_token_stream(app, professor_id):
+    """Token assinado que autoriza abrir o stream do professor"""
+    return _signer(app).sign(str(professor_id).encode()).decode()
+
+
+def professor_do_token(app, token):
+    """Id do professor do token de stream, ou None se inválido ou expirado"""
+    try:
+        valor = _signer(app).unsign(token, max_age=app.config['SSE_TOKEN_MAX_AGE'])
+    except BadSignature:
+        return None
+    return int(valor)
+
+
+def _eventos_desde(professor_id, ultimo_id):
+    from app.models import EventoTurma
+
+    tabela = EventoTurma.__table__
+    consulta = (select(tabela.c.id, tabela.c.tipo, tabela.c.dados)
+                .where(tabela.c.professor_id == professor_id, tabela.c.id > ultimo_id)
+                .order_by(tabela.c.id)
+                .limit(LIMITE_POR_CONSULTA))
+    # Conexão curta: o stream não segura conexão do pool entre as consultas
+    with db.engine.connect() as conn:
+        return conn.execute(consulta).all()
+
+
+def formatar_evento(evento):
+    return f"id: {evento.id}\nevent: {evento.tipo}\ndata: {json.dumps(evento.dados)}\n\n"
+
+
+def transmitir(app, professor_id, ultimo_id):
+    """Gerador do stream text/event-stream com os eventos posteriores a `ultimo_id`"""
+    config = app.config
+    yield f"retry: {config['SSE_RETRY_MS']}\n\n"
+
+    inicio = ultimo_envio = time.monotonic()
+    while time.monotonic() - inicio < config['SSE_MAX_DURATION']:
+        versao = _versao
+        with app.app_context():
+            eventos = _eventos_desde(professor_id, ultimo_id)
+        if eventos:
+            for evento in eventos:
+                yield formatar_evento(evento)
+                ultimo_id = evento.id
+            ultimo_envio = time.monotonic()
+            continue
+
+        if time.monotonic() - ultimo_envio >= config['SSE_HEARTBEAT']:
+            yield ': heartbeat\n\n'
+            ultimo_envio = time.monotonic()
+        # Acorda antes do intervalo se um commit deste worker publicou eventos
+        with _sinal:
+            _sinal.wait_for(lambda: _versao != versao, timeout=config['SSE_POLL_INTERVAL'])
+
+
+def init_app(app):
+    """Registra o comando de limpeza da tabela de eventos"""
+
+    @app.cli.command('eventos-limpar')
+    @click.option('--horas', default=24, help='Remove eventos mais antigos que isso')
+    def limpar_eventos(horas):
+        """Remove eventos antigos do stream SSE dos professores"""
+        from app.models import EventoTurma
+        limite = datetime.utcnow() - timedelta(hours=horas)
+        removidos = EventoTurma.query.filter(EventoTurma.data_criacao < limite).delete()
+        db.session.commit()
+        click.echo(f'{removidos} eventos removidos')
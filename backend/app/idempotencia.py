@@ -0,0 +1,204 @@
+"""
+Idempotency-Key para rotas POST com efeitos colaterais.
+
+Clientes móveis repetem iniciar/submeter/concluir, /turma/entrar e
+/teste-likert/responder quando a resposta demora. Com o header
+`Idempotency-Key`, a primeira resposta (status < 500) fica gravada na tabela
+respostas_idempotentes, com uma LRU por processo na frente, e as repetições
+com a mesma chave recebem essa resposta (header `Idempotent-Replayed: true`)
+sem executar a rota de novo.
+
+- A chave vale por usuário e rota; reutilizá-la com outro corpo é erro 422.
+- Uma repetição que chega enquanto a primeira está em andamento espera por ela
+  (no mesmo worker por um Event, entre workers pela linha 'processando') até
+  IDEMPOTENCY_WAIT segundos; depois recebe 409.
+- Uma reserva 'processando' mais antiga que IDEMPOTENCY_LOCK_TIMEOUT (worker
+  que morreu no meio da rota) pode ser assumida por outra requisição.
+- Chaves expiram após IDEMPOTENCY_TTL segundos.
+
+    @desafio_bp.route('/<int:desafio_id>/concluir', methods=['POST'])
+    @jwt_required()
+    @idempotente
+    def concluir_desafio(desafio_id): ...
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from hashlib import sha256
+
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.cache import CamadaLocal
+
+TAMANHO_MAXIMO_CHAVE = 255
+ESPERA_INICIAL, ESPERA_MAXIMA = 0.05, 0.5  # intervalo entre consultas ao esperar outro worker (dobra a cada uma)
+INTERVALO_LIMPEZA = 600  # segundos entre remoções das chaves expiradas
+
+_respostas = CamadaLocal(1024)
+_em_andamento = {}
+_lock = threading.Lock()
+_proxima_limpeza = 0
+
+
+def _tabela():
+    from app.models import RespostaIdempotente
+    return RespostaIdempotente.__table__
+
+
+def _ler(chave):
+    """Linha da chave, ou None se não existir, estiver expirada ou for uma reserva abandonada"""
+    tabela = _tabela()
+    linha = db.session.execute(
+        select(tabela.c.impressao, tabela.c.estado, tabela.c.status, tabela.c.corpo,
+               tabela.c.mimetype, tabela.c.data_criacao)
+        .where(tabela.c.chave == chave)
+    ).first()
+    if linha is None:
+        return None
+    config = current_app.config
+    idade = (datetime.utcnow() - linha.data_criacao).total_seconds()
+    if idade > config['IDEMPOTENCY_TTL'] or (linha.estado == 'processando' and idade > config['IDEMPOTENCY_LOCK_TIMEOUT']):
+        return None
+    return linha
+
+
+def _reservar(chave, impressao):
+    """Grava a reserva 'processando'; False se outra requisição já tem a chave"""
+    global _proxima_limpeza
+    config = current_app.config
+    tabela = _tabela()
+    agora = datetime.utcnow()
+    expiradas = tabela.c.data_criacao < agora - timedelta(seconds=config['IDEMPOTENCY_TTL'])
+    abandonadas = (tabela.c.estado == 'processando') & (
+        tabela.c.data_criacao < agora - timedelta(seconds=config['IDEMPOTENCY_LOCK_TIMEOUT']))
+    try:
+        db.session.execute(tabela.delete().where(tabela.c.chave == chave, expiradas | abandonadas))
+        db.session.execute(tabela.insert().values(chave=chave, impressao=impressao, estado='processando',
+                                                  data_criacao=agora))
+        if time.monotonic() >= _proxima_limpeza:
+            _proxima_limpeza = time.monotonic() + INTERVALO_LIMPEZA
+            db.session.execute(tabela.delete().where(expiradas))
+        # Confirmada já: os outros workers precisam enxergar a reserva
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def _concluir(chave, impressao, resposta):
+    """Grava a resposta da rota (ou libera a chave se ela falhou)"""
+    tabela = _tabela()
+    # O que a rota não confirmou seria descartado no fim da requisição de qualquer forma
+    db.session.rollback()
+    if resposta is None or resposta.status_code >= 500 or resposta.is_streamed:
+        # Falha no servidor: a próxima tentativa executa a rota de novo
+        db.session.execute(tabela.delete().where(tabela.c.chave == chave))
+        db.session.commit()
+        return
+    corpo = resposta.get_data(as_text=True)
+    db.session.execute(tabela.update().where(tabela.c.chave == chave).values(
+        estado='concluida', status=resposta.status_code, corpo=corpo, mimetype=resposta.mimetype
+    ))
+    db.session.commit()
+    _respostas.gravar(chave, (impressao, resposta.status_code, corpo, resposta.mimetype), (), (),
+                      current_app.config['IDEMPOTENCY_TTL'])
+
+
+def _repetir(gravada, impressao):
+    """Resposta gravada para uma repetição da requisição"""
+    impressao_gravada, status, corpo, mimetype = gravada
+    if impressao_gravada != impressao:
+        return jsonify({'message': 'Idempotency-Key já usada com outro corpo de requisição'}), 422
+    resposta = current_app.response_class(corpo, status=status, mimetype=mimetype)
+    resposta.headers['Idempotent-Replayed'] = 'true'
+    return resposta
+
+
+def _em_processamento():
+    resposta = jsonify({'message': 'Requisição com esta Idempotency-Key ainda em processamento'})
+    resposta.headers['Retry-After'] = '1'
+    return resposta, 409
+
+
+def _aguardar_outro_worker(chave, limite):
+    """Espera a reserva de outro worker virar resposta; None se ela foi liberada"""
+    intervalo = ESPERA_INICIAL
+    while time.monotonic() < limite:
+        time.sleep(min(intervalo, max(limite - time.monotonic(), 0)))
+        intervalo = min(intervalo * 2, ESPERA_MAXIMA)
+        linha = _ler(chave)
+        if linha is None or linha.estado == 'concluida':
+            return linha
+    return False
+
+
+def _executar(rota, args, kwargs, chave, impressao, limite):
+    while True:
+        linha = _ler(chave)
+        if linha is not None and linha.estado == 'processando':
+            linha = _aguardar_outro_worker(chave, limite)
+            if linha is False:
+                return _em_processamento()
+        if linha is not None:
+            gravada = (linha.impressao, linha.status, linha.corpo, linha.mimetype)
+            _respostas.gravar(chave, gravada, (), (), current_app.config['IDEMPOTENCY_TTL'])
+            return _repetir(gravada, impressao)
+        if _reservar(chave, impressao):
+            break
+        # Outro worker reservou entre a leitura e o insert: volta a esperar por ele
+
+    resposta = None
+    try:
+        resposta = current_app.make_response(rota(*args, **kwargs))
+        return resposta
+    finally:
+        _concluir(chave, impressao, resposta)
+
+
+def idempotente(rota):
+    """Aplica Idempotency-Key à rota (usar abaixo de @jwt_required)"""
+
+    @wraps(rota)
+    def envolver(*args, **kwargs):
+        chave_cliente = request.headers.get('Idempotency-Key')
+        if chave_cliente is None:
+            return rota(*args, **kwargs)
+        if not chave_cliente or len(chave_cliente) > TAMANHO_MAXIMO_CHAVE:
+            return jsonify({'message': f'Idempotency-Key deve ter de 1 a {TAMANHO_MAXIMO_CHAVE} caracteres'}), 400
+
+        chave = sha256(f'{get_jwt_identity()}\n{request.method} {request.path}\n{chave_cliente}'.encode()).hexdigest()
+        impressao = sha256(request.get_data()).hexdigest()
+        limite = time.monotonic() + current_app.config['IDEMPOTENCY_WAIT']
+
+        while True:
+            entrada = _respostas.obter(chave)
+            if entrada is not None:
+                return _repetir(entrada[0], impressao)
+
+            with _lock:
+                em_andamento = _em_andamento.get(chave)
+                if em_andamento is None:
+                    _em_andamento[chave] = threading.Event()
+            if em_andamento is None:
+                break
+            # Repetição dentro do mesmo worker: espera a primeira terminar
+            if not em_andamento.wait(max(limite - time.monotonic(), 0)):
+                return _em_processamento()
+
+        try:
+            return _executar(rota, args, kwargs, chave, impressao, limite)
+        finally:
+            with _lock:
+                _em_andamento.pop(chave).set()
+
+    return envolver
+
+
+def init_app(app):
+    global _respostas
+    _respostas = CamadaLocal(app.config['IDEMPOTENCY_LOCAL_MAX_ITENS'])
@@ -0,0 +1,77 @@
+import time
+from flask import g, has_request_context, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Quantidade máxima de statements guardados por requisição para o log
+MAX_STATEMENTS_REGISTRADOS = 200
+
+
+class EstatisticasSQL:
+    """Contadores de SQL acumulados durante uma requisição"""
+
+    __slots__ = ('total', 'tempo', 'statements')
+
+    def __init__(self):
+        self.total = 0
+        self.tempo = 0.0
+        self.statements = []
+
+    def registrar(self, statement, duracao):
+        self.total += 1
+        self.tempo += duracao
+        if len(self.statements) < MAX_STATEMENTS_REGISTRADOS:
+            self.statements.append((statement, duracao))
+
+
+def estatisticas_atuais():
+    """Retorna as estatísticas SQL da requisição atual (ou None fora de requisição)"""
+    if not has_request_context():
+        return None
+    return g.get('sql_stats')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    # O início fica no contexto do próprio statement: um statement que falha
+    # descarta o contexto, sem deixar entradas pendentes na conexão
+    if context is not None:
+        context._sql_inicio = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_sql_inicio', None)
+    stats = estatisticas_atuais()
+    if inicio is not None and stats is not None:
+        stats.registrar(statement, time.perf_counter() - inicio)
+
+
+def init_app(app):
+    """Registra os hooks de contagem de SQL por requisição"""
+
+    @app.before_request
+    def iniciar_contagem_sql():
+        g.sql_stats = EstatisticasSQL()
+
+    @app.after_request
+    def reportar_contagem_sql(response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+
+        tempo_ms = stats.tempo * 1000
+        if app.config['SQL_DEBUG_HEADERS']:
+            response.headers['X-Query-Count'] = str(stats.total)
+            response.headers.add('Server-Timing', f'db;dur={tempo_ms:.2f};desc="{stats.total} queries"')
+
+        if (stats.total > app.config['SQL_SLOW_REQUEST_QUERIES']
+                or tempo_ms > app.config['SQL_SLOW_REQUEST_MS']):
+            current_app.logger.warning(
+                'Requisição %s %s excedeu o limite de SQL: %d queries, %.1f ms\n%s',
+                request.method, request.full_path.rstrip('?'), stats.total, tempo_ms,
+                '\n'.join(f'  [{duracao * 1000:.1f} ms] {statement}'
+                          for statement, duracao in stats.statements)
+            )
+        return response
+
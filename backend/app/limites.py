@@ -0,0 +1,198 @@
+"""
+Limite de requisições (token bucket) por IP e por conta.
+
+Login, os dois /register e /turma/entrar (adivinhação do código da turma) não
+tinham limite: uma rajada de credential stuffing fazia um hash de senha por
+tentativa e disputava os workers com os usuários reais. O decorator `limitar`
+tira uma ficha do balde do IP e outra do balde da conta antes de executar a
+rota; sem ficha, responde 429 com Retry-After sem tocar no banco nem no hash.
+
+    @auth_bp.route('/login', methods=['POST'])
+    @limitar('login', conta=email_e_ip_da_requisicao)
+    def login(): ...
+
+Cada limite de RATE_LIMITS é "capacidade/segundos": até `capacidade`
+requisições em rajada, repostas à taxa de capacidade/segundos. Vazio desliga
+aquele balde. Os baldes ficam na memória do processo (cada worker do gunicorn
+tem os seus, e o limite efetivo é multiplicado pelo número de workers) ou, com
+RATE_LIMIT_REDIS_URL, no Redis, compartilhados por todos.
+Rejeições são contadas em humaniq_rate_limit_rejections_total (app/metrics.py).
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify, current_app
+from app.metrics import registrar_limite
+
+# Token bucket atômico no Redis: retorna os segundos até a próxima ficha (0 = consumiu)
+SCRIPT_REDIS = """
+local capacidade = tonumber(ARGV[1])
+local taxa = tonumber(ARGV[2])
+local agora = tonumber(ARGV[3])
+local balde = redis.call('HMGET', KEYS[1], 'f', 't')
+local fichas = tonumber(balde[1]) or capacidade
+local ultimo = tonumber(balde[2]) or agora
+fichas = math.min(capacidade, fichas + math.max(0, agora - ultimo) * taxa)
+local espera = 0
+if fichas >= 1 then
+    fichas = fichas - 1
+else
+    espera = (1 - fichas) / taxa
+end
+redis.call('HSET', KEYS[1], 'f', fichas, 't', agora)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / taxa * 1000))
+return tostring(espera)
+"""
+
+
+class BaldesLocais:
+    """Baldes na memória do processo; LRU limitada a `max_chaves`"""
+
+    def __init__(self, max_chaves):
+        self.max_chaves = max_chaves
+        self._baldes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consumir(self, chave, capacidade, periodo):
+        """Tira uma ficha; retorna 0 se conseguiu ou os segundos até a próxima ficha"""
+        taxa = capacidade / periodo
+        agora = time.monotonic()
+        with self._lock:
+            fichas, ultimo = self._baldes.pop(chave, (capacidade, agora))
+            fichas = min(capacidade, fichas + (agora - ultimo) * taxa)
+            espera = 0 if fichas >= 1 else (1 - fichas) / taxa
+            # Balde descartado pela LRU volta cheio: os menos usados são os que já encheram
+            self._baldes[chave] = (fichas - 1 if not espera else fichas, agora)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+        return espera
+
+    def limpar(self):
+        with self._lock:
+            self._baldes.clear()
+
+
+class BaldesRedis:
+    """Baldes no Redis, compartilhados por todos os workers e instâncias"""
+
+    def __init__(self, cliente, prefixo):
+        self.prefixo = prefixo
+        self._script = cliente.register_script(SCRIPT_REDIS)
+
+    def consumir(self, chave, capacidade, periodo):
+        import redis
+        try:
+            espera = self._script(keys=[f'{self.prefixo}limite:{chave}'],
+                                  args=[capacidade, capacidade / periodo, time.time()])
+        except redis.RedisError:
+            # Redis fora do ar não derruba o login: a requisição passa sem limite
+            current_app.logger.warning('Limite de requisições indisponível (Redis)', exc_info=True)
+            return 0
+        return float(espera)
+
+
+_baldes = BaldesLocais(100_000)
+_limites = {}
+
+
+def interpretar_limite(texto):
+    """'20/60' -> (20, 60.0); vazio ou '0' -> None (balde desligado)"""
+    texto = (texto or '').strip()
+    if not texto or texto == '0':
+        return None
+    try:
+        capacidade, periodo = texto.split('/')
+        capacidade, periodo = int(capacidade), float(periodo)
+    except ValueError:
+        raise ValueError(f'Limite de requisições inválido: {texto!r} (use "capacidade/segundos")')
+    if capacidade < 1 or periodo <= 0:
+        raise ValueError(f'Limite de requisições inválido: {texto!r}')
+    return capacidade, periodo
+
+
+def ip_do_cliente():
+    """IP do cliente, descontando os RATE_LIMIT_PROXIES proxies confiáveis do X-Forwarded-For"""
+    proxies = current_app.config['RATE_LIMIT_PROXIES']
+    rota = request.access_route
+    if proxies and 'X-Forwarded-For' in request.headers and len(rota) >= proxies:
+        return rota[-proxies]
+    return request.remote_addr or ''
+
+
+def email_da_requisicao():
+    """Email do corpo JSON de login/registro (sem consultar o banco)"""
+    data = request.get_json(silent=True)
+    email = data.get('email') if isinstance(data, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def email_e_ip_da_requisicao():
+    """
+    Conta de login/registro: o email junto com o IP do cliente.
+
+    Só com o email, quem conhece o email de um aluno esgotaria o balde dele de
+    qualquer lugar e o deixaria sem entrar; com o IP, só o próprio atacante
+    fica bloqueado (e as tentativas dele ainda contam no balde do IP).
+    """
+    email = email_da_requisicao()
+    return f'{email}|{ip_do_cliente()}' if email else None
+
+
+def _rejeitar(espera):
+    resposta = jsonify({'message': 'Muitas tentativas. Aguarde e tente novamente.'})
+    resposta.status_code = 429
+    resposta.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+    return resposta
+
+
+def limitar(nome, conta=None):
+    """
+    Aplica os baldes RATE_LIMITS[nome] ('ip' e 'conta') antes da rota.
+
+    `conta` é uma função que retorna a chave da conta na requisição (email,
+    usuário do JWT); com None ou sem retorno só o balde do IP vale. Em rotas
+    com @jwt_required, usar abaixo dele.
+    """
+
+    def decorator(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            limites = _limites.get(nome)
+            if limites:
+                chaves = [('ip', ip_do_cliente())]
+                if conta is not None:
+                    chaves.append(('conta', conta()))
+                for escopo, valor in chaves:
+                    limite = limites.get(escopo)
+                    if limite is None or valor is None:
+                        continue
+                    espera = _baldes.consumir(f'{nome}:{escopo}:{valor}', *limite)
+                    if espera:
+                        registrar_limite(nome, escopo)
+                        return _rejeitar(espera)
+            return funcao(*args, **kwargs)
+        return envolvida
+
+    return decorator
+
+
+def init_app(app):
+    global _baldes
+    _limites.clear()
+    if not app.config['RATE_LIMIT_ENABLED']:
+        return
+    for nome, escopos in app.config['RATE_LIMITS'].items():
+        _limites[nome] = {escopo: interpretar_limite(texto) for escopo, texto in escopos.items()}
+
+    url = app.config['RATE_LIMIT_REDIS_URL']
+    if url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_REDIS_URL definido, mas o pacote redis não está instalado')
+        _baldes = BaldesRedis(redis.Redis.from_url(url), app.config['CACHE_REDIS_PREFIX'])
+    else:
+        _baldes = BaldesLocais(app.config['RATE_LIMIT_MAX_CHAVES'])
@@ -0,0 +1,121 @@
+"""
+Métricas Prometheus da API.
+
+Com a variável PROMETHEUS_MULTIPROC_DIR definida (ver gunicorn.conf.py), cada
+worker grava seus valores em arquivos mmap nesse diretório e /api/metrics
+agrega todos os workers. Sem ela, as métricas ficam apenas no processo atual.
+"""
+import os
+import time
+from flask import g, request, Response
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram,
+    CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+LATENCIA_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUISICOES = Counter(
+    'humaniq_http_requests_total',
+    'Total de requisições HTTP',
+    ['blueprint', 'endpoint', 'method', 'status']
+)
+LATENCIA = Histogram(
+    'humaniq_http_request_duration_seconds',
+    'Latência das requisições HTTP',
+    ['blueprint', 'endpoint'],
+    buckets=LATENCIA_BUCKETS
+)
+CONEXOES_EM_USO = Gauge(
+    'humaniq_db_pool_checked_out',
+    'Conexões do pool do banco em uso',
+    multiprocess_mode='livesum'
+)
+CONEXOES_ABERTAS = Counter(
+    'humaniq_db_pool_connections_opened_total',
+    'Conexões físicas abertas pelo pool do banco'
+)
+CACHE = Counter(
+    'humaniq_cache_requests_total',
+    'Consultas aos caches da aplicação',
+    ['cache', 'resultado']
+)
+LIMITES = Counter(
+    'humaniq_rate_limit_rejections_total',
+    'Requisições recusadas pelo limite de requisições (429)',
+    ['limite', 'escopo']
+)
+
+# Filhos das métricas por combinação de labels; evita o custo de .labels() a cada requisição
+_contadores = {}
+_histogramas = {}
+
+
+def registrar_cache(nome, acerto):
+    """Conta um acerto ou falha do cache `nome` (base para a taxa de acerto)"""
+    CACHE.labels(nome, 'hit' if acerto else 'miss').inc()
+
+
+def registrar_limite(nome, escopo):
+    """Conta uma requisição recusada pelo balde `escopo` (ip ou conta) do limite `nome`"""
+    LIMITES.labels(nome, escopo).inc()
+
+
+@event.listens_for(Pool, 'connect')
+def _conexao_aberta(dbapi_connection, connection_record):
+    CONEXOES_ABERTAS.inc()
+
+
+@event.listens_for(Pool, 'checkout')
+def _conexao_retirada(dbapi_connection, connection_record, connection_proxy):
+    CONEXOES_EM_USO.inc()
+
+
+@event.listens_for(Pool, 'checkin')
+def _conexao_devolvida(dbapi_connection, connection_record):
+    CONEXOES_EM_USO.dec()
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def init_app(app):
+    """Registra a medição por requisição e o endpoint /api/metrics"""
+
+    @app.before_request
+    def iniciar_medicao():
+        g.metrics_inicio = time.perf_counter()
+
+    @app.after_request
+    def registrar_medicao(response):
+        inicio = g.get('metrics_inicio')
+        if inicio is None:
+            return response
+        duracao = time.perf_counter() - inicio
+
+        endpoint = request.endpoint or 'desconhecido'
+        blueprint = request.blueprint or ''
+        chave = (endpoint, request.method, response.status_code)
+
+        contador = _contadores.get(chave)
+        if contador is None:
+            contador = _contadores[chave] = REQUISICOES.labels(
+                blueprint, endpoint, request.method, str(response.status_code))
+        contador.inc()
+
+        histograma = _histogramas.get(endpoint)
+        if histograma is None:
+            histograma = _histogramas[endpoint] = LATENCIA.labels(blueprint, endpoint)
+        histograma.observe(duracao)
+        return response
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
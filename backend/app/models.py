@@ -1,7 +1,45 @@
 from datetime import datetime, timedelta, timezone
+from math import isqrt
 from app import db
+from app.projecoes import GRUPO_DETALHES
 from werkzeug.security import generate_password_hash, check_password_hash
 
+def serializar_campos(objeto, campos):
+    """Serializa apenas `campos` (chaves de objeto.CAMPOS), sem tocar nas demais colunas"""
+    data = {}
+    for campo in campos:
+        valor = getattr(objeto, objeto.CAMPOS[campo])
+        data[campo] = valor.isoformat() if isinstance(valor, datetime) else valor
+    return data
+
+def xp_acumulado(nivel, xp):
+    """XP total desde o nível 1: o nível n exige n * 20 XP para subir"""
+    return 10 * nivel * (nivel - 1) + xp
+
+def nivel_por_xp(total):
+    """(nivel, xp no nível) para um XP total, em forma fechada"""
+    # Maior n com 10 * n * (n - 1) <= total, ou seja, (2n - 1)^2 <= (2 * total + 5) / 5
+    nivel = (isqrt((2 * total + 5) // 5) + 1) // 2
+    return nivel, total - 10 * nivel * (nivel - 1)
+
+def contar_sequencia(datas):
+    """Dias consecutivos a partir da data mais recente (`datas` em ordem decrescente)"""
+    if not datas:
+        return 0
+    
+    sequencia = 1
+    data_anterior = datas[0].date()
+    
+    for data in datas[1:]:
+        data_atual = data.date()
+        if (data_anterior - data_atual).days == 1:
+            sequencia += 1
+            data_anterior = data_atual
+        else:
+            break
+    
+    return sequencia
+
 class Usuario(db.Model):
     __tablename__ = 'usuarios'
     
@@ -16,7 +54,7 @@ class Usuario(db.Model):
     
     # Novos campos para V2
     tipo_usuario = db.Column(db.String(20), default='aluno')  # 'aluno' ou 'professor'
-    turma_id = db.Column(db.Integer, db.ForeignKey('turmas.id'), nullable=True)
+    turma_id = db.Column(db.Integer, db.ForeignKey('turmas.id'), nullable=True, index=True)
     
     # Relacionamentos
     avaliacoes = db.relationship('Avaliacao', backref='usuario', lazy=True)
@@ -76,7 +114,7 @@ class Usuario(db.Model):
         # Adicionar informações de professor se for professor
         if self.tipo_usuario == 'professor':
             data['turmas_criadas'] = len(self.turmas_criadas)
-            data['total_alunos'] = sum(len(turma.alunos) for turma in self.turmas_criadas)
+            data['total_alunos'] = sum(turma.total_alunos for turma in self.turmas_criadas)
         
         return data
 
@@ -87,32 +125,30 @@ class Usuario(db.Model):
             status='concluído'
         ).order_by(Resultado.data_conclusao.desc()).all()
         
-        if not resultados:
-            return 0
-            
-        sequencia = 1
-        data_anterior = resultados[0].data_conclusao.date()
-        
-        for resultado in resultados[1:]:
-            data_atual = resultado.data_conclusao.date()
-            if (data_anterior - data_atual).days == 1:
-                sequencia += 1
-                data_anterior = data_atual
-            else:
-                break
-        
-        return sequencia
-    
-    def adicionar_xp(self, quantidade):
-        """Adiciona XP e atualiza nível se necessário"""
-        self.xp += quantidade
-
-        # Verifica se deve subir de nível
-        while self.xp >= self.calcular_proximo_nivel_xp():
-            self.xp -= self.calcular_proximo_nivel_xp()
-            self.nivel += 1
-
-        return self.nivel
+        return contar_sequencia([resultado.data_conclusao for resultado in resultados])
+    
+    @staticmethod
+    def ganhar_xp(usuario_id, quantidade):
+        """Soma XP no banco, sem ler-modificar-escrever em Python; retorna (nivel, xp)"""
+        tabela = Usuario.__table__
+        # Incremento atômico: o UPDATE trava a linha até o commit
+        atual = db.session.execute(
+            tabela.update()
+            .where(tabela.c.id == usuario_id)
+            .values(xp=tabela.c.xp + quantidade)
+            .returning(tabela.c.nivel, tabela.c.xp)
+        ).first()
+        if atual is None:
+            return None
+        nivel, xp = nivel_por_xp(xp_acumulado(atual.nivel, atual.xp))
+        if nivel != atual.nivel:
+            # Relativo e condicionado ao nível lido: seguro mesmo sem a trava da linha
+            db.session.execute(
+                tabela.update()
+                .where(tabela.c.id == usuario_id, tabela.c.nivel == atual.nivel)
+                .values(nivel=nivel, xp=tabela.c.xp - (atual.xp - xp))
+            )
+        return nivel, xp
 
 class Avaliacao(db.Model):
     __tablename__ = 'avaliacoes'
@@ -126,25 +162,27 @@ class Avaliacao(db.Model):
     # Armazenar as respostas do teste como JSON
     respostas = db.Column(db.JSON)
     
-    def calcular_medias_por_categoria(self):
+    def calcular_medias_por_categoria(self, categorias_perguntas=None):
+        """Média das respostas por categoria; `categorias_perguntas` ({id: categoria}) evita consultar as perguntas"""
         if not self.respostas:
             return {}
-            
-        perguntas = PerguntaTeste.query.all()
+        
+        if categorias_perguntas is None:
+            categorias_perguntas = categorias_das_perguntas()
         categorias = {}
         
-        for pergunta in perguntas:
-            if str(pergunta.id) in self.respostas:
-                if pergunta.categoria not in categorias:
-                    categorias[pergunta.categoria] = []
-                categorias[pergunta.categoria].append(self.respostas[str(pergunta.id)])
+        for pergunta_id, categoria in categorias_perguntas.items():
+            if pergunta_id in self.respostas:
+                if categoria not in categorias:
+                    categorias[categoria] = []
+                categorias[categoria].append(self.respostas[pergunta_id])
         
         return {
             categoria: sum(valores) / len(valores)
             for categoria, valores in categorias.items()
         }
     
-    def to_dict(self):
+    def to_dict(self, categorias_perguntas=None):
         return {
             'id': self.id,
             'usuario_id': self.usuario_id,
@@ -152,18 +190,38 @@ class Avaliacao(db.Model):
             'pontuacao': self.pontuacao,
             'feedback': self.feedback,
             'respostas': self.respostas,
-            'medias_por_categoria': self.calcular_medias_por_categoria()
+            'medias_por_categoria': self.calcular_medias_por_categoria(categorias_perguntas)
         }
 
 class Desafio(db.Model):
     __tablename__ = 'desafios'
     
+    # Campo do to_dict -> atributo do modelo (usado por ?fields= e ?view=summary)
+    CAMPOS = {
+        'desafio_id': 'id',
+        'titulo': 'titulo',
+        'descricao': 'descricao',
+        'video_url': 'video_url',
+        'status': 'status',
+        'data_criacao': 'data_criacao',
+        'prazo': 'prazo',
+        'perguntas': 'perguntas',
+        'desafio_pratico': 'desafio_pratico'
+    }
+    CAMPOS_RESUMO = ('desafio_id', 'titulo', 'video_url', 'status', 'data_criacao', 'prazo')
+    STATUS = ('ativo', 'inativo')
+    
+    # Catálogo por turma: WHERE turma_id = ? AND status = ? ORDER BY data_criacao DESC
+    __table_args__ = (
+        db.Index('ix_desafios_turma_status_data', 'turma_id', 'status', 'data_criacao'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.String(100), nullable=False)
-    descricao = db.Column(db.Text, nullable=False)
+    descricao = db.deferred(db.Column(db.Text, nullable=False), group=GRUPO_DETALHES)
     video_url = db.Column(db.String(255))
     status = db.Column(db.String(20), default='ativo')  # ativo, inativo
-    data_criacao = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    data_criacao = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     prazo = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc) + timedelta(days=7))
     
     # Novos campos para V2
@@ -172,15 +230,17 @@ class Desafio(db.Model):
     gerado_por_ia = db.Column(db.Boolean, default=False)  # Se foi gerado por IA
     
     # Perguntas do quiz relacionadas ao desafio
-    perguntas = db.Column(db.JSON)
+    perguntas = db.deferred(db.Column(db.JSON), group=GRUPO_DETALHES)
     
     # Detalhes do desafio prático
-    desafio_pratico = db.Column(db.Text)
+    desafio_pratico = db.deferred(db.Column(db.Text), group=GRUPO_DETALHES)
     
     # Relacionamentos
     resultados = db.relationship('Resultado', backref='desafio', lazy=True)
     
-    def to_dict(self):
+    def to_dict(self, campos=None):
+        if campos is not None:
+            return serializar_campos(self, campos)
         return {
             'desafio_id': self.id,
             'titulo': self.titulo,
@@ -196,6 +256,27 @@ class Desafio(db.Model):
 class Resultado(db.Model):
     __tablename__ = 'resultados'
     
+    # Campo do to_dict -> atributo do modelo (usado por ?fields= e ?view=summary)
+    CAMPOS = {
+        'id': 'id',
+        'usuario_id': 'usuario_id',
+        'desafio_id': 'desafio_id',
+        'status': 'status',
+        'data_inicio': 'data_inicio',
+        'data_conclusao': 'data_conclusao',
+        'pontuacao': 'pontuacao',
+        'respostas_quiz': 'respostas_quiz',
+        'resposta_pratica': 'resposta_pratica'
+    }
+    CAMPOS_RESUMO = ('id', 'usuario_id', 'desafio_id', 'status', 'data_inicio', 'data_conclusao', 'pontuacao')
+    
+    # Resultados de um usuário por status (histórico, progresso, contagem de concluídos);
+    # no máximo um resultado por (usuário, desafio): alvo do ON CONFLICT de `registrar`
+    __table_args__ = (
+        db.Index('ix_resultados_usuario_status', 'usuario_id', 'status'),
+        db.Index('uq_resultados_usuario_desafio', 'usuario_id', 'desafio_id', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
     desafio_id = db.Column(db.Integer, db.ForeignKey('desafios.id'), nullable=False)
@@ -204,13 +285,15 @@ class Resultado(db.Model):
     data_conclusao = db.Column(db.DateTime)
     
     # Respostas do quiz e do desafio prático
-    respostas_quiz = db.Column(db.JSON)
-    resposta_pratica = db.Column(db.Text)
+    respostas_quiz = db.deferred(db.Column(db.JSON), group=GRUPO_DETALHES)
+    resposta_pratica = db.deferred(db.Column(db.Text), group=GRUPO_DETALHES)
     
     # Pontuação obtida
     pontuacao = db.Column(db.Integer, default=0)
     
-    def to_dict(self):
+    def to_dict(self, campos=None):
+        if campos is not None:
+            return serializar_campos(self, campos)
         return {
             'id': self.id,
             'usuario_id': self.usuario_id,
@@ -222,6 +305,46 @@ class Resultado(db.Model):
             'respostas_quiz': self.respostas_quiz,
             'resposta_pratica': self.resposta_pratica
         }
+    
+    @staticmethod
+    def registrar(usuario_id, desafio_id, status, **valores):
+        """
+        Cria o resultado do par (usuário, desafio) com `status` e `valores`, ou grava
+        só `valores` no já existente, sem consultar antes; retorna (linha, criado)
+        """
+        tabela = Resultado.__table__
+        dialeto = db.session.get_bind().dialect.name
+        if dialeto == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        colunas = [tabela.c[coluna] for coluna in Resultado.CAMPOS.values()]
+        par = (tabela.c.usuario_id == usuario_id, tabela.c.desafio_id == desafio_id)
+        comando = insert(tabela).values({'usuario_id': usuario_id, 'desafio_id': desafio_id, 'status': status,
+                                         'data_inicio': datetime.utcnow(), 'pontuacao': 0, **valores})
+        alvo = ['usuario_id', 'desafio_id']
+        
+        if dialeto == 'postgresql':
+            # Uma instrução nos dois casos: xmax = 0 só na linha recém-inserida
+            atualizar = {coluna: comando.excluded[coluna] for coluna in valores} or {'status': tabela.c.status}
+            linha = db.session.execute(
+                comando.on_conflict_do_update(index_elements=alvo, set_=atualizar)
+                .returning(*colunas, db.literal_column('xmax = 0').label('criado'))
+            ).first()
+            return linha, linha.criado
+        
+        # O RETURNING do SQLite não distingue inserção de atualização: o conflito
+        # (par já existente) segue em uma segunda instrução, ainda sem corrida
+        linha = db.session.execute(
+            comando.on_conflict_do_nothing(index_elements=alvo).returning(*colunas)
+        ).first()
+        if linha is not None:
+            return linha, True
+        if valores:
+            consulta = tabela.update().where(*par).values(**valores).returning(*colunas)
+        else:
+            consulta = db.select(*colunas).where(*par)
+        return db.session.execute(consulta).first(), False
 
 # Modelo para as perguntas do teste inicial
 class PerguntaTeste(db.Model):
@@ -240,6 +363,11 @@ class PerguntaTeste(db.Model):
             'ordem': self.ordem
         }
 
+def categorias_das_perguntas():
+    """{id da pergunta (texto, como nas respostas): categoria} do teste inicial, em uma consulta"""
+    return {str(pergunta_id): categoria
+            for pergunta_id, categoria in db.session.query(PerguntaTeste.id, PerguntaTeste.categoria)}
+
 # Novos modelos para V2
 
 class Turma(db.Model):
@@ -257,6 +385,18 @@ class Turma(db.Model):
     alunos = db.relationship('Usuario', foreign_keys='Usuario.turma_id', backref='turma', lazy=True)
     desafios = db.relationship('Desafio', foreign_keys='Desafio.turma_id', backref='turma', lazy=True)
     
+    # Subconsultas correlacionadas carregadas junto com a turma: o to_dict não
+    # materializa alunos e desafios nem busca o professor (uma consulta por lista)
+    professor_nome = db.column_property(
+        db.select(Usuario.nome).where(Usuario.id == professor_id).correlate_except(Usuario).scalar_subquery()
+    )
+    total_alunos = db.column_property(
+        db.select(db.func.count(Usuario.id)).where(Usuario.turma_id == id).correlate_except(Usuario).scalar_subquery()
+    )
+    total_desafios = db.column_property(
+        db.select(db.func.count(Desafio.id)).where(Desafio.turma_id == id).correlate_except(Desafio).scalar_subquery()
+    )
+    
     def gerar_codigo(self):
         """Gera um código único para a turma"""
         import random
@@ -279,11 +419,11 @@ class Turma(db.Model):
             'codigo': self.codigo,
             'descricao': self.descricao,
             'professor_id': self.professor_id,
-            'professor_nome': self.professor.nome if self.professor else None,
+            'professor_nome': self.professor_nome,
             'data_criacao': self.data_criacao.isoformat(),
             'ativa': self.ativa,
-            'total_alunos': len(self.alunos),
-            'total_desafios': len(self.desafios)
+            'total_alunos': self.total_alunos,
+            'total_desafios': self.total_desafios
         }
 
 class TesteInicialLikert(db.Model):
@@ -343,3 +483,79 @@ class TesteInicialLikert(db.Model):
                 'lideranca': self.pontuacao_lideranca
             }
         }
+
+class EventoTurma(db.Model):
+    """Eventos dos alunos publicados para o stream SSE do professor (ver app/eventos.py)"""
+    __tablename__ = 'eventos_turma'
+    
+    # Stream do professor: WHERE professor_id = ? AND id > ? ORDER BY id
+    __table_args__ = (
+        db.Index('ix_eventos_turma_professor_id', 'professor_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)  # também é o id do evento SSE
+    professor_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=False)
+    turma_id = db.Column(db.Integer, db.ForeignKey('turmas.id'), nullable=False)
+    tipo = db.Column(db.String(30), nullable=False)
+    dados = db.Column(db.JSON, nullable=False)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class VersaoBootstrap(db.Model):
+    """Etapas de schema/seed já aplicadas pelo bootstrap.py"""
+    __tablename__ = 'bootstrap_versao'
+
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, unique=True, nullable=False)
+    descricao = db.Column(db.String(200))
+    data_execucao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class InvalidacaoCache(db.Model):
+    """Tags invalidadas em cada commit, lidas pelos demais workers fora do Postgres (ver app/barramento.py)"""
+    __tablename__ = 'invalidacoes_cache'
+    
+    id = db.Column(db.Integer, primary_key=True)  # os workers leem as linhas com id > último lido
+    tags = db.Column(db.JSON, nullable=False)
+    origem = db.Column(db.String(80), nullable=False)  # processo que invalidou (não reaplica as próprias)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class TurmaStats(db.Model):
+    """Estatísticas da turma mantidas pelas rotas de escrita (ver app/estatisticas.py)"""
+    __tablename__ = 'turma_stats'
+    
+    turma_id = db.Column(db.Integer, db.ForeignKey('turmas.id'), primary_key=True)
+    total_alunos = db.Column(db.Integer, nullable=False, default=0)
+    alunos_com_teste = db.Column(db.Integer, nullable=False, default=0)
+    total_desafios = db.Column(db.Integer, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DesafioStats(db.Model):
+    """Participantes e conclusões de cada desafio (ver app/estatisticas.py)"""
+    __tablename__ = 'desafio_stats'
+    
+    desafio_id = db.Column(db.Integer, db.ForeignKey('desafios.id'), primary_key=True)
+    participantes = db.Column(db.Integer, nullable=False, default=0)
+    concluidos = db.Column(db.Integer, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RespostaIdempotente(db.Model):
+    """Primeira resposta de cada Idempotency-Key (ver app/idempotencia.py)"""
+    __tablename__ = 'respostas_idempotentes'
+    
+    chave = db.Column(db.String(64), primary_key=True)  # sha256 de usuário, rota e Idempotency-Key
+    impressao = db.Column(db.String(64), nullable=False)  # sha256 do corpo da requisição
+    estado = db.Column(db.String(12), nullable=False, default='processando')  # processando, concluida
+    status = db.Column(db.Integer)
+    corpo = db.Column(db.Text)
+    mimetype = db.Column(db.String(100))
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class TokenRevogado(db.Model):
+    """jti ou família de tokens JWT revogados até expirarem (ver app/revogacao.py)"""
+    __tablename__ = 'tokens_revogados'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    chave = db.Column(db.String(36), unique=True, nullable=False)  # jti do token ou claim fam
+    motivo = db.Column(db.String(20), nullable=False)  # rotacionado, reutilizado, logout
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
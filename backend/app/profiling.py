@@ -0,0 +1,164 @@
+"""
+Profiling sob demanda de requisições individuais.
+
+Uma requisição é perfilada quando traz um token assinado (gerado com
+`flask --app run perfil-token`) no header X-Profile-Token ou no parâmetro
+`_profile`, ou quando é sorteada pela fração PROFILE_SAMPLE_RATE.
+O perfil é salvo em PROFILE_DIR no formato:
+  - folded: pilhas colapsadas (flamegraph.pl, speedscope, inferno)
+  - pstats: cProfile (snakeviz, flameprof, pstats)
+Com X-Profile-Inline: 1 (ou `_profile_inline=1`) em uma requisição com o token,
+o perfil volta no corpo da resposta. As sorteadas só gravam em PROFILE_DIR: o
+cliente não pediu o perfil e recebe a resposta normal.
+
+Com workers gevent (threading monkey-patched) o amostrador não funciona: ele
+seria um greenlet que só roda quando a requisição cede o controle, e
+sys._current_frames() enxerga threads do sistema, não greenlets. Nesse caso o
+perfil é sempre gerado com cProfile (pstats), qualquer que seja PROFILE_FORMAT.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from flask import g, request, Response
+from itsdangerous import BadSignature, TimestampSigner
+
+SALT_TOKEN = 'humaniq-profiling'
+
+
+def _threading_cooperativo():
+    """True quando o gevent substituiu o threading (worker gevent do gunicorn)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+class Amostrador(threading.Thread):
+    """Profiler estatístico: amostra periodicamente a pilha da thread alvo"""
+
+    def __init__(self, thread_id, intervalo):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.thread_id)
+            pilha = []
+            while frame is not None:
+                code = frame.f_code
+                pilha.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if pilha:
+                self.pilhas[';'.join(reversed(pilha))] += 1
+
+    def finalizar(self):
+        self._parar.set()
+        self.join()
+
+    def salvar(self, caminho):
+        with open(caminho, 'w') as arquivo:
+            arquivo.write(self.folded())
+
+    def folded(self):
+        return ''.join(f'{pilha} {total}\n' for pilha, total in self.pilhas.most_common())
+
+
+class PerfilCProfile:
+    """Adaptador do cProfile com a mesma interface do Amostrador"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def finalizar(self):
+        self.profiler.disable()
+
+    def salvar(self, caminho):
+        self.profiler.dump_stats(caminho)
+
+
+def _signer(app):
+    return TimestampSigner(app.config['SECRET_KEY'], salt=SALT_TOKEN)
+
+
+def gerar_token(app):
+    """Gera um token de profiling assinado com a SECRET_KEY da aplicação"""
+    return _signer(app).sign(b'profile').decode()
+
+
+def token_valido(app, token):
+    try:
+        _signer(app).unsign(token, max_age=app.config['PROFILE_TOKEN_MAX_AGE'])
+        return True
+    except BadSignature:
+        return False
+
+
+def init_app(app):
+    """Registra os hooks de profiling e o comando `perfil-token`"""
+
+    @app.cli.command('perfil-token')
+    def perfil_token():
+        """Imprime um token de profiling para uso por administradores"""
+        print(gerar_token(app))
+
+    def _com_token():
+        token = request.headers.get('X-Profile-Token') or request.args.get('_profile')
+        return bool(token) and token_valido(app, token)
+
+    def _sorteada():
+        taxa = app.config['PROFILE_SAMPLE_RATE']
+        return taxa > 0 and random.random() < taxa
+
+    @app.before_request
+    def iniciar_profiling():
+        g.perfil_autorizado = _com_token()
+        if not g.perfil_autorizado and not _sorteada():
+            return
+        if app.config['PROFILE_FORMAT'] == 'pstats' or _threading_cooperativo():
+            g.perfil = PerfilCProfile()
+        else:
+            g.perfil = Amostrador(threading.get_ident(), app.config['PROFILE_INTERVAL'])
+            g.perfil.start()
+
+    @app.after_request
+    def finalizar_profiling(response):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return response
+        perfil.finalizar()
+
+        extensao = 'prof' if isinstance(perfil, PerfilCProfile) else 'folded'
+        agora = time.time()
+        nome = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(agora))}.{int(agora * 1000) % 1000:03d}"
+                f"-{request.endpoint or 'desconhecido'}-{os.getpid()}.{extensao}")
+        os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+        perfil.salvar(os.path.join(app.config['PROFILE_DIR'], nome))
+
+        # Só quem apresentou o token recebe o perfil no lugar da resposta
+        inline = request.headers.get('X-Profile-Inline') == '1' or request.args.get('_profile_inline') == '1'
+        if inline and g.get('perfil_autorizado'):
+            with open(os.path.join(app.config['PROFILE_DIR'], nome), 'rb') as arquivo:
+                response = Response(arquivo.read(), mimetype='application/octet-stream')
+            response.headers['Content-Disposition'] = f'attachment; filename={nome}'
+        response.headers['X-Profile'] = nome
+        return response
+
+    @app.teardown_request
+    def descartar_profiling(exc):
+        # Garante que o profiler pare se a requisição falhar antes do after_request.
+        # Sem erro o after_request já tratou o perfil; além disso as sub-requisições
+        # do /api/batch compartilham o `g` e não podem encerrar o perfil do batch.
+        if exc is None:
+            return
+        perfil = g.pop('perfil', None)
+        if perfil is not None:
+            perfil.finalizar()
@@ -0,0 +1,56 @@
+"""
+Projeções de campos para os endpoints (?fields= e ?view=summary).
+
+As colunas pesadas (JSON/Text) dos modelos ficam no grupo deferido
+GRUPO_DETALHES: só são buscadas quando a representação completa é pedida
+(undefer_group) ou quando o atributo é acessado diretamente.
+
+Endpoints de listagem somente leitura usam `consultar_linhas`: um select de
+colunas que devolve tuplas nomeadas, sem instanciar modelos, registrar
+objetos no identity map da sessão nem preparar lazy loads.
+"""
+from datetime import datetime
+from flask import request
+from sqlalchemy.orm import load_only, undefer_group
+from app import db
+
+GRUPO_DETALHES = 'detalhes'
+
+
+def campos_solicitados(modelo):
+    """Campos do to_dict pedidos na requisição; None significa a representação completa"""
+    fields = request.args.get('fields')
+    if fields:
+        pedidos = {campo.strip() for campo in fields.split(',')}
+        # O identificador (primeira chave de CAMPOS) sempre acompanha a projeção
+        identificador = next(iter(modelo.CAMPOS))
+        return (identificador,) + tuple(
+            campo for campo in modelo.CAMPOS if campo in pedidos and campo != identificador
+        )
+    if request.args.get('view') == 'summary':
+        return modelo.CAMPOS_RESUMO
+    return None
+
+
+def opcoes_carga(modelo, campos, extras=()):
+    """Opções de query que buscam apenas as colunas necessárias para `campos` (mais `extras`)"""
+    if campos is None:
+        return [undefer_group(GRUPO_DETALHES)]
+    atributos = {modelo.CAMPOS[campo] for campo in campos} | {'id'} | set(extras)
+    return [load_only(*(getattr(modelo, atributo) for atributo in atributos))]
+
+
+def consultar_linhas(consulta):
+    """Executa um select de colunas e devolve as linhas (Row) sem passar pelo ORM"""
+    return db.session.execute(consulta).all()
+
+
+def linhas_para_dicts(linhas):
+    """Linhas de `consultar_linhas` -> dicts, com datas em ISO 8601 como nos to_dict"""
+    return [
+        {
+            campo: valor.isoformat() if isinstance(valor, datetime) else valor
+            for campo, valor in linha._mapping.items()
+        }
+        for linha in linhas
+    ]
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Avaliacao, PerguntaTeste
+from app.models import Usuario, Avaliacao, PerguntaTeste, categorias_das_perguntas
 from app import db
 
 assessment_bp = Blueprint('assessment', __name__)
@@ -79,9 +79,12 @@ def obter_historico():
         usuario_id=int(current_user_id)
     ).order_by(Avaliacao.data.desc()).all()
     
+    # Perguntas consultadas uma vez para todas as avaliações
+    categorias = categorias_das_perguntas() if avaliacoes else {}
+    
     return jsonify({
         'message': 'Histórico obtido com sucesso',
-        'avaliacoes': [avaliacao.to_dict() for avaliacao in avaliacoes]
+        'avaliacoes': [avaliacao.to_dict(categorias) for avaliacao in avaliacoes]
     }), 200
 
 def gerar_feedback(pontuacao):
@@ -1,14 +1,15 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import (
-    create_access_token, create_refresh_token,
-    jwt_required, get_jwt_identity
-)
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app.models import Usuario
 from app import db
+from app.limites import limitar, email_e_ip_da_requisicao
+from app.revogacao import emitir_tokens, revogar, revogar_familia, rotacao_recente
+from datetime import datetime, timezone
 
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/login', methods=['POST'])
+@limitar('login', conta=email_e_ip_da_requisicao)
 def login():
     """
     Endpoint para autenticação de usuários
@@ -43,9 +44,8 @@ def login():
                 'message': 'Email ou senha inválidos.'
             }), 401
         
-        # Criar tokens JWT
-        access_token = create_access_token(identity=str(usuario.id))
-        refresh_token = create_refresh_token(identity=str(usuario.id))
+        # Criar tokens JWT (uma nova família de refresh tokens por login)
+        access_token, refresh_token = emitir_tokens(usuario.id)
         
         user_data = usuario.to_dict()
         print("User data:", user_data)  # Debug log
@@ -70,22 +70,55 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     """
-    Endpoint para renovar o token de acesso usando o token de refresh
+    Endpoint para renovar os tokens usando o token de refresh
     ---
     Requer:
-      - Token de refresh JWT válido
+      - Token de refresh JWT válido (cada um pode ser usado uma única vez)
     Retorna:
       - Novo token de acesso JWT
+      - Novo token de refresh JWT (substitui o enviado, que deixa de valer)
     """
+    token = get_jwt()
     current_user_id = get_jwt_identity()
-    new_access_token = create_access_token(identity=current_user_id)
+    
+    # Rotação: o refresh apresentado é revogado; reapresentá-lo revoga a família inteira,
+    # exceto dentro de JWT_REFRESH_TOLERANCIA, quando a repetição recebe o mesmo par
+    expira_em = datetime.fromtimestamp(token['exp'], timezone.utc).replace(tzinfo=None)
+    momento = datetime.utcnow().replace(microsecond=0)
+    if not revogar(token['jti'], 'rotacionado', int(current_user_id), expira_em, data_criacao=momento):
+        # Troca já feita (repetição do cliente ou requisição concorrente)
+        momento = rotacao_recente(token['jti'])
+        if momento is None:
+            return jsonify({'message': 'Token de refresh já utilizado'}), 401
+    
+    new_access_token, new_refresh_token = emitir_tokens(current_user_id, familia=token.get('fam', token['jti']),
+                                                        rotacao=(token['jti'], momento))
+    db.session.commit()
     
     return jsonify({
         'message': 'Token renovado com sucesso',
-        'access_token': new_access_token
+        'access_token': new_access_token,
+        'refresh_token': new_refresh_token
     }), 200
 
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(verify_type=False)
+def logout():
+    """
+    Endpoint para encerrar a sessão
+    ---
+    Requer:
+      - Token de acesso ou de refresh JWT válido
+    Retorna:
+      - Confirmação; todos os tokens emitidos pelo mesmo login deixam de valer
+    """
+    revogar_familia(get_jwt(), 'logout')
+    db.session.commit()
+    
+    return jsonify({'message': 'Logout realizado com sucesso'}), 200
+
 @auth_bp.route('/register', methods=['POST'])
+@limitar('registro', conta=email_e_ip_da_requisicao)
 def registro():
     """
     Endpoint para registro de novos usuários
@@ -126,8 +159,7 @@ def registro():
     db.session.commit()
     
     # Criar tokens JWT
-    access_token = create_access_token(identity=str(novo_usuario.id))
-    refresh_token = create_refresh_token(identity=str(novo_usuario.id))
+    access_token, refresh_token = emitir_tokens(novo_usuario.id)
     
     return jsonify({
         'message': 'Usuário registrado com sucesso',
@@ -0,0 +1,134 @@
+"""
+Agrupamento de requisições GET em uma única chamada (/api/batch).
+
+Na carga inicial o frontend faz várias leituras seguidas (/users/me,
+/desafios/destaque, /desafios, ...). Com o batch elas viajam em uma única ida
+e volta e são executadas em sequência, cada uma em um contexto de requisição
+aninhado no mesmo app context: a sessão do SQLAlchemy é compartilhada (o
+identity map evita buscar o mesmo usuário a cada endpoint) e o `g` também.
+Durante o batch a sessão retém só o usuário autenticado; os demais objetos
+carregados por uma sub-requisição podem ser liberados ao fim dela.
+Os hooks before/after_request (métricas, contagem de SQL, profiling) rodam uma
+vez só, para o batch inteiro. Respostas em stream (ex.: /professor/eventos)
+não cabem no envelope e voltam como erro 400 naquele item.
+"""
+import json
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.test import EnvironBuilder
+from app import db
+from app.models import Usuario
+
+batch_bp = Blueprint('batch', __name__)
+
+# Headers da requisição do batch repassados para cada sub-requisição
+HEADERS_REPASSADOS = ('Authorization', 'Accept', 'Accept-Language', 'User-Agent')
+
+
+@event.listens_for(Session, 'loaded_as_persistent')
+def _reter_durante_batch(session, instancia):
+    # O identity map guarda referências fracas: sem isso o usuário carregado por
+    # um endpoint seria liberado ao fim dele e buscado de novo pelo próximo.
+    # Só o usuário do batch: reter tudo manteria cada listagem na memória até o fim
+    retidos = session.info.get('batch_retidos')
+    if retidos is not None and isinstance(instancia, Usuario) and instancia.id == session.info.get('batch_usuario_id'):
+        retidos.append(instancia)
+
+
+def _normalizar(itens):
+    """Valida a lista recebida; retorna ([(id, caminho)], None) ou (None, mensagem de erro)"""
+    if not isinstance(itens, list) or not itens:
+        return None, 'Informe uma lista não vazia em "requests"'
+    limite = current_app.config['BATCH_MAX_REQUESTS']
+    if len(itens) > limite:
+        return None, f'No máximo {limite} requisições por batch'
+
+    requisicoes = []
+    for indice, item in enumerate(itens):
+        if isinstance(item, str):
+            item = {'path': item}
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            return None, f'Requisição {indice}: informe "path"'
+        if item.get('method', 'GET').upper() != 'GET':
+            return None, f'Requisição {indice}: apenas GET é permitido'
+
+        # Caminhos relativos a /api, como os usados pelo frontend (ex.: /users/me)
+        caminho = item['path']
+        if not caminho.startswith('/api/'):
+            caminho = '/api/' + caminho.lstrip('/')
+        if caminho.split('?', 1)[0].rstrip('/') == '/api/batch':
+            return None, f'Requisição {indice}: batch aninhado não é permitido'
+        requisicoes.append((item.get('id', indice), caminho))
+    return requisicoes, None
+
+
+def _executar(caminho):
+    """Despacha um GET interno no app context atual e retorna a Response"""
+    app = current_app._get_current_object()
+    headers = {nome: request.headers[nome] for nome in HEADERS_REPASSADOS if nome in request.headers}
+    builder = EnvironBuilder(path=caminho, method='GET', base_url=request.host_url, headers=headers)
+    try:
+        environ = builder.get_environ()
+    finally:
+        builder.close()
+
+    with app.request_context(environ):
+        try:
+            try:
+                rv = app.dispatch_request()
+            except Exception as e:
+                # Erros HTTP e os handlers registrados (ex.: JWT inválido) viram resposta normal
+                rv = app.handle_user_exception(e)
+        except Exception:
+            # A sessão é compartilhada: não deixa uma falha contaminar as próximas
+            db.session.rollback()
+            current_app.logger.exception('Erro na sub-requisição %s do batch', caminho)
+            rv = jsonify({'message': 'Erro interno do servidor'}), 500
+        return app.make_response(rv)
+
+
+@batch_bp.route('', methods=['POST'])
+@jwt_required()
+def executar_batch():
+    """
+    Endpoint para executar várias requisições GET em uma única chamada
+    ---
+    Requer:
+      - Token de acesso JWT válido (repassado para cada requisição)
+    Parâmetros:
+      - requests: Lista de caminhos ("/users/me") ou objetos {"id", "path", "method": "GET"}
+    Retorna:
+      - responses: Lista na mesma ordem, com id, status e body de cada requisição
+    """
+    data = request.get_json(silent=True) or {}
+    requisicoes, erro = _normalizar(data.get('requests'))
+    if erro:
+        return jsonify({'message': erro}), 400
+
+    partes = []
+    db.session.info['batch_retidos'] = []
+    db.session.info['batch_usuario_id'] = int(get_jwt_identity())
+    try:
+        for identificador, caminho in requisicoes:
+            resposta = _executar(caminho)
+            status = resposta.status_code
+            if resposta.is_streamed:
+                # Ler o corpo esperaria o stream inteiro (o do SSE dura SSE_MAX_DURATION)
+                resposta.close()
+                status = 400
+                corpo = json.dumps({'message': 'Respostas em stream não são permitidas no batch'})
+            else:
+                corpo = resposta.get_data(as_text=True)
+                # Corpos JSON entram no envelope como estão, sem decodificar e serializar de novo
+                if not resposta.is_json or not corpo.strip():
+                    corpo = json.dumps(corpo)
+            partes.append('{"id": ' + json.dumps(identificador) + ', "status": ' + str(status)
+                          + ', "body": ' + corpo + '}')
+    finally:
+        db.session.info.pop('batch_retidos', None)
+        db.session.info.pop('batch_usuario_id', None)
+
+    corpo = '{"responses": [' + ', '.join(partes) + ']}'
+    return current_app.response_class(corpo, mimetype='application/json'), 200
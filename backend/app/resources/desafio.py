@@ -1,62 +1,74 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timezone
 from app.models import Usuario, Desafio, Resultado
+from sqlalchemy.orm import undefer
 from app import db
+from app.catalogo import obter_catalogo, turmas_visiveis
+from app.projecoes import campos_solicitados, opcoes_carga, linhas_para_dicts
+from app.eventos import publicar_evento
+from app.cache import obter_cache, invalidar_tags
+from app.estatisticas import ajustar_desafio
+from app.idempotencia import idempotente
 
 desafio_bp = Blueprint('desafio', __name__)
 
+XP_POR_DESAFIO = 10
+
+
+def invalidar_progresso(usuario_id, turma_id=None):
+    """Tags afetadas por um novo resultado do usuário (perfil dele e relatório da turma)"""
+    if turma_id is None:
+        turma_id = db.session.query(Usuario.turma_id).filter_by(id=usuario_id).scalar()
+    invalidar_tags(f'usuario:{usuario_id}', *([f'turma:{turma_id}'] if turma_id else []))
+
 @desafio_bp.route('', methods=['GET'])
 @jwt_required()
 def listar_desafios():
     """
-    Endpoint para listar todos os desafios disponíveis
+    Endpoint para listar os desafios visíveis ao usuário (globais e da sua turma)
     ---
     Requer:
       - Token de acesso JWT válido
     Parâmetros de consulta:
       - status: Filtrar por status (ativo, inativo)
+      - fields: Lista de campos separados por vírgula (opcional)
+      - view: 'summary' para omitir descrição, perguntas e desafio prático (opcional)
     Retorna:
       - Lista de desafios
     """
     current_user_id = get_jwt_identity()
     
-    # Filtrar por status se fornecido
-    status = request.args.get('status')
-    query = Desafio.query
-    
-    if status:
-        query = query.filter_by(status=status)
-    
-    # Obter todos os desafios
-    desafios = query.order_by(Desafio.data_criacao.desc()).all()
-    
-    # Obter resultados do usuário para cada desafio
-    resultados = {r.desafio_id: r for r in Resultado.query.filter_by(usuario_id=int(current_user_id)).all()}
-    
-    # Preparar dados para retorno
-    desafios_data = []
-    for desafio in desafios:
-        desafio_dict = desafio.to_dict()
-        
-        # Adicionar informações sobre o progresso do usuário neste desafio
-        if desafio.id in resultados:
-            resultado = resultados[desafio.id]
-            desafio_dict['progresso'] = {
-                'status': resultado.status,
-                'data_inicio': resultado.data_inicio.isoformat(),
-                'data_conclusao': resultado.data_conclusao.isoformat() if resultado.data_conclusao else None,
-                'pontuacao': resultado.pontuacao
-            }
-        else:
-            desafio_dict['progresso'] = None
-        
-        desafios_data.append(desafio_dict)
-    
-    return jsonify({
-        'message': 'Desafios obtidos com sucesso',
-        'desafios': desafios_data
-    }), 200
+    # Catálogo já serializado (compartilhado por turma), filtrado por status se fornecido
+    status = request.args.get('status') or None
+    if status is not None and status not in Desafio.STATUS:
+        return jsonify({'message': f'Status inválido. Use um de: {", ".join(Desafio.STATUS)}.'}), 400
+    catalogo = obter_catalogo(status, turmas_visiveis(int(current_user_id)), campos_solicitados(Desafio))
+    
+    # Progresso do usuário em cada desafio (apenas as colunas necessárias)
+    resultados = db.session.query(
+        Resultado.desafio_id,
+        Resultado.status,
+        Resultado.data_inicio,
+        Resultado.data_conclusao,
+        Resultado.pontuacao
+    ).filter_by(usuario_id=int(current_user_id)).all()
+    progresso = {
+        r.desafio_id: current_app.json.dumps({
+            'status': r.status,
+            'data_inicio': r.data_inicio.isoformat(),
+            'data_conclusao': r.data_conclusao.isoformat() if r.data_conclusao else None,
+            'pontuacao': r.pontuacao
+        })
+        for r in resultados
+    }
+    
+    # Apenas o progresso é serializado por requisição; o restante vem pronto do catálogo
+    corpo = (
+        '{"desafios": ' + catalogo.json_com('progresso', progresso) +
+        ', "message": ' + current_app.json.dumps('Desafios obtidos com sucesso') + '}'
+    )
+    return current_app.response_class(corpo, mimetype='application/json'), 200
 
 @desafio_bp.route('/<int:desafio_id>', methods=['GET'])
 @jwt_required()
@@ -68,22 +80,30 @@ def obter_desafio(desafio_id):
       - Token de acesso JWT válido
     Parâmetros:
       - desafio_id: ID do desafio
+    Parâmetros de consulta:
+      - fields / view: Projeção dos campos do desafio (opcional)
     Retorna:
       - Detalhes do desafio
     """
     current_user_id = get_jwt_identity()
     
-    # Obter o desafio
-    desafio = Desafio.query.get(desafio_id)
+    # Obter o desafio (apenas as colunas pedidas), em cache até ser editado
+    campos = campos_solicitados(Desafio)
     
-    if not desafio:
+    def carregar_desafio():
+        desafio = Desafio.query.options(*opcoes_carga(Desafio, campos)).get(desafio_id)
+        return desafio.to_dict(campos) if desafio else None
+    
+    dados_desafio = obter_cache('desafio', (desafio_id, campos), carregar_desafio, tags=[f'desafio:{desafio_id}'])
+    
+    if not dados_desafio:
         return jsonify({'message': 'Desafio não encontrado'}), 404
     
     # Obter resultado do usuário para este desafio
     resultado = Resultado.query.filter_by(usuario_id=int(current_user_id), desafio_id=desafio_id).first()
     
-    # Preparar dados para retorno
-    desafio_dict = desafio.to_dict()
+    # Preparar dados para retorno (cópia: o dict em cache é compartilhado)
+    desafio_dict = dict(dados_desafio)
     
     # Adicionar informações sobre o progresso do usuário neste desafio
     if resultado:
@@ -103,6 +123,7 @@ def obter_desafio(desafio_id):
 
 @desafio_bp.route('/<int:desafio_id>/iniciar', methods=['POST'])
 @jwt_required()
+@idempotente
 def iniciar_desafio(desafio_id):
     """
     Endpoint para iniciar um desafio
@@ -122,33 +143,29 @@ def iniciar_desafio(desafio_id):
     if not desafio:
         return jsonify({'message': 'Desafio não encontrado'}), 404
     
-    # Verificar se o usuário já iniciou este desafio
-    resultado_existente = Resultado.query.filter_by(usuario_id=int(current_user_id), desafio_id=desafio_id).first()
+    # Cria o resultado ou devolve o existente, sem consultar antes (sem corrida entre requisições)
+    linha, criado = Resultado.registrar(int(current_user_id), desafio_id, 'pendente')
+    resultado = linhas_para_dicts([linha])[0]
+    resultado.pop('criado', None)
     
-    if resultado_existente:
+    if not criado:
         return jsonify({
             'message': 'Desafio já iniciado anteriormente',
-            'resultado': resultado_existente.to_dict()
+            'resultado': resultado
         }), 200
     
-    # Criar novo registro de resultado
-    novo_resultado = Resultado(
-        usuario_id=int(current_user_id),
-        desafio_id=desafio_id,
-        status='pendente',
-        data_inicio=datetime.utcnow()
-    )
-    
-    db.session.add(novo_resultado)
+    ajustar_desafio(desafio_id, participantes=1)
+    invalidar_progresso(int(current_user_id))
     db.session.commit()
     
     return jsonify({
         'message': 'Desafio iniciado com sucesso',
-        'resultado': novo_resultado.to_dict()
+        'resultado': resultado
     }), 201
 
 @desafio_bp.route('/<int:desafio_id>/submeter', methods=['POST'])
 @jwt_required()
+@idempotente
 def submeter_desafio(desafio_id):
     current_user_id = get_jwt_identity()
     data = request.get_json()
@@ -159,27 +176,13 @@ def submeter_desafio(desafio_id):
             'error': 'MISSING_ANSWERS'
         }), 400
     
-    desafio = Desafio.query.get(desafio_id)
+    desafio = Desafio.query.options(undefer(Desafio.perguntas)).get(desafio_id)
     if not desafio:
         return jsonify({
             'message': 'Desafio não encontrado',
             'error': 'CHALLENGE_NOT_FOUND'
         }), 404
     
-    # Obter ou criar resultado
-    resultado = Resultado.query.filter_by(
-        usuario_id=int(current_user_id), 
-        desafio_id=desafio_id
-    ).first()
-    
-    if not resultado:
-        resultado = Resultado(
-            usuario_id=int(current_user_id),
-            desafio_id=desafio_id,
-            status='em_andamento'
-        )
-        db.session.add(resultado)
-    
     respostas_quiz = data['respostasQuiz']
     
     # Calcular pontuação - 10 pontos por resposta correta
@@ -193,9 +196,12 @@ def submeter_desafio(desafio_id):
             if resposta_usuario == pergunta['resposta_correta']:
                 pontuacao += 1
     
-    # Atualizar resultado
-    resultado.respostasQuiz = respostas_quiz
-    resultado.pontuacao = pontuacao
+    # Grava as respostas no resultado, criando-o se o desafio não foi iniciado
+    resultado, criado = Resultado.registrar(int(current_user_id), desafio_id, 'em_andamento',
+                                            respostas_quiz=respostas_quiz, pontuacao=pontuacao)
+    if criado:
+        ajustar_desafio(desafio_id, participantes=1)
+        invalidar_progresso(int(current_user_id))
     
     db.session.commit()
     
@@ -216,22 +222,25 @@ def obter_desafio_destaque():
     ---
     Requer:
       - Token de acesso JWT válido
+    Parâmetros de consulta:
+      - fields / view: Projeção dos campos do desafio (opcional)
     Retorna:
       - Detalhes do desafio em destaque
     """
     current_user_id = get_jwt_identity()
     
-    # Obter o desafio mais recente com status ativo
-    desafio = Desafio.query.filter_by(status='ativo').order_by(Desafio.data_criacao.desc()).first()
+    # Desafio ativo mais recente entre os globais e os da turma do usuário (em cache por turma)
+    campos = campos_solicitados(Desafio)
+    destaque = obter_catalogo('ativo', turmas_visiveis(int(current_user_id)), campos).primeiro()
     
-    if not desafio:
+    if not destaque:
         return jsonify({'message': 'Nenhum desafio em destaque disponível'}), 404
     
     # Obter resultado do usuário para este desafio
-    resultado = Resultado.query.filter_by(usuario_id=int(current_user_id), desafio_id=desafio.id).first()
+    resultado = Resultado.query.filter_by(usuario_id=int(current_user_id), desafio_id=destaque['desafio_id']).first()
     
-    # Preparar dados para retorno
-    desafio_dict = desafio.to_dict()
+    # Preparar dados para retorno (cópia, o dict do catálogo é compartilhado)
+    desafio_dict = dict(destaque)
     
     # Adicionar informações sobre o progresso do usuário neste desafio
     if resultado:
@@ -247,7 +256,7 @@ def obter_desafio_destaque():
 @desafio_bp.route('/<int:desafio_id>/perguntas', methods=['GET'])
 @jwt_required()
 def obter_perguntas(desafio_id):
-    desafio = Desafio.query.get(desafio_id)
+    desafio = Desafio.query.options(undefer(Desafio.perguntas)).get(desafio_id)
     if not desafio:
         return jsonify({'message': 'Desafio não encontrado'}), 404
     
@@ -272,26 +281,39 @@ def obter_resultado_quiz(desafio_id):
 
 @desafio_bp.route('/<int:desafio_id>/concluir', methods=['POST'])
 @jwt_required()
+@idempotente
 def concluir_desafio(desafio_id):
     """
     Endpoint para marcar um desafio como concluído
     """
-    current_user_id = get_jwt_identity()
-    resultado = Resultado.query.filter_by(usuario_id=current_user_id, desafio_id=desafio_id).first()
-    if not resultado:
-        return jsonify({'message': 'Desafio não iniciado'}), 400
+    usuario_id = int(get_jwt_identity())
 
-    if resultado.status == 'concluído':
+    # UPDATE condicional: entre requisições simultâneas (duplo clique, retentativas)
+    # só uma muda o status, e só ela concede o XP
+    tabela = Resultado.__table__
+    concluido = db.session.execute(
+        tabela.update()
+        .where(tabela.c.usuario_id == usuario_id,
+               tabela.c.desafio_id == desafio_id,
+               tabela.c.status != 'concluído')
+        .values(status='concluído', data_conclusao=datetime.utcnow())
+        .returning(tabela.c.pontuacao)
+    ).first()
+    if concluido is None:
+        iniciado = db.session.query(Resultado.id).filter_by(usuario_id=usuario_id, desafio_id=desafio_id).first()
+        if not iniciado:
+            return jsonify({'message': 'Desafio não iniciado'}), 400
         return jsonify({'message': 'Desafio já foi concluído anteriormente'}), 200
 
-    resultado.status = 'concluído'
-    resultado.data_conclusao = datetime.utcnow()
+    ajustar_desafio(desafio_id, concluidos=1)
 
     # Adicionar XP ao usuário
-    usuario = Usuario.query.get(current_user_id)
+    usuario = db.session.query(Usuario.id, Usuario.nome, Usuario.turma_id).filter_by(id=usuario_id).first()
     if usuario:
-        usuario.adicionar_xp(10)  # Defina o valor de XP por desafio concluído (exemplo: 50)
-        db.session.add(usuario)
+        nivel, xp = Usuario.ganhar_xp(usuario_id, XP_POR_DESAFIO)
+        publicar_evento('desafio_concluido', usuario.turma_id, usuario, {'concluidos': 1},
+                        desafio_id=desafio_id, pontuacao=concluido.pontuacao, nivel=nivel, xp=xp)
+        invalidar_progresso(usuario.id, usuario.turma_id)
 
     db.session.commit()
 
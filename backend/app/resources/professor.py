@@ -1,7 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Turma, Desafio, Resultado, TesteInicialLikert
+from app.models import Usuario, Turma, Desafio, Resultado, TesteInicialLikert, EventoTurma
 from app import db
+from app.catalogo import invalidar_catalogo
+from app.eventos import transmitir, ultimo_evento, gerar_token_stream, professor_do_token
+from app.cache import obter_cache, invalidar_tags
+from app.estatisticas import ajustar_turma, remover_turma, remover_desafio, estatisticas_turmas, estatisticas_desafios
+from app.resources.turma import turma_em_cache
+from app.resources.user import usuario_em_cache
+from app.projecoes import campos_solicitados, opcoes_carga, linhas_para_dicts
+from app.busca import buscar_alunos
 import os
 
 professor_bp = Blueprint('professor', __name__)
@@ -18,20 +26,19 @@ def dashboard_professor():
         if not professor or professor.tipo_usuario != 'professor':
             return jsonify({'message': 'Acesso negado. Apenas professores podem acessar.'}), 403
         
-        # Estatísticas gerais
+        # Lido antes das estatísticas: o stream SSE retoma daqui sem perder eventos
+        evento_atual = ultimo_evento(professor.id)
+        
+        # Estatísticas gerais (turma_stats, mantida pelas rotas de escrita)
         turmas = Turma.query.filter_by(professor_id=user_id, ativa=True).all()
-        total_alunos = sum(len(turma.alunos) for turma in turmas)
+        estatisticas = estatisticas_turmas(turma.id for turma in turmas).values()
+        total_alunos = sum(e['total_alunos'] for e in estatisticas)
+        alunos_com_teste = sum(e['alunos_com_teste'] for e in estatisticas)
+        # Desafios criados pelo professor, inclusive os globais (fora de qualquer turma)
         total_desafios = Desafio.query.filter_by(criado_por=user_id).count()
         
-        # Progresso dos alunos
-        alunos_com_teste = 0
-        for turma in turmas:
-            for aluno in turma.alunos:
-                if aluno.teste_inicial_concluido:
-                    alunos_com_teste += 1
-        
         return jsonify({
-            'professor': professor.to_dict(),
+            'professor': usuario_em_cache(professor.id),
             'estatisticas': {
                 'total_turmas': len(turmas),
                 'total_alunos': total_alunos,
@@ -39,12 +46,63 @@ def dashboard_professor():
                 'alunos_com_teste': alunos_com_teste,
                 'taxa_conclusao_teste': (alunos_com_teste / total_alunos * 100) if total_alunos > 0 else 0
             },
-            'turmas': [turma.to_dict() for turma in turmas]
+            'turmas': [turma_em_cache(turma) for turma in turmas],
+            'ultimo_evento': evento_atual
         }), 200
         
     except Exception as e:
         return jsonify({'message': 'Erro interno do servidor', 'error': str(e)}), 500
 
+@professor_bp.route('/eventos/token', methods=['POST'])
+@jwt_required()
+def token_eventos_professor():
+    """Token de curta duração para abrir o stream /eventos (o EventSource não envia headers)"""
+    professor = usuario_em_cache(int(get_jwt_identity()))
+    
+    if not professor or professor['tipo_usuario'] != 'professor':
+        return jsonify({'message': 'Acesso negado. Apenas professores podem acessar.'}), 403
+    if not current_app.config['SSE_DISPONIVEL']:
+        return jsonify({'message': 'Atualização em tempo real indisponível neste servidor.'}), 503
+    
+    return jsonify({
+        'token': gerar_token_stream(current_app, professor['id']),
+        'expira_em': current_app.config['SSE_TOKEN_MAX_AGE']
+    }), 200
+
+@professor_bp.route('/eventos', methods=['GET'])
+def eventos_professor():
+    """
+    Stream SSE (text/event-stream) com as mudanças nas turmas do professor
+    ---
+    Requer:
+      - token: emitido por POST /eventos/token (vale SSE_TOKEN_MAX_AGE segundos
+        e só para abrir o stream, já que o EventSource não envia headers)
+    Parâmetros:
+      - Last-Event-ID (header) ou last_event_id: retoma após esse evento
+    Eventos:
+      - aluno_entrou, aluno_saiu, teste_concluido, desafio_concluido; o campo
+        `delta` de cada um traz os incrementos das estatísticas do dashboard
+    """
+    if not current_app.config['SSE_DISPONIVEL']:
+        return jsonify({'message': 'Atualização em tempo real indisponível neste servidor.'}), 503
+    
+    professor_id = professor_do_token(current_app, request.args.get('token', ''))
+    if professor_id is None:
+        return jsonify({'message': 'Token do stream inválido ou expirado.'}), 401
+    
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if ultimo_id is None:
+        # Conexão nova: só eventos a partir de agora (o estado atual vem do /dashboard)
+        ultimo_id = ultimo_evento(professor_id)
+    elif not ultimo_id.isdigit():
+        return jsonify({'message': 'Last-Event-ID inválido.'}), 400
+    
+    return Response(
+        transmitir(current_app._get_current_object(), professor_id, int(ultimo_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @professor_bp.route('/turmas', methods=['GET'])
 @jwt_required()
 def listar_turmas():
@@ -58,7 +116,7 @@ def listar_turmas():
         
         turmas = Turma.query.filter_by(professor_id=user_id).all()
         return jsonify({
-            'turmas': [turma.to_dict() for turma in turmas]
+            'turmas': [turma_em_cache(turma) for turma in turmas]
         }), 200
         
     except Exception as e:
@@ -86,6 +144,7 @@ def criar_turma():
         )
         
         db.session.add(nova_turma)
+        invalidar_tags(f'usuario:{professor.id}')
         db.session.commit()
         
         return jsonify({
@@ -128,13 +187,109 @@ def listar_alunos_turma(turma_id):
             alunos_data.append(aluno_dict)
         
         return jsonify({
-            'turma': turma.to_dict(),
+            'turma': turma_em_cache(turma),
             'alunos': alunos_data
         }), 200
         
     except Exception as e:
         return jsonify({'message': 'Erro interno do servidor', 'error': str(e)}), 500
 
+@professor_bp.route('/alunos/search', methods=['GET'])
+@jwt_required()
+def buscar_alunos_professor():
+    """
+    Busca alunos em todas as turmas do professor por nome ou email
+    ---
+    Parâmetros de consulta:
+      - q: Termo buscado (prefixo ou trecho do nome/email; trechos a partir de 3 caracteres)
+      - pagina: Página, a partir de 1 (padrão 1)
+      - por_pagina: Alunos por página (padrão 20, máximo BUSCA_MAX_POR_PAGINA)
+    Retorna:
+      - alunos: id, nome, email, nivel, xp, turma_id e turma_nome, dos mais relevantes para os menos
+      - tem_mais: Se existe uma próxima página
+    """
+    user_id = int(get_jwt_identity())
+    # Perfil do cache: a verificação de acesso não consulta o banco
+    professor = usuario_em_cache(user_id)
+    if not professor or professor['tipo_usuario'] != 'professor':
+        return jsonify({'message': 'Acesso negado. Apenas professores podem acessar.'}), 403
+    
+    termo = request.args.get('q', '').strip()
+    if not termo:
+        return jsonify({'message': 'Informe o termo da busca em "q".'}), 400
+    pagina = request.args.get('pagina', 1, type=int)
+    por_pagina = request.args.get('por_pagina', 20, type=int)
+    if pagina < 1 or por_pagina < 1:
+        return jsonify({'message': 'pagina e por_pagina devem ser maiores que zero.'}), 400
+    por_pagina = min(por_pagina, current_app.config['BUSCA_MAX_POR_PAGINA'])
+    
+    alunos, tem_mais = buscar_alunos(user_id, termo, pagina, por_pagina)
+    
+    return jsonify({
+        'alunos': linhas_para_dicts(alunos),
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'tem_mais': tem_mais
+    }), 200
+
+def _montar_relatorio(turma, campos_desafio):
+    """Estatísticas, médias do teste Likert e progresso nos desafios da turma"""
+    # Estatísticas da turma
+    estatisticas = estatisticas_turmas([turma.id])[turma.id]
+    total_alunos = estatisticas['total_alunos']
+    alunos_com_teste = estatisticas['alunos_com_teste']
+    
+    # Médias por categoria do teste Likert
+    categorias_medias = {
+        'comunicacao': 0,
+        'empatia': 0,
+        'inteligencia_emocional': 0,
+        'trabalho_equipe': 0,
+        'lideranca': 0
+    }
+    
+    testes_realizados = 0
+    for aluno in turma.alunos:
+        teste = TesteInicialLikert.query.filter_by(usuario_id=aluno.id).first()
+        if teste:
+            testes_realizados += 1
+            for categoria in categorias_medias:
+                valor = getattr(teste, f'pontuacao_{categoria}')
+                if valor:
+                    categorias_medias[categoria] += valor
+    
+    # Calcular médias
+    if testes_realizados > 0:
+        for categoria in categorias_medias:
+            categorias_medias[categoria] /= testes_realizados
+    
+    # Progresso nos desafios (?fields= / ?view=summary projetam os desafios)
+    desafios_turma = Desafio.query.options(*opcoes_carga(Desafio, campos_desafio)).filter_by(turma_id=turma.id).all()
+    estatisticas_desafio = estatisticas_desafios(desafio.id for desafio in desafios_turma)
+    progresso_desafios = []
+    
+    for desafio in desafios_turma:
+        concluidos = estatisticas_desafio[desafio.id]['concluidos']
+        total = estatisticas_desafio[desafio.id]['participantes']
+        
+        progresso_desafios.append({
+            'desafio': desafio.to_dict(campos_desafio),
+            'total_participantes': total,
+            'concluidos': concluidos,
+            'taxa_conclusao': (concluidos / total * 100) if total > 0 else 0
+        })
+    
+    return {
+        'turma': turma_em_cache(turma),
+        'estatisticas': {
+            'total_alunos': total_alunos,
+            'alunos_com_teste': alunos_com_teste,
+            'taxa_teste_concluido': (alunos_com_teste / total_alunos * 100) if total_alunos > 0 else 0,
+            'medias_categorias': categorias_medias
+        },
+        'progresso_desafios': progresso_desafios
+    }
+
 @professor_bp.route('/relatorio-turma/<int:turma_id>', methods=['GET'])
 @jwt_required()
 def relatorio_turma(turma_id):
@@ -150,60 +305,14 @@ def relatorio_turma(turma_id):
         if not turma:
             return jsonify({'message': 'Turma não encontrada.'}), 404
         
-        # Estatísticas da turma
-        total_alunos = len(turma.alunos)
-        alunos_com_teste = sum(1 for aluno in turma.alunos if aluno.teste_inicial_concluido)
-        
-        # Médias por categoria do teste Likert
-        categorias_medias = {
-            'comunicacao': 0,
-            'empatia': 0,
-            'inteligencia_emocional': 0,
-            'trabalho_equipe': 0,
-            'lideranca': 0
-        }
-        
-        testes_realizados = 0
-        for aluno in turma.alunos:
-            teste = TesteInicialLikert.query.filter_by(usuario_id=aluno.id).first()
-            if teste:
-                testes_realizados += 1
-                for categoria in categorias_medias:
-                    valor = getattr(teste, f'pontuacao_{categoria}')
-                    if valor:
-                        categorias_medias[categoria] += valor
-        
-        # Calcular médias
-        if testes_realizados > 0:
-            for categoria in categorias_medias:
-                categorias_medias[categoria] /= testes_realizados
-        
-        # Progresso nos desafios
-        desafios_turma = Desafio.query.filter_by(turma_id=turma_id).all()
-        progresso_desafios = []
-        
-        for desafio in desafios_turma:
-            resultados = Resultado.query.filter_by(desafio_id=desafio.id).all()
-            concluidos = len([r for r in resultados if r.status == 'concluído'])
-            total = len(resultados)
-            
-            progresso_desafios.append({
-                'desafio': desafio.to_dict(),
-                'total_participantes': total,
-                'concluidos': concluidos,
-                'taxa_conclusao': (concluidos / total * 100) if total > 0 else 0
-            })
-        
-        return jsonify({
-            'turma': turma.to_dict(),
-            'estatisticas': {
-                'total_alunos': total_alunos,
-                'alunos_com_teste': alunos_com_teste,
-                'taxa_teste_concluido': (alunos_com_teste / total_alunos * 100) if total_alunos > 0 else 0,
-                'medias_categorias': categorias_medias
-            },
-            'progresso_desafios': progresso_desafios
-        }), 200
+        # Relatório em cache até a próxima mudança na turma ou nos desafios dela
+        campos_desafio = campos_solicitados(Desafio)
+        relatorio = obter_cache('relatorio_turma', (turma_id, campos_desafio),
+                                lambda: _montar_relatorio(turma, campos_desafio),
+                                tags=lambda dados: [f'turma:{turma_id}', f'usuario:{turma.professor_id}'] + [
+                                    f'desafio:{item["desafio"]["desafio_id"]}' for item in dados['progresso_desafios']
+                                ])
+        return jsonify(relatorio), 200
         
     except Exception as e:
         return jsonify({'message': 'Erro interno do servidor', 'error': str(e)}), 500
@@ -232,6 +341,10 @@ def criar_desafio_manual():
             status='ativo'
         )
         db.session.add(novo_desafio)
+        if novo_desafio.turma_id:
+            ajustar_turma(novo_desafio.turma_id, total_desafios=1)
+            invalidar_tags(f'turma:{novo_desafio.turma_id}')
+        invalidar_catalogo()
         db.session.commit()
         return jsonify({'message': 'Desafio criado com sucesso!', 'desafio': novo_desafio.to_dict()}), 201
     except Exception as e:
@@ -243,12 +356,14 @@ def editar_desafio(desafio_id):
     try:
         user_id = get_jwt_identity()
         desafio = Desafio.query.get(desafio_id)
-        if not desafio or desafio.criado_por != user_id:
+        if not desafio or desafio.criado_por != int(user_id):
             return jsonify({'message': 'Desafio não encontrado ou acesso negado'}), 404
         data = request.get_json()
         for field in ['titulo', 'descricao', 'perguntas', 'desafio_pratico', 'video_url']:
             if field in data:
                 setattr(desafio, field, data[field])
+        invalidar_tags(f'desafio:{desafio.id}')
+        invalidar_catalogo()
         db.session.commit()
         return jsonify({'message': 'Desafio atualizado!', 'desafio': desafio.to_dict()}), 200
     except Exception as e:
@@ -260,12 +375,26 @@ def deletar_desafio(desafio_id):
     try:
         user_id = get_jwt_identity()
         desafio = Desafio.query.get(desafio_id)
-        if not desafio or desafio.criado_por != user_id:
+        if not desafio or desafio.criado_por != int(user_id):
             return jsonify({'message': 'Desafio não encontrado ou acesso negado'}), 404
+        invalidar_tags(f'desafio:{desafio.id}', *([f'turma:{desafio.turma_id}'] if desafio.turma_id else []))
+        invalidar_catalogo()
+        # resultados.desafio_id é NOT NULL: os resultados saem antes do desafio,
+        # e o perfil de quem o iniciou deixa de contá-lo
+        participantes = db.session.query(Resultado.usuario_id).filter_by(desafio_id=desafio.id).distinct()
+        invalidar_tags(*(f'usuario:{usuario_id}' for usuario_id, in participantes))
+        Resultado.query.filter_by(desafio_id=desafio.id).delete(synchronize_session='fetch')
+        remover_desafio(desafio.id)
+        turma_id = desafio.turma_id
         db.session.delete(desafio)
+        # Exclusão já no banco: se a turma ainda não tem turma_stats, a linha é
+        # calculada das tabelas de origem sem este desafio (e o -1 não se aplica)
+        db.session.flush()
+        ajustar_turma(turma_id, total_desafios=-1)
         db.session.commit()
         return jsonify({'message': 'Desafio deletado com sucesso!'}), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({'message': 'Erro interno do servidor', 'error': str(e)}), 500
 
 @professor_bp.route('/turmas/<int:turma_id>', methods=['PUT'])
@@ -282,6 +411,7 @@ def editar_turma(turma_id):
             turma.nome = data['nome']
         if 'descricao' in data:
             turma.descricao = data['descricao']
+        invalidar_tags(f'turma:{turma.id}')
         db.session.commit()
         return jsonify({'message': 'Turma atualizada com sucesso!', 'turma': turma.to_dict()}), 200
     except Exception as e:
@@ -296,8 +426,13 @@ def deletar_turma(turma_id):
         turma = Turma.query.filter_by(id=turma_id, professor_id=user_id).first()
         if not turma:
             return jsonify({'message': 'Turma não encontrada ou acesso negado.'}), 404
+        invalidar_tags(f'turma:{turma.id}', f'usuario:{turma.professor_id}')
+        remover_turma(turma.id)
+        # eventos_turma.turma_id referencia a turma (no Postgres a FK recusaria o DELETE)
+        EventoTurma.query.filter_by(turma_id=turma.id).delete(synchronize_session=False)
         db.session.delete(turma)
         db.session.commit()
         return jsonify({'message': 'Turma excluída com sucesso!'}), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({'message': 'Erro interno do servidor', 'error': str(e)}), 500
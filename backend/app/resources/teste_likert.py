@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import Usuario, TesteInicialLikert, PerguntaTeste
 from app import db
+from app.eventos import publicar_evento
+from app.cache import invalidar_tags
+from app.estatisticas import ajustar_turma
+from app.idempotencia import idempotente
 
 teste_likert_bp = Blueprint('teste_likert', __name__)
 
@@ -21,6 +25,7 @@ def obter_perguntas():
 
 @teste_likert_bp.route('/responder', methods=['POST'])
 @jwt_required()
+@idempotente
 def responder_teste():
     """Processa as respostas do teste inicial Likert"""
     try:
@@ -57,8 +62,15 @@ def responder_teste():
         
         db.session.add(teste)
         
-        # Marcar teste como concluído no usuário
+        # Marcar teste como concluído no usuário (pode já ter sido marcado por /complete-initial-test)
+        delta = {'alunos_com_teste': 0 if usuario.teste_inicial_concluido else 1}
         usuario.teste_inicial_concluido = True
+        ajustar_turma(usuario.turma_id, **delta)
+        publicar_evento('teste_concluido', usuario.turma_id, usuario, delta, pontuacoes={
+            categoria: getattr(teste, f'pontuacao_{categoria}')
+            for categoria in ('comunicacao', 'empatia', 'inteligencia_emocional', 'trabalho_equipe', 'lideranca')
+        })
+        invalidar_tags(f'usuario:{usuario.id}', *([f'turma:{usuario.turma_id}'] if usuario.turma_id else []))
         db.session.commit()
         
         return jsonify({
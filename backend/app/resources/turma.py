@@ -1,13 +1,34 @@
 
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Turma
+from sqlalchemy import select, func
+from app.models import Usuario, Turma, Resultado
 from app import db
+from app.projecoes import consultar_linhas, linhas_para_dicts
+from app.eventos import publicar_evento
+from app.cache import obter_cache, invalidar_tags
+from app.estatisticas import ajustar_turma
+from app.idempotencia import idempotente
+from app.limites import limitar
 
 turma_bp = Blueprint('turma', __name__)
 
+
+def turma_em_cache(turma):
+    """to_dict() da turma em cache; não altere o dict retornado"""
+    # professor_nome vem do professor, por isso a tag dele
+    return obter_cache('turma', turma.id, turma.to_dict,
+                       tags=[f'turma:{turma.id}', f'usuario:{turma.professor_id}'])
+
+
+def invalidar_matricula(aluno, turma):
+    """Tags afetadas quando o aluno entra ou sai da turma"""
+    invalidar_tags(f'usuario:{aluno.id}', f'turma:{turma.id}', f'usuario:{turma.professor_id}')
+
 @turma_bp.route('/entrar', methods=['POST'])
 @jwt_required()
+@limitar('entrar_turma', conta=get_jwt_identity)
+@idempotente
 def entrar_turma():
     """Permite que um aluno entre em uma turma usando código"""
     try:
@@ -34,6 +55,13 @@ def entrar_turma():
         # Adicionar aluno à turma
         aluno.turma_id = turma.id
         aluno.tipo_usuario = 'aluno'  # Garantir que seja aluno
+        delta = {
+            'total_alunos': 1,
+            'alunos_com_teste': 1 if aluno.teste_inicial_concluido else 0
+        }
+        ajustar_turma(turma.id, **delta)
+        publicar_evento('aluno_entrou', turma.id, aluno, delta, nivel=aluno.nivel, xp=aluno.xp)
+        invalidar_matricula(aluno, turma)
         db.session.commit()
         
         return jsonify({
@@ -57,7 +85,16 @@ def sair_turma():
             return jsonify({'message': 'Você não está em nenhuma turma.'}), 400
         
         turma_nome = aluno.turma.nome if aluno.turma else "turma"
+        turma_id = aluno.turma_id
+        delta = {
+            'total_alunos': -1,
+            'alunos_com_teste': -1 if aluno.teste_inicial_concluido else 0
+        }
+        publicar_evento('aluno_saiu', turma_id, aluno, delta)
+        if aluno.turma:
+            invalidar_matricula(aluno, aluno.turma)
         aluno.turma_id = None
+        ajustar_turma(turma_id, **delta)
         db.session.commit()
         
         return jsonify({
@@ -84,20 +121,21 @@ def minha_turma():
         
         turma = aluno.turma
         
-        # Informações dos colegas de turma
-        colegas = []
-        for colega in turma.alunos:
-            if colega.id != aluno.id:
-                colegas.append({
-                    'id': colega.id,
-                    'nome': colega.nome,
-                    'nivel': colega.nivel,
-                    'xp': colega.xp,
-                    'desafios_concluidos': colega.calcular_desafios_concluidos()
-                })
+        # Informações dos colegas de turma: colunas + contagem de concluídos em um só select
+        concluidos = (
+            select(func.count(Resultado.id))
+            .where(Resultado.usuario_id == Usuario.id, Resultado.status == 'concluído')
+            .correlate(Usuario)
+            .scalar_subquery()
+        )
+        colegas = linhas_para_dicts(consultar_linhas(
+            select(Usuario.id, Usuario.nome, Usuario.nivel, Usuario.xp, concluidos.label('desafios_concluidos'))
+            .where(Usuario.turma_id == turma.id, Usuario.id != aluno.id)
+            .order_by(Usuario.id)
+        ))
         
         return jsonify({
-            'turma': turma.to_dict(),
+            'turma': turma_em_cache(turma),
             'colegas': colegas,
             'total_colegas': len(colegas)
         }), 200
@@ -1,11 +1,90 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import Usuario, Avaliacao, Resultado
+from sqlalchemy import select, func
+from app.models import Usuario, Avaliacao, Resultado, Desafio, Turma, TesteInicialLikert, contar_sequencia, categorias_das_perguntas
 from app import db
+from app.projecoes import campos_solicitados, opcoes_carga, consultar_linhas, linhas_para_dicts
+from app.cache import obter_cache, invalidar_tags
+from app.estatisticas import ajustar_turma
+from app.limites import limitar, email_e_ip_da_requisicao
+from app.resources.desafio import XP_POR_DESAFIO
 from werkzeug.security import generate_password_hash
 
 user_bp = Blueprint('user', __name__)
 
+PERIODOS = ('dia', 'semana', 'mes')
+
+
+def usuario_em_cache(usuario_id):
+    """to_dict() do usuário em cache (None se não existir); não altere o dict retornado"""
+    def calcular():
+        usuario = Usuario.query.get(usuario_id)
+        return usuario.to_dict() if usuario else None
+    
+    def tags(dados):
+        # A turma entra no dict do aluno (nome e código)
+        return [f'usuario:{usuario_id}'] + ([f'turma:{dados["turma_id"]}'] if dados['turma_id'] else [])
+    
+    return obter_cache('usuario', usuario_id, calcular, tags=tags)
+
+def _incluir_avaliacoes(usuario_id, dados_usuario, limite):
+    avaliacoes = Avaliacao.query.filter_by(usuario_id=usuario_id) \
+        .order_by(Avaliacao.data.desc(), Avaliacao.id.desc()).limit(limite).all()
+    # Perguntas consultadas uma vez para todas as avaliações
+    categorias = categorias_das_perguntas() if avaliacoes else {}
+    return {'avaliacoes': [avaliacao.to_dict(categorias) for avaliacao in avaliacoes]}
+
+
+def _incluir_resultados(usuario_id, dados_usuario, limite):
+    campos = campos_solicitados(Resultado)
+    resultados = Resultado.query.options(*opcoes_carga(Resultado, campos)) \
+        .filter_by(usuario_id=usuario_id).order_by(Resultado.id.desc()).limit(limite).all()
+    return {'resultados': [resultado.to_dict(campos) for resultado in resultados]}
+
+
+def _incluir_turma(usuario_id, dados_usuario, limite):
+    # Aluno: a própria turma completa; professor: as turmas criadas por ele
+    if dados_usuario['tipo_usuario'] == 'professor':
+        turmas = Turma.query.filter_by(professor_id=usuario_id).order_by(Turma.id).limit(limite).all()
+        return {'turmas': [turma.to_dict() for turma in turmas]}
+    turma = Turma.query.get(dados_usuario['turma_id']) if dados_usuario['turma_id'] else None
+    return {'turma': turma.to_dict() if turma else None}
+
+
+def _incluir_likert(usuario_id, dados_usuario, limite):
+    teste = TesteInicialLikert.query.filter_by(usuario_id=usuario_id) \
+        .order_by(TesteInicialLikert.id.desc()).first()
+    return {'likert': teste.to_dict() if teste else None}
+
+
+# Partes opcionais do perfil (?include=): cada função retorna as chaves que acrescenta
+# ao perfil, com uma consulta (avaliacoes, duas) independente do volume de dados
+INCLUDES_PERFIL = {
+    'avaliacoes': _incluir_avaliacoes,
+    'resultados': _incluir_resultados,
+    'turma': _incluir_turma,
+    'likert': _incluir_likert,
+}
+# Sem ?include= o perfil mantém o formato antigo: avaliações e resultados completos (sem limite)
+INCLUDES_PADRAO = {'avaliacoes': None, 'resultados': None}
+
+
+def _interpretar_includes(texto):
+    """'resultados:20,likert' -> ({nome: limite}, None) ou (None, mensagem de erro)"""
+    config = current_app.config
+    includes = {}
+    for item in filter(None, (parte.strip() for parte in texto.split(','))):
+        nome, _, limite = item.partition(':')
+        if nome not in INCLUDES_PERFIL:
+            return None, f'Include inválido: {nome}. Use {", ".join(INCLUDES_PERFIL)}.'
+        if limite:
+            if not limite.isdigit() or int(limite) < 1:
+                return None, f'Limite inválido para {nome}: {limite}'
+            includes[nome] = min(int(limite), config['PERFIL_INCLUDE_LIMITE_MAXIMO'])
+        else:
+            includes[nome] = config['PERFIL_INCLUDE_LIMITE']
+    return includes, None
+
 @user_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def obter_perfil():
@@ -14,23 +93,32 @@ def obter_perfil():
     ---
     Requer:
       - Token de acesso JWT válido
+    Parâmetros de consulta:
+      - include: Partes extras separadas por vírgula, cada uma com limite opcional
+        (avaliacoes, resultados, turma, likert; ex.: "resultados:20,likert").
+        Vazio retorna só o cabeçalho; ausente retorna todas as avaliações e todos os
+        resultados, como antes do include
+      - fields / view: Projeção dos campos dos resultados (opcional)
     Retorna:
-      - Informações do perfil do usuário
+      - Informações do perfil do usuário, com as partes solicitadas
     """
-    current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(int(current_user_id))
+    current_user_id = int(get_jwt_identity())
+    if 'include' in request.args:
+        includes, erro = _interpretar_includes(request.args['include'])
+        if erro:
+            return jsonify({'message': erro}), 400
+    else:
+        includes = INCLUDES_PADRAO
     
-    if not usuario:
-        return jsonify({'message': 'Usuário não encontrado'}), 404
+    dados_usuario = usuario_em_cache(current_user_id)
     
-    # Obter avaliações e resultados do usuário
-    avaliacoes = Avaliacao.query.filter_by(usuario_id=int(current_user_id)).all()
-    resultados = Resultado.query.filter_by(usuario_id=int(current_user_id)).all()
+    if not dados_usuario:
+        return jsonify({'message': 'Usuário não encontrado'}), 404
     
-    # Preparar dados para retorno
-    perfil = usuario.to_dict()
-    perfil['avaliacoes'] = [avaliacao.to_dict() for avaliacao in avaliacoes]
-    perfil['resultados'] = [resultado.to_dict() for resultado in resultados]
+    # Só as partes pedidas são consultadas, cada uma limitada (None: sem limite, formato antigo)
+    perfil = dict(dados_usuario)
+    for nome, limite in includes.items():
+        perfil.update(INCLUDES_PERFIL[nome](current_user_id, dados_usuario, limite))
     
     return jsonify({
         'message': 'Perfil obtido com sucesso',
@@ -90,6 +178,7 @@ def atualizar_perfil():
         usuario.senha_hash = generate_password_hash(data['nova_senha'])
     
     # Salvar alterações
+    invalidar_tags(f'usuario:{usuario.id}')
     db.session.commit()
     
     return jsonify({
@@ -106,18 +195,20 @@ def obter_progresso():
     if not usuario:
         return jsonify({'message': 'Usuário não encontrado'}), 404
     
-    # Obter resultados dos desafios do usuário
-    resultados = Resultado.query.filter_by(
-        usuario_id=int(current_user_id),
-        status='concluído'
-    ).order_by(Resultado.data_conclusao.asc()).all()
+    # Obter resultados dos desafios do usuário (só as colunas usadas, sem objetos ORM);
+    # a mesma lista dá o total de concluídos e a sequência de dias
+    resultados = consultar_linhas(
+        select(Resultado.data_conclusao, Resultado.pontuacao)
+        .where(Resultado.usuario_id == int(current_user_id), Resultado.status == 'concluído')
+        .order_by(Resultado.data_conclusao.asc())
+    )
     
     progresso = {
         'nivel': usuario.nivel,
         'xp': usuario.xp,
         'proximo_nivel_xp': usuario.calcular_proximo_nivel_xp(),
-        'desafios_concluidos': usuario.calcular_desafios_concluidos(),
-        'sequencia': usuario.calcular_sequencia(),
+        'desafios_concluidos': len(resultados),
+        'sequencia': contar_sequencia([r.data_conclusao for r in reversed(resultados)]),
         'resultados': [{
             'data_conclusao': r.data_conclusao.strftime('%d/%m/%Y'),
             'pontuacao': r.pontuacao
@@ -129,6 +220,71 @@ def obter_progresso():
         'progresso': progresso
     }), 200
 
+def inicio_periodo(coluna, periodo):
+    """Expressão SQL com a data em que começa o dia, a semana (segunda-feira) ou o mês de `coluna`"""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        campo = {'dia': 'day', 'semana': 'week', 'mes': 'month'}[periodo]
+        return db.cast(func.date_trunc(campo, coluna), db.Date)
+    # SQLite: 'weekday 0' avança até o domingo (ou fica nele) e -6 dias volta à segunda
+    modificadores = {'dia': (), 'semana': ('weekday 0', '-6 days'), 'mes': ('start of month',)}[periodo]
+    return func.date(coluna, *modificadores)
+
+
+def serie_progresso(usuario_id, periodo):
+    """Desafios concluídos agrupados por período, calculados no banco (uma linha por período)"""
+    inicio = inicio_periodo(Resultado.data_conclusao, periodo).label('inicio')
+    linhas = consultar_linhas(
+        select(inicio, func.count(Resultado.id).label('concluidos'), func.avg(Resultado.pontuacao).label('media'))
+        .where(Resultado.usuario_id == usuario_id, Resultado.status == 'concluído',
+               Resultado.data_conclusao.isnot(None))
+        .group_by(inicio)
+        .order_by(inicio)
+    )
+    
+    serie = []
+    xp_acumulado = 0
+    for linha in linhas:
+        xp = linha.concluidos * XP_POR_DESAFIO
+        xp_acumulado += xp
+        serie.append({
+            # SQLite devolve a data como texto, o Postgres como date
+            'inicio': linha.inicio if isinstance(linha.inicio, str) else linha.inicio.isoformat(),
+            'concluidos': linha.concluidos,
+            'xp': xp,
+            'xp_acumulado': xp_acumulado,
+            'pontuacao_media': round(float(linha.media or 0), 2)
+        })
+    return serie
+
+@user_bp.route('/progresso/serie', methods=['GET'])
+@jwt_required()
+def obter_serie_progresso():
+    """
+    Endpoint para obter a evolução do usuário agrupada por período (gráfico do perfil)
+    ---
+    Requer:
+      - Token de acesso JWT válido
+    Parâmetros de consulta:
+      - periodo: dia, semana (padrão) ou mes; semanas começam na segunda, datas em UTC
+    Retorna:
+      - serie: Lista por período com inicio, concluidos, xp, xp_acumulado e pontuacao_media
+    """
+    current_user_id = int(get_jwt_identity())
+    periodo = request.args.get('periodo', 'semana')
+    if periodo not in PERIODOS:
+        return jsonify({'message': f'Período inválido. Use {", ".join(PERIODOS)}.'}), 400
+    
+    # Em cache até o próximo resultado do usuário (a conclusão invalida usuario:<id>)
+    serie = obter_cache('progresso_serie', (current_user_id, periodo),
+                        lambda: serie_progresso(current_user_id, periodo),
+                        tags=[f'usuario:{current_user_id}'])
+    
+    return jsonify({
+        'message': 'Série de progresso obtida com sucesso',
+        'periodo': periodo,
+        'serie': serie
+    }), 200
+
 @user_bp.route('/challenge-history', methods=['GET'])
 @jwt_required()
 def obter_historico_desafios():
@@ -142,18 +298,18 @@ def obter_historico_desafios():
     """
     current_user_id = get_jwt_identity()
     
-    # Obter resultados dos desafios concluídos
-    resultados = Resultado.query.filter_by(usuario_id=int(current_user_id), status='concluído').all()
-    
-    historico = [
-        {
-            'id': resultado.desafio_id,
-            'titulo': resultado.desafio.titulo,
-            'data_conclusao': resultado.data_conclusao.isoformat(),
-            'pontuacao': resultado.pontuacao
-        }
-        for resultado in resultados
-    ]
+    # Obter resultados dos desafios concluídos, já com o título do desafio (um único select de colunas)
+    historico = linhas_para_dicts(consultar_linhas(
+        select(
+            Resultado.desafio_id.label('id'),
+            Desafio.titulo,
+            Resultado.data_conclusao,
+            Resultado.pontuacao
+        )
+        .join(Desafio, Desafio.id == Resultado.desafio_id)
+        .where(Resultado.usuario_id == int(current_user_id), Resultado.status == 'concluído')
+        .order_by(Resultado.id)
+    ))
     
     return jsonify({
         'message': 'Histórico de desafios obtido com sucesso',
@@ -172,14 +328,14 @@ def get_current_user():
     - Informações do usuário atual
     """
     current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(int(current_user_id))
+    dados_usuario = usuario_em_cache(int(current_user_id))
 
-    if not usuario:
+    if not dados_usuario:
         return jsonify({'message': 'Usuário não encontrado'}), 404
 
     return jsonify({
         'message': 'Usuário obtido com sucesso',
-        'usuario': usuario.to_dict()
+        'usuario': dados_usuario
     }), 200
 
 @user_bp.route('/initial-test-status', methods=['GET'])
@@ -189,7 +345,7 @@ def verificar_teste_inicial():
     Endpoint para verificar se o teste inicial foi concluído
     """
     current_user_id = get_jwt_identity()
-    usuario = Usuario.query.get(current_user_id)
+    usuario = Usuario.query.get(int(current_user_id))
 
     if not usuario:
         return jsonify({'message': 'Usuário não encontrado'}), 404
@@ -198,6 +354,7 @@ def verificar_teste_inicial():
     return jsonify({'done': usuario.teste_inicial_concluido}), 200
 
 @user_bp.route('/register', methods=['POST'])
+@limitar('registro', conta=email_e_ip_da_requisicao)
 def registro():
     data = request.get_json()
 
@@ -231,7 +388,10 @@ def concluir_teste_inicial():
     if not usuario:
         return jsonify({'message': 'Usuário não encontrado'}), 404
 
-    usuario.teste_inicial_concluido = True
+    if not usuario.teste_inicial_concluido:
+        usuario.teste_inicial_concluido = True
+        ajustar_turma(usuario.turma_id, alunos_com_teste=1)
+    invalidar_tags(f'usuario:{usuario.id}', *([f'turma:{usuario.turma_id}'] if usuario.turma_id else []))
     db.session.commit()
 
     return jsonify({'message': 'Teste inicial concluído com sucesso'}), 200
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Rotação de refresh tokens e revogação de tokens JWT.
+
+Cada login abre uma família de tokens (claim `fam`). A cada /api/auth/refresh
+o refresh token apresentado é revogado (motivo 'rotacionado') e trocado por um
+par novo da mesma família. Um refresh já trocado que aparece de novo indica
+token vazado: a família inteira é revogada ('reutilizado'). O /logout revoga a
+família, o que derruba também os access tokens emitidos por ela.
+
+Clientes móveis repetem o /refresh quando a resposta se perde. Por isso um
+refresh trocado há até JWT_REFRESH_TOLERANCIA segundos ainda é aceito, e a
+repetição recebe o mesmo par da primeira troca. O par é derivado do jti
+trocado e do momento da troca (jti, iat e exp fixos), sem guardar tokens.
+
+As revogações ficam em tokens_revogados (jti ou id de família) até o token
+expirar. Para que o @jwt_required continue sem consulta ao banco, cada worker
+mantém um filtro de Bloom com as chaves revogadas: a verificação custa alguns
+hashes, e só um acerto no filtro (token revogado ou falso positivo, à taxa
+JWT_REVOGACAO_ERRO) consulta a tabela, com o resultado guardado em uma LRU.
+
+O commit de uma revogação invalida a tag `tokens_revogados` (app/cache.py), e
+o barramento (app/barramento.py) a repassa aos demais workers, que acrescentam
+ao filtro as revogações recentes na próxima verificação. O filtro é recriado
+do zero a cada JWT_REVOGACAO_RECARGA segundos, já sem as expiradas.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy import case, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db, jwt
+from app.cache import CamadaLocal, assinar, invalidar_tags, TODAS
+from app.warmup import registrar_aquecimento
+
+TAG = 'tokens_revogados'
+MARGEM_SINCRONIZACAO = 60  # segundos relidos a cada sincronização (commits fora de ordem, relógios)
+INTERVALO_LIMPEZA = 600  # segundos entre remoções das revogações expiradas
+NAMESPACE_ROTACAO = uuid.UUID('8f0e4c1a-2b7d-4f5e-9a63-1d2c3b4a5e6f')  # jti do par derivado na rotação
+
+
+class FiltroBloom:
+    """Conjunto aproximado de strings: sem falsos negativos, falsos positivos à taxa `erro`"""
+
+    def __init__(self, capacidade, erro):
+        self.bits = max(64, math.ceil(-capacidade * math.log(erro) / math.log(2) ** 2))
+        self.funcoes = max(1, round(self.bits / capacidade * math.log(2)))
+        self._mapa = bytearray((self.bits + 7) // 8)
+
+    def _posicoes(self, item):
+        # Hashing duplo: as k posições saem de um único blake2b de 128 bits
+        resumo = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(resumo[:8], 'little')
+        h2 = int.from_bytes(resumo[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.funcoes)]
+
+    def adicionar(self, item):
+        for posicao in self._posicoes(item):
+            self._mapa[posicao >> 3] |= 1 << (posicao & 7)
+
+    def __contains__(self, item):
+        return all(self._mapa[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(item))
+
+
+_filtro = None
+_pendente = False  # há revogações novas (avisadas pelo barramento) fora do filtro
+_proxima_recarga = 0
+_desde = None  # data da última sincronização
+_confirmados = CamadaLocal(4096)  # chave -> motivo (ou None) já conferidos na tabela
+_lock = threading.Lock()
+_proxima_limpeza = 0
+
+
+def _tabela():
+    from app.models import TokenRevogado
+    return TokenRevogado.__table__
+
+
+def _sincronizar():
+    """Recria o filtro (na primeira vez e a cada recarga) ou acrescenta as revogações recentes"""
+    global _filtro, _pendente, _proxima_recarga, _desde
+    config = current_app.config
+    tabela = _tabela()
+    agora = datetime.utcnow()
+    completa = _filtro is None or time.monotonic() >= _proxima_recarga
+    # Baixado antes da consulta: um aviso que chegar durante ela provoca outra sincronização
+    _pendente = False
+
+    consulta = select(tabela.c.chave).where(tabela.c.expira_em > agora)
+    if not completa:
+        consulta = consulta.where(tabela.c.data_criacao >= _desde - timedelta(seconds=MARGEM_SINCRONIZACAO))
+    # Conexão curta: não abre transação na sessão da requisição
+    with db.engine.connect() as conn:
+        chaves = conn.execute(consulta).scalars().all()
+
+    if completa:
+        filtro = FiltroBloom(max(config['JWT_REVOGACAO_CAPACIDADE'], 2 * len(chaves)), config['JWT_REVOGACAO_ERRO'])
+        for chave in chaves:
+            filtro.adicionar(chave)
+        _filtro = filtro
+        _proxima_recarga = time.monotonic() + config['JWT_REVOGACAO_RECARGA']
+    else:
+        for chave in chaves:
+            _filtro.adicionar(chave)
+    _confirmados.limpar()
+    _desde = agora
+
+
+def _consultar_motivo(chaves):
+    """Motivo da revogação de alguma das `chaves` na tabela (None se nenhuma foi revogada)"""
+    tabela = _tabela()
+    with db.engine.connect() as conn:
+        # A revogação da família (logout, reutilizado) prevalece sobre a rotação do jti
+        return conn.execute(
+            select(tabela.c.motivo).where(tabela.c.chave.in_(chaves))
+            .order_by(case((tabela.c.motivo == 'rotacionado', 1), else_=0)).limit(1)
+        ).scalar()
+
+
+def rotacao_recente(jti):
+    """Momento da troca do refresh `jti`, se foi há no máximo JWT_REFRESH_TOLERANCIA segundos"""
+    tabela = _tabela()
+    with db.engine.connect() as conn:
+        momento = conn.execute(
+            select(tabela.c.data_criacao).where(tabela.c.chave == jti, tabela.c.motivo == 'rotacionado')
+        ).scalar()
+    tolerancia = timedelta(seconds=current_app.config['JWT_REFRESH_TOLERANCIA'])
+    if momento is None or datetime.utcnow() - momento > tolerancia:
+        return None
+    return momento
+
+
+def motivo_revogacao(payload):
+    """Por que o token foi revogado ('rotacionado', 'reutilizado', 'logout'), ou None se vale"""
+    if _filtro is None or _pendente or time.monotonic() >= _proxima_recarga:
+        with _lock:
+            if _filtro is None or _pendente or time.monotonic() >= _proxima_recarga:
+                _sincronizar()
+
+    chaves = tuple(dict.fromkeys((payload['jti'], payload.get('fam', payload['jti']))))
+    if not any(chave in _filtro for chave in chaves):
+        return None
+    # Acerto no filtro: confirma na tabela (falso positivo ou revogação de fato)
+    entrada = _confirmados.obter(chaves)
+    if entrada is not None:
+        return entrada[0]
+    motivo = _consultar_motivo(chaves)
+    _confirmados.gravar(chaves, motivo, (), (), current_app.config['JWT_REVOGACAO_RECARGA'])
+    return motivo
+
+
+def revogar(chave, motivo, usuario_id, expira_em, data_criacao=None):
+    """Revoga um jti ou família na transação atual; False se a chave já estava revogada"""
+    global _proxima_limpeza
+    from app.models import TokenRevogado
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(TokenRevogado(chave=chave, motivo=motivo, usuario_id=usuario_id, expira_em=expira_em,
+                                         data_criacao=data_criacao or datetime.utcnow()))
+    except IntegrityError:
+        return False
+    invalidar_tags(TAG)
+
+    if time.monotonic() >= _proxima_limpeza:
+        _proxima_limpeza = time.monotonic() + INTERVALO_LIMPEZA
+        # Token expirado já é recusado pela assinatura: a revogação não serve mais
+        tabela = _tabela()
+        db.session.execute(tabela.delete().where(tabela.c.expira_em < datetime.utcnow()))
+    return True
+
+
+def _expiracao_familia():
+    config = current_app.config
+    # Depois disso nenhum token da família é emitido: basta durar mais que o último emitido
+    return datetime.utcnow() + max(config['JWT_REFRESH_TOKEN_EXPIRES'], config['JWT_ACCESS_TOKEN_EXPIRES'])
+
+
+def revogar_familia(payload, motivo):
+    """Revoga todos os tokens emitidos a partir do mesmo login do token `payload`"""
+    return revogar(payload.get('fam', payload['jti']), motivo, int(payload['sub']), _expiracao_familia())
+
+
+def _revogar_familia_em_transacao_propria(payload, motivo):
+    """Como revogar_familia, mas confirmada já, sem tocar no que a requisição tem pendente na sessão"""
+    from app.models import TokenRevogado
+
+    with Session(db.engine) as sessao:
+        sessao.add(TokenRevogado(chave=payload.get('fam', payload['jti']), motivo=motivo,
+                                 usuario_id=int(payload['sub']), expira_em=_expiracao_familia()))
+        invalidar_tags(TAG, sessao=sessao)
+        try:
+            sessao.commit()
+        except IntegrityError:
+            # Família já revogada (outra requisição com o mesmo token)
+            sessao.rollback()
+            return False
+    return True
+
+
+def emitir_tokens(usuario_id, familia=None, rotacao=None):
+    """
+    Par (access, refresh) da família `familia`, ou de uma família nova (login).
+
+    Com `rotacao` = (jti do refresh trocado, momento da troca), jti, iat e exp
+    saem desses valores: a mesma troca gera sempre o mesmo par.
+    """
+    claims = {'fam': familia or uuid.uuid4().hex}
+    acesso, refresh = dict(claims), dict(claims)
+    if rotacao is not None:
+        jti, momento = rotacao
+        config = current_app.config
+        momento = momento.replace(microsecond=0, tzinfo=timezone.utc)
+        for dados, tipo, validade in ((acesso, 'access', config['JWT_ACCESS_TOKEN_EXPIRES']),
+                                      (refresh, 'refresh', config['JWT_REFRESH_TOKEN_EXPIRES'])):
+            dados.update(jti=str(uuid.uuid5(NAMESPACE_ROTACAO, f'{jti}:{tipo}')),
+                         iat=momento, nbf=momento, exp=momento + validade)
+    identidade = str(usuario_id)
+    return (create_access_token(identity=identidade, additional_claims=acesso),
+            create_refresh_token(identity=identidade, additional_claims=refresh))
+
+
+@jwt.token_in_blocklist_loader
+def _token_revogado(jwt_header, payload):
+    motivo = motivo_revogacao(payload)
+    if motivo == 'rotacionado' and payload.get('type') == 'refresh':
+        if rotacao_recente(payload['jti']) is not None:
+            # Repetição da troca (resposta perdida): o /refresh devolve o mesmo par
+            return False
+        # Refresh já trocado usado de novo: quem o apresenta pode ser um ladrão ou o
+        # dono legítimo; sem como distinguir, a família inteira deixa de valer
+        if _revogar_familia_em_transacao_propria(payload, 'reutilizado'):
+            current_app.logger.warning('Refresh token reutilizado (usuário %s): família %s revogada',
+                                       payload['sub'], payload.get('fam', payload['jti']))
+    return motivo is not None
+
+
+@assinar
+def _avisar_revogacao(tags):
+    global _pendente, _proxima_recarga
+    if TODAS in tags:
+        # Invalidações perdidas pelo barramento: recria o filtro inteiro
+        _proxima_recarga = 0
+    elif TAG in tags:
+        _pendente = True
+
+
+@registrar_aquecimento
+def aquecer_revogacoes():
+    with _lock:
+        _sincronizar()
+
+
+def init_app(app):
+    global _filtro, _confirmados
+    _filtro = None
+    _confirmados = CamadaLocal(app.config['JWT_REVOGACAO_MAX_CONFIRMADOS'])
@@ -0,0 +1,196 @@
+"""
+Log de consultas lentas com captura automática do plano de execução.
+
+Todo statement acima de SLOW_QUERY_MS vira uma linha JSON em SLOW_QUERY_LOG
+(arquivo rotativo) com o SQL normalizado, o formato dos parâmetros, o
+endpoint que o disparou e o resultado de EXPLAIN (EXPLAIN QUERY PLAN no SQLite),
+executado na mesma conexão do statement.
+
+`flask consultas-lentas` agrega o log e ordena os fingerprints por tempo total.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from logging.handlers import RotatingFileHandler
+
+import click
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLICAVEIS = ('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|\?')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar_sql(statement):
+    """Remove literais e colapsa listas de placeholders e espaços"""
+    sql = _RE_STRING.sub('?', statement)
+    sql = _RE_PLACEHOLDER.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(?+)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()
+
+
+def fingerprint(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode()).hexdigest()[:12]
+
+
+def formato_parametros(parameters, executemany):
+    """Tipos dos parâmetros, sem os valores"""
+    if executemany:
+        lote = list(parameters or [])
+        return {'executemany': len(lote), 'linha': formato_parametros(lote[0], False) if lote else None}
+    if isinstance(parameters, dict):
+        return {chave: type(valor).__name__ for chave, valor in parameters.items()}
+    return [type(valor).__name__ for valor in (parameters or ())]
+
+
+class RegistroConsultasLentas:
+    """Grava statements lentos no log rotativo"""
+
+    def __init__(self, app):
+        self.limite = app.config['SLOW_QUERY_MS'] / 1000
+        self.logger = logging.getLogger('humaniq.slow_queries')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            os.makedirs(os.path.dirname(app.config['SLOW_QUERY_LOG']), exist_ok=True)
+            self.logger.addHandler(RotatingFileHandler(
+                app.config['SLOW_QUERY_LOG'],
+                maxBytes=app.config['SLOW_QUERY_LOG_MAX_BYTES'],
+                backupCount=app.config['SLOW_QUERY_LOG_BACKUPS'],
+                delay=True
+            ))
+
+    def registrar(self, conn, cursor, statement, parameters, executemany, duracao):
+        sql = normalizar_sql(statement)
+        self.logger.info(json.dumps({
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duracao_ms': round(duracao * 1000, 2),
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'parametros': formato_parametros(parameters, executemany),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'plano': None if executemany else self.explicar(conn, cursor, statement, parameters)
+        }, ensure_ascii=False, default=str))
+
+    def explicar(self, conn, cursor, statement, parameters):
+        if not statement.lstrip().upper().startswith(EXPLICAVEIS):
+            return None
+        # Mesma conexão DBAPI do statement: enxerga a transação atual, não passa pelos
+        # eventos e não pede outra conexão ao pool (com o pool esgotado ela esperaria
+        # pool_timeout com a conexão da requisição ainda presa)
+        dbapi = cursor.connection
+        try:
+            if conn.dialect.name == 'sqlite':
+                linhas = dbapi.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            else:
+                linhas = self._explicar_em_savepoint(dbapi, 'EXPLAIN ' + statement, parameters)
+            return [' '.join(str(coluna) for coluna in linha) for linha in linhas]
+        except Exception as e:
+            return [f'EXPLAIN falhou: {e}']
+
+    @staticmethod
+    def _explicar_em_savepoint(dbapi, explain, parameters):
+        """EXPLAIN dentro de um savepoint: se falhar, não aborta a transação da requisição"""
+        em_transacao = not getattr(dbapi, 'autocommit', False)
+        cur = dbapi.cursor()
+        try:
+            if em_transacao:
+                cur.execute('SAVEPOINT explicar_consulta_lenta')
+            try:
+                cur.execute(explain, parameters)
+                linhas = cur.fetchall()
+            except Exception:
+                if em_transacao:
+                    cur.execute('ROLLBACK TO SAVEPOINT explicar_consulta_lenta')
+                raise
+            if em_transacao:
+                cur.execute('RELEASE SAVEPOINT explicar_consulta_lenta')
+            return linhas
+        finally:
+            cur.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany):
+    # Início no contexto do statement (não na conexão): falhas não deixam resto
+    if context is not None:
+        context._slow_query_inicio = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, '_slow_query_inicio', None)
+    if inicio is None or not has_app_context():
+        return
+    duracao = time.perf_counter() - inicio
+    registro = current_app.extensions.get('slow_queries')
+    if registro is not None and duracao >= registro.limite:
+        registro.registrar(conn, cursor, statement, parameters, executemany, duracao)
+
+
+def agregar(caminhos):
+    """Agrupa as entradas do log por fingerprint"""
+    grupos = {}
+    for caminho in caminhos:
+        with open(caminho, encoding='utf-8') as arquivo:
+            for linha in arquivo:
+                try:
+                    entrada = json.loads(linha)
+                except ValueError:
+                    continue
+                grupo = grupos.setdefault(entrada['fingerprint'], {
+                    'fingerprint': entrada['fingerprint'],
+                    'sql': entrada['sql'],
+                    'total': 0,
+                    'tempo_total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'endpoints': set(),
+                    'plano': None
+                })
+                grupo['total'] += 1
+                grupo['tempo_total_ms'] += entrada['duracao_ms']
+                grupo['max_ms'] = max(grupo['max_ms'], entrada['duracao_ms'])
+                if entrada.get('endpoint'):
+                    grupo['endpoints'].add(entrada['endpoint'])
+                if entrada.get('plano'):
+                    grupo['plano'] = entrada['plano']
+    return sorted(grupos.values(), key=lambda g: g['tempo_total_ms'], reverse=True)
+
+
+def init_app(app):
+    """Ativa o log de consultas lentas e registra o comando `consultas-lentas`"""
+    if app.config['SLOW_QUERY_MS'] > 0:
+        app.extensions['slow_queries'] = RegistroConsultasLentas(app)
+
+    @app.cli.command('consultas-lentas')
+    @click.option('--top', default=20, help='Quantidade de fingerprints exibidos')
+    @click.option('--planos/--sem-planos', default=True, help='Exibir o último plano de cada fingerprint')
+    def consultas_lentas(top, planos):
+        """Ranking dos statements lentos por tempo total"""
+        base = app.config['SLOW_QUERY_LOG']
+        caminhos = [f'{base}.{i}' for i in range(app.config['SLOW_QUERY_LOG_BACKUPS'], 0, -1)] + [base]
+        caminhos = [c for c in caminhos if os.path.exists(c)]
+        if not caminhos:
+            click.echo(f'Nenhum log encontrado em {base}')
+            return
+
+        for posicao, grupo in enumerate(agregar(caminhos)[:top], start=1):
+            click.echo(f"#{posicao} {grupo['fingerprint']}  total={grupo['tempo_total_ms']:.1f}ms  "
+                       f"n={grupo['total']}  media={grupo['tempo_total_ms'] / grupo['total']:.1f}ms  "
+                       f"max={grupo['max_ms']:.1f}ms")
+            click.echo(f"    endpoints: {', '.join(sorted(grupo['endpoints'])) or '-'}")
+            click.echo(f"    {grupo['sql']}")
+            if planos and grupo['plano']:
+                for linha in grupo['plano']:
+                    click.echo(f'      | {linha}')
+            click.echo()
@@ -0,0 +1,50 @@
+"""
+Aquecimento de workers antes de receberem tráfego.
+
+Chamado pelo gunicorn (post_worker_init) em cada worker. Abre as conexões do
+pool e executa as funções registradas com `registrar_aquecimento`, usadas pelos
+caches para se popularem antes da primeira requisição real.
+"""
+import time
+from flask import current_app
+from sqlalchemy import text
+from app import db
+
+_aquecimentos = []
+
+
+def registrar_aquecimento(funcao):
+    """Registra uma função chamada (dentro do app context) no aquecimento do worker"""
+    _aquecimentos.append(funcao)
+    return funcao
+
+
+def aquecer_pool(conexoes):
+    """Abre `conexoes` conexões de uma vez para que o pool já comece cheio"""
+    abertas = []
+    try:
+        for _ in range(conexoes):
+            conn = db.engine.connect()
+            conn.execute(text('SELECT 1'))
+            abertas.append(conn)
+    finally:
+        for conn in abertas:
+            conn.close()
+
+
+def aquecer(app, conexoes=None):
+    """Aquece pool e caches; retorna o tempo gasto em segundos"""
+    inicio = time.perf_counter()
+    with app.app_context():
+        if conexoes is None:
+            conexoes = app.config['WARMUP_POOL_CONNECTIONS']
+        aquecer_pool(conexoes)
+        for funcao in _aquecimentos:
+            try:
+                funcao()
+            except Exception as e:
+                # Um cache que falha ao aquecer só perde o ganho, não derruba o worker
+                current_app.logger.warning('Falha no aquecimento %s: %s', funcao.__name__, e)
+        # Primeira requisição compila o url_map e inicializa os hooks do Flask
+        app.test_client().get('/api/ping')
+    return time.perf_counter() - inicio
@@ -0,0 +1,112 @@
+"""
+Benchmark da busca de alunos do professor (/api/professor/alunos/search).
+
+Monta um banco SQLite temporário com `--alunos` alunos distribuídos em
+`--turmas` turmas de `--professores` professores, cria os índices de busca
+(FTS5 trigram) e mede a latência de buscar_alunos para termos curtos, comuns,
+raros e que casam com quase todos (domínio do email), como o primeiro
+professor, que tem turmas/professores turmas. Com menos professores ele tem
+mais alunos e os termos seletivos passam pelo índice FTS5.
+
+Para cada termo imprime quantos alunos vieram na primeira página e as
+latências p50/p99; a última linha é o p99 geral.
+
+Uso:
+    python bench_busca_alunos.py --alunos 100000 --execucoes 50
+    python bench_busca_alunos.py --alunos 100000 --professores 10
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Valentina', 'Mariana')
+SOBRENOMES = ('Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+              'Gomes', 'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes')
+TERMOS = ('a', 'ma', 'ana', 'mari', 'silva', 'ana silva', 'rafael costa', 'escola', 'aluno12', 'xyz', '12345')
+
+
+def popular(db, alunos, turmas, professores):
+    from app.models import Usuario, Turma
+
+    gerador = random.Random(42)
+    modelo = Usuario(nome='x', email='x@bench', senha='x')
+    senha_hash = modelo.senha_hash  # hash feito uma vez só
+    db.session.execute(Usuario.__table__.insert(), [
+        {'nome': f'Professor {i}', 'email': f'professor{i}@bench', 'senha_hash': senha_hash,
+         'nivel': 1, 'xp': 0, 'tipo_usuario': 'professor'}
+        for i in range(professores)
+    ])
+    professor_ids = [id_ for id_, in db.session.query(Usuario.id).filter_by(tipo_usuario='professor').order_by(Usuario.id)]
+    db.session.execute(Turma.__table__.insert(), [
+        {'nome': f'Turma {i}', 'codigo': f'B{i:05d}', 'professor_id': professor_ids[i % professores], 'ativa': True}
+        for i in range(turmas)
+    ])
+    turma_ids = [id_ for id_, in db.session.query(Turma.id).order_by(Turma.id)]
+
+    linhas = []
+    for i in range(alunos):
+        nome, sobrenome = gerador.choice(NOMES), gerador.choice(SOBRENOMES)
+        linhas.append({'nome': f'{nome} {gerador.choice(SOBRENOMES)} {sobrenome}',
+                       'email': f'{nome.lower()}.{sobrenome.lower()}.aluno{i}@escola.edu.br',
+                       'senha_hash': senha_hash, 'nivel': 1 + i % 10, 'xp': i % 20,
+                       'tipo_usuario': 'aluno', 'turma_id': turma_ids[i % turmas]})
+    db.session.execute(Usuario.__table__.insert(), linhas)
+    db.session.commit()
+    # turma_stats decide entre percorrer os alunos do professor e o índice
+    from app.estatisticas import verificar_estatisticas
+    verificar_estatisticas(corrigir=True)
+    db.session.commit()
+    return professor_ids[0]
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latência da busca de alunos do professor')
+    parser.add_argument('--alunos', type=int, default=100000)
+    parser.add_argument('--turmas', type=int, default=2000)
+    parser.add_argument('--professores', type=int, default=100)
+    parser.add_argument('--execucoes', type=int, default=50)
+    args = parser.parse_args()
+
+    arquivo = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    arquivo.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{arquivo.name}'
+    os.environ['SLOW_QUERY_MS'] = '0'
+
+    from app import create_app, db
+    from app.busca import buscar_alunos, criar_indices_busca
+    app = create_app('development')
+    try:
+        with app.app_context():
+            db.create_all()
+            # Índices depois da carga, como na migração de um banco existente
+            professor_id = popular(db, args.alunos, args.turmas, args.professores)
+            criar_indices_busca()
+            print(f"{args.alunos} alunos; professor {professor_id} com {args.turmas // args.professores} turmas")
+            print(f"{'termo':<16}{'página':>8}{'p50':>10}{'p99':>10}")
+            todas = []
+            for termo in TERMOS:
+                tempos = []
+                for _ in range(args.execucoes):
+                    db.session.remove()
+                    inicio = time.perf_counter()
+                    alunos, _ = buscar_alunos(professor_id, termo, 1, 20)
+                    tempos.append(time.perf_counter() - inicio)
+                todas += tempos
+                print(f"{termo:<16}{len(alunos):>8}{statistics.median(tempos) * 1000:>7.1f} ms"
+                      f"{percentil(tempos, 0.99) * 1000:>7.1f} ms")
+            print(f"{'geral':<16}{'':>8}{statistics.median(todas) * 1000:>7.1f} ms{percentil(todas, 0.99) * 1000:>7.1f} ms")
+    finally:
+        os.unlink(arquivo.name)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Benchmark de memória e CPU por 10 mil linhas: objetos ORM x linhas somente leitura.
+
+Monta um banco SQLite temporário com um aluno que concluiu `--linhas` desafios
+e uma turma com `--linhas` alunos, e compara as duas formas de montar as
+listas de obter_historico_desafios, obter_progresso e minha_turma:
+  - orm    : Model.query...all() + to_dict/atributos (como era antes)
+  - linhas : select de colunas via consultar_linhas (como é agora)
+
+Para cada caso imprime tempo de CPU (mediana) e pico de memória alocada
+(tracemalloc), normalizados por 10 mil linhas.
+
+Uso:
+    python bench_linhas.py --linhas 10000 --execucoes 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def popular(db, linhas):
+    from app.models import Usuario, Turma, Desafio, Resultado
+
+    professor = Usuario(nome='Professor', email='prof@bench', senha='x')
+    professor.tipo_usuario = 'professor'
+    db.session.add(professor)
+    db.session.flush()
+    turma = Turma(nome='Turma bench', professor_id=professor.id)
+    db.session.add(turma)
+    db.session.flush()
+
+    # Senha com hash feito uma vez só: gerar 10 mil hashes dominaria o setup
+    senha_hash = professor.senha_hash
+    db.session.execute(Usuario.__table__.insert(), [
+        {'nome': f'Aluno {i}', 'email': f'aluno{i}@bench', 'senha_hash': senha_hash,
+         'nivel': 1 + i % 10, 'xp': i % 20, 'tipo_usuario': 'aluno', 'turma_id': turma.id}
+        for i in range(linhas)
+    ])
+    db.session.execute(Desafio.__table__.insert(), [
+        {'titulo': f'Desafio {i}', 'descricao': 'x' * 500, 'perguntas': [{'pergunta': 'p', 'opcoes': ['a', 'b']}],
+         'desafio_pratico': 'y' * 500, 'status': 'ativo'}
+        for i in range(linhas)
+    ])
+    aluno_id = db.session.query(Usuario.id).filter_by(email='aluno0@bench').scalar()
+    hoje = datetime(2026, 1, 1)
+    db.session.execute(Resultado.__table__.insert(), [
+        {'usuario_id': aluno_id, 'desafio_id': desafio_id, 'status': 'concluído', 'pontuacao': desafio_id % 100,
+         'data_inicio': hoje, 'data_conclusao': hoje - timedelta(days=desafio_id),
+         'respostas_quiz': {'1': 'a'}, 'resposta_pratica': 'z' * 300}
+        for desafio_id, in db.session.query(Desafio.id)
+    ])
+    db.session.commit()
+    return aluno_id, turma.id
+
+
+def casos(aluno_id, turma_id):
+    from sqlalchemy import select, func
+    from app.models import Usuario, Desafio, Resultado, contar_sequencia
+    from app.projecoes import consultar_linhas, linhas_para_dicts
+
+    def historico_orm():
+        resultados = Resultado.query.filter_by(usuario_id=aluno_id, status='concluído').all()
+        return [{'id': r.desafio_id, 'titulo': r.desafio.titulo,
+                 'data_conclusao': r.data_conclusao.isoformat(), 'pontuacao': r.pontuacao} for r in resultados]
+
+    def historico_linhas():
+        return linhas_para_dicts(consultar_linhas(
+            select(Resultado.desafio_id.label('id'), Desafio.titulo, Resultado.data_conclusao, Resultado.pontuacao)
+            .join(Desafio, Desafio.id == Resultado.desafio_id)
+            .where(Resultado.usuario_id == aluno_id, Resultado.status == 'concluído')
+            .order_by(Resultado.id)
+        ))
+
+    def progresso_orm():
+        resultados = Resultado.query.filter_by(usuario_id=aluno_id, status='concluído') \
+            .order_by(Resultado.data_conclusao.asc()).all()
+        usuario = Usuario.query.get(aluno_id)
+        return (usuario.calcular_desafios_concluidos(), usuario.calcular_sequencia(),
+                [{'data_conclusao': r.data_conclusao.strftime('%d/%m/%Y'), 'pontuacao': r.pontuacao}
+                 for r in resultados])
+
+    def progresso_linhas():
+        resultados = consultar_linhas(
+            select(Resultado.data_conclusao, Resultado.pontuacao)
+            .where(Resultado.usuario_id == aluno_id, Resultado.status == 'concluído')
+            .order_by(Resultado.data_conclusao.asc())
+        )
+        return (len(resultados), contar_sequencia([r.data_conclusao for r in reversed(resultados)]),
+                [{'data_conclusao': r.data_conclusao.strftime('%d/%m/%Y'), 'pontuacao': r.pontuacao}
+                 for r in resultados])
+
+    def colegas_orm():
+        # Sem calcular_desafios_concluidos: o N+1 esconderia a diferença de materialização
+        alunos = Usuario.query.filter_by(turma_id=turma_id).all()
+        return [{'id': a.id, 'nome': a.nome, 'nivel': a.nivel, 'xp': a.xp} for a in alunos if a.id != aluno_id]
+
+    def colegas_linhas():
+        concluidos = (select(func.count(Resultado.id))
+                      .where(Resultado.usuario_id == Usuario.id, Resultado.status == 'concluído')
+                      .correlate(Usuario).scalar_subquery())
+        return linhas_para_dicts(consultar_linhas(
+            select(Usuario.id, Usuario.nome, Usuario.nivel, Usuario.xp, concluidos.label('desafios_concluidos'))
+            .where(Usuario.turma_id == turma_id, Usuario.id != aluno_id)
+            .order_by(Usuario.id)
+        ))
+
+    return {
+        'historico': (historico_orm, historico_linhas),
+        'progresso': (progresso_orm, progresso_linhas),
+        'colegas (minha_turma)': (colegas_orm, colegas_linhas),
+    }
+
+
+def medir(db, funcao, execucoes):
+    """Mediana de CPU e de pico de memória; o tracemalloc só liga na passada de memória"""
+    tempos, picos = [], []
+    for _ in range(execucoes):
+        # Sessão limpa a cada execução, como em uma requisição nova
+        db.session.remove()
+        inicio = time.process_time()
+        funcao()
+        tempos.append(time.process_time() - inicio)
+
+        db.session.remove()
+        tracemalloc.start()
+        funcao()
+        picos.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    db.session.remove()
+    return statistics.median(tempos), statistics.median(picos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memória e CPU: objetos ORM x linhas somente leitura')
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--execucoes', type=int, default=5)
+    args = parser.parse_args()
+
+    arquivo = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    arquivo.close()
+    os.environ['DATABASE_URL'] = f'sqlite:///{arquivo.name}'
+    os.environ['SLOW_QUERY_MS'] = '0'
+
+    from app import create_app, db
+    app = create_app('development')
+    try:
+        with app.app_context():
+            db.create_all()
+            aluno_id, turma_id = popular(db, args.linhas)
+            escala = 10000 / args.linhas
+            print(f"{'caso':<24}{'modo':<8}{'CPU/10k':>12}{'pico/10k':>14}")
+            for nome, (orm, linhas) in casos(aluno_id, turma_id).items():
+                resultados = {}
+                for modo, funcao in (('orm', orm), ('linhas', linhas)):
+                    cpu, pico = medir(db, funcao, args.execucoes)
+                    resultados[modo] = (cpu, pico)
+                    print(f"{nome:<24}{modo:<8}{cpu * escala * 1000:>9.1f} ms{pico * escala / 2 ** 20:>11.1f} MiB")
+                (cpu_orm, pico_orm), (cpu_linhas, pico_linhas) = resultados['orm'], resultados['linhas']
+                print(f"{'':<24}{'ganho':<8}{cpu_orm / cpu_linhas:>11.1f}x{pico_orm / pico_linhas:>13.1f}x")
+    finally:
+        os.unlink(arquivo.name)
+
+
+if __name__ == '__main__':
+    main()
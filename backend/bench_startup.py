@@ -0,0 +1,84 @@
+"""
+Benchmark de inicialização a frio do backend.
+
+Cada medição roda em um processo Python novo, como um container recém-criado:
+  - seed.py            : o que o entrypoint antigo executava a cada start
+  - bootstrap.py       : o passo atual com o banco já atualizado
+  - import run         : importação + create_app (custo de cada worker)
+  - gunicorn /api/ping : do exec do gunicorn até a primeira resposta
+
+Uso:
+    DATABASE_URL=sqlite:////tmp/bench.db python bench_startup.py --execucoes 5
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+def cronometrar(comando):
+    inicio = time.perf_counter()
+    subprocess.run(comando, cwd=DIRETORIO, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - inicio
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def tempo_ate_ping(workers):
+    porta = porta_livre()
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}', '--workers', str(workers), 'run:app'],
+        cwd=DIRETORIO, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - inicio < 30:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{porta}/api/ping', timeout=1) as resposta:
+                    if resposta.status == 200:
+                        return time.perf_counter() - inicio
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('gunicorn não respondeu em 30s')
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def resumir(nome, amostras):
+    print(f"{nome:<22} mediana {statistics.median(amostras) * 1000:8.0f} ms   "
+          f"min {min(amostras) * 1000:8.0f} ms   max {max(amostras) * 1000:8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de inicialização a frio')
+    parser.add_argument('--execucoes', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=1, help='Workers do gunicorn na medição de /api/ping')
+    args = parser.parse_args()
+
+    # Garante o banco atualizado antes de medir o caminho rápido
+    cronometrar([sys.executable, 'bootstrap.py'])
+
+    medicoes = {
+        'seed.py (antigo)': lambda: cronometrar([sys.executable, 'seed.py']),
+        'bootstrap.py': lambda: cronometrar([sys.executable, 'bootstrap.py']),
+        'import run': lambda: cronometrar([sys.executable, '-c', 'import run']),
+        'gunicorn /api/ping': lambda: tempo_ate_ping(args.workers),
+    }
+    for nome, medir in medicoes.items():
+        resumir(nome, [medir() for _ in range(args.execucoes)])
+
+
+if __name__ == '__main__':
+    main()
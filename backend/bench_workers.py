@@ -0,0 +1,97 @@
+"""
+Compara as classes de worker do gunicorn (sync, gthread, gevent) nos
+endpoints dominados por I/O de banco.
+
+Para cada classe sobe um gunicorn com gunicorn.conf.py, dispara tráfego
+concorrente por --duracao segundos e imprime throughput e latências.
+Os números só fazem sentido contra o banco de produção (Postgres via
+DATABASE_URL); com SQLite local quase não há espera de I/O.
+
+Uso:
+    python bench_workers.py --workers 2 --concorrencia 50 --duracao 20
+"""
+import argparse
+import os
+import subprocess
+import threading
+import time
+
+from loadtest import Cliente, Estatisticas, SENHA_PADRAO, aguardar_servidor, preparar_usuarios
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+def iniciar_gunicorn(classe, args):
+    env = dict(os.environ,
+               GUNICORN_WORKER_CLASS=classe,
+               GUNICORN_WORKERS=str(args.workers),
+               GUNICORN_BIND=args.base_url.split('://', 1)[-1].rstrip('/'))
+    processo = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', 'run:app'], cwd=DIRETORIO, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not aguardar_servidor(args.base_url):
+        processo.terminate()
+        raise RuntimeError(f'gunicorn ({classe}) não respondeu a /api/ping')
+    return processo
+
+
+def gerar_trafego(args, estatisticas, emails, turmas_por_professor):
+    """Cada usuário virtual repete as leituras até o fim da duração"""
+    limite = time.perf_counter() + args.duracao
+
+    def aluno(email):
+        cliente = Cliente(args.base_url, estatisticas, args.timeout)
+        if not cliente.login(email, SENHA_PADRAO, etapa=None):
+            return
+        while time.perf_counter() < limite:
+            cliente.chamar('users/me', 'GET', '/api/users/me')
+            cliente.chamar('desafios/destaque', 'GET', '/api/desafios/destaque')
+            cliente.chamar('users/progresso', 'GET', '/api/users/progresso')
+
+    def professor(email, turma_id):
+        cliente = Cliente(args.base_url, estatisticas, args.timeout)
+        if not cliente.login(email, SENHA_PADRAO, etapa=None):
+            return
+        while time.perf_counter() < limite:
+            cliente.chamar('professor/dashboard', 'GET', '/api/professor/dashboard')
+            cliente.chamar('professor/relatorio', 'GET', f'/api/professor/relatorio-turma/{turma_id}')
+
+    threads = [threading.Thread(target=aluno, args=(email,)) for email in emails[:args.concorrencia]]
+    threads += [threading.Thread(target=professor, args=par) for par in turmas_por_professor]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparação de classes de worker do gunicorn')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5090')
+    parser.add_argument('--classes', default='sync,gthread,gevent')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concorrencia', type=int, default=50, help='Alunos simultâneos')
+    parser.add_argument('--professores', type=int, default=2)
+    parser.add_argument('--duracao', type=float, default=20.0, help='Segundos de tráfego por classe')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args()
+    args.alunos = args.concorrencia
+
+    usuarios = None
+    for classe in args.classes.split(','):
+        processo = iniciar_gunicorn(classe, args)
+        try:
+            if usuarios is None:
+                usuarios = preparar_usuarios(args)
+            estatisticas = Estatisticas()
+            inicio = time.perf_counter()
+            gerar_trafego(args, estatisticas, *usuarios)
+            duracao = time.perf_counter() - inicio
+        finally:
+            processo.terminate()
+            processo.wait()
+
+        print(f"\n=== {classe} ({args.workers} workers, {args.concorrencia} alunos simultâneos) ===")
+        print(estatisticas.relatorio(duracao))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Bootstrap único do banco de dados: schema, migrações e dados iniciais.
+
+Roda uma vez antes do gunicorn (entrypoint.sh), nunca dentro dos workers.
+Cada etapa de MIGRACOES é aplicada uma única vez e registrada na tabela
+bootstrap_versao; com o banco em dia o script sai após uma única consulta.
+Para alterar o schema ou o seed, acrescente uma nova etapa no final da lista.
+
+Uso:
+    python bootstrap.py            # aplica as etapas pendentes
+    python bootstrap.py --forcar   # reaplica todas as etapas
+"""
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import case, func, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import create_app, db
+from app.models import VersaoBootstrap
+
+# Chave do advisory lock do Postgres que serializa bootstraps concorrentes
+CHAVE_LOCK = 48_151_623
+
+
+def _v1_schema_inicial():
+    from seed import seed_database
+    seed_database()
+
+
+def _criar_indice(nome, tabela, colunas, unico=False):
+    # DDL fixo, e não os índices atuais do modelo: a etapa cria só o seu índice,
+    # como ele era quando a etapa foi escrita (e não os de etapas posteriores)
+    with db.engine.begin() as conn:
+        conn.execute(text(f"CREATE {'UNIQUE ' if unico else ''}INDEX IF NOT EXISTS {nome} "
+                          f"ON {tabela} ({', '.join(colunas)})"))
+
+
+def _v2_indice_desafios_turma():
+    # create_all não cria índices novos em tabelas existentes
+    _criar_indice('ix_desafios_turma_status_data', 'desafios', ('turma_id', 'status', 'data_criacao'))
+
+
+def _v3_indice_resultados_usuario():
+    _criar_indice('ix_resultados_usuario_status', 'resultados', ('usuario_id', 'status'))
+
+
+def _v4_eventos_turma():
+    # A tabela é criada pelo create_all que antecede cada etapa
+    pass
+
+
+def _v5_invalidacoes_cache():
+    # A tabela é criada pelo create_all que antecede cada etapa
+    pass
+
+
+def _v6_indice_usuarios_turma():
+    _criar_indice('ix_usuarios_turma_id', 'usuarios', ('turma_id',))
+
+
+def _v7_estatisticas_turmas():
+    # Tabelas criadas pelo create_all; o verificador preenche uma linha por turma e desafio
+    from app.estatisticas import verificar_estatisticas
+    verificar_estatisticas(corrigir=True)
+
+
+def _v8_respostas_idempotentes():
+    # A tabela é criada pelo create_all que antecede cada etapa
+    pass
+
+
+def _v9_resultado_unico_por_desafio():
+    from app.models import Resultado
+    from app.estatisticas import verificar_estatisticas
+
+    # Duplicatas de (usuario_id, desafio_id) criadas pela corrida do antigo
+    # consulta-e-insere: fica o resultado concluído de maior pontuação (ou o mais antigo)
+    tabela = Resultado.__table__
+    par = (tabela.c.usuario_id, tabela.c.desafio_id)
+    duplicados = db.session.execute(
+        select(*par).group_by(*par).having(func.count(tabela.c.id) > 1)
+    ).all()
+    for usuario_id, desafio_id in duplicados:
+        ids = db.session.execute(
+            select(tabela.c.id)
+            .where(tabela.c.usuario_id == usuario_id, tabela.c.desafio_id == desafio_id)
+            .order_by(case((tabela.c.status == 'concluído', 0), else_=1),
+                      func.coalesce(tabela.c.pontuacao, 0).desc(), tabela.c.id)
+        ).scalars().all()
+        db.session.execute(tabela.delete().where(tabela.c.id.in_(ids[1:])))
+    db.session.commit()
+    if duplicados:
+        print(f"  {len(duplicados)} pares (usuário, desafio) com resultados duplicados unificados")
+
+    # Só depois de remover as duplicatas, que o índice único recusaria
+    _criar_indice('uq_resultados_usuario_desafio', 'resultados', ('usuario_id', 'desafio_id'), unico=True)
+    # Participantes em desafio_stats contavam as linhas removidas
+    verificar_estatisticas(corrigir=True)
+
+
+def _v10_tokens_revogados():
+    # A tabela é criada pelo create_all que antecede cada etapa
+    pass
+
+
+def _v11_busca_alunos():
+    from app.busca import criar_indices_busca
+    criar_indices_busca()
+
+
+MIGRACOES = [
+    (1, 'schema inicial e dados de exemplo', _v1_schema_inicial),
+    (2, 'índice (turma_id, status, data_criacao) em desafios', _v2_indice_desafios_turma),
+    (3, 'índice (usuario_id, status) em resultados', _v3_indice_resultados_usuario),
+    (4, 'tabela eventos_turma (stream SSE do professor)', _v4_eventos_turma),
+    (5, 'tabela invalidacoes_cache (barramento de invalidação)', _v5_invalidacoes_cache),
+    (6, 'índice turma_id em usuarios (contagem de alunos por turma)', _v6_indice_usuarios_turma),
+    (7, 'estatísticas materializadas turma_stats e desafio_stats', _v7_estatisticas_turmas),
+    (8, 'tabela respostas_idempotentes (Idempotency-Key)', _v8_respostas_idempotentes),
+    (9, 'índice único (usuario_id, desafio_id) em resultados', _v9_resultado_unico_por_desafio),
+    (10, 'tabela tokens_revogados (rotação de refresh tokens)', _v10_tokens_revogados),
+    (11, 'índices de busca de alunos (pg_trgm ou FTS5 trigram)', _v11_busca_alunos),
+]
+
+
+def versao_aplicada():
+    """Maior etapa já aplicada (0 se o banco ainda não foi inicializado)"""
+    try:
+        return db.session.execute(text('SELECT MAX(versao) FROM bootstrap_versao')).scalar() or 0
+    except SQLAlchemyError:
+        db.session.rollback()
+        return 0
+
+
+@contextmanager
+def _lock_bootstrap():
+    """Impede que dois containers subindo juntos apliquem as mesmas etapas"""
+    if db.engine.dialect.name != 'postgresql':
+        yield
+        return
+    with db.engine.connect() as conn:
+        conn.execute(text('SELECT pg_advisory_lock(:chave)'), {'chave': CHAVE_LOCK})
+        try:
+            yield
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:chave)'), {'chave': CHAVE_LOCK})
+
+
+def executar_bootstrap(forcar=False):
+    """Aplica as etapas pendentes; retorna as versões aplicadas"""
+    ultima = MIGRACOES[-1][0]
+    if not forcar and versao_aplicada() >= ultima:
+        return []
+
+    aplicadas = []
+    with _lock_bootstrap():
+        atual = 0 if forcar else versao_aplicada()
+        for versao, descricao, etapa in MIGRACOES:
+            if versao <= atual:
+                continue
+            print(f"▶ Bootstrap {versao}: {descricao}")
+            # Tabelas novas primeiro, para que a etapa possa popular ou migrar dados
+            db.create_all()
+            etapa()
+            registro = VersaoBootstrap.query.filter_by(versao=versao).first()
+            if not registro:
+                db.session.add(VersaoBootstrap(versao=versao, descricao=descricao))
+            db.session.commit()
+            aplicadas.append(versao)
+    return aplicadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bootstrap do banco de dados HUMANIQ')
+    parser.add_argument('--forcar', action='store_true', help='Reaplica todas as etapas')
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    app = create_app(os.environ.get('FLASK_CONFIG', 'default'))
+    with app.app_context():
+        aplicadas = executar_bootstrap(forcar=args.forcar)
+    decorrido = (time.perf_counter() - inicio) * 1000
+
+    if aplicadas:
+        print(f"✅ Bootstrap aplicou as etapas {aplicadas} em {decorrido:.0f} ms")
+    else:
+        print(f"✅ Banco já atualizado (verificado em {decorrido:.0f} ms)")
+
+
+if __name__ == '__main__':
+    main()
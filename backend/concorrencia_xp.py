@@ -0,0 +1,186 @@
+"""
+Teste de concorrência da conclusão de desafios: XP exato sob requisições simultâneas.
+
+Cria `--alunos` alunos e `--desafios` desafios, inicia todos os desafios e
+dispara `--repeticoes` POST /concluir para cada par (aluno, desafio) ao mesmo
+tempo, embaralhados, a partir de `--threads` threads. Ao final confere, para
+cada aluno:
+  - exatamente uma resposta "concluído com sucesso" por desafio;
+  - XP acumulado (nível + XP no nível) == desafios * XP_POR_DESAFIO.
+Sai com código 1 se algo divergir.
+
+Por padrão sobe um gunicorn local com SQLite temporário; com --base-url usa um
+servidor já em execução (ex.: Postgres com vários workers).
+
+Uso:
+    python concorrencia_xp.py --alunos 20 --desafios 5 --repeticoes 8 --threads 64
+    python concorrencia_xp.py --base-url http://127.0.0.1:5000 --workers 4
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from app.models import xp_acumulado
+from app.resources.desafio import XP_POR_DESAFIO
+
+SENHA_PADRAO = 'concorrencia123'
+PROFESSOR = ('professor@humaniq.com', 'professor123')
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def aguardar_servidor(base_url, timeout=30):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            if requests.get(f'{base_url}/api/ping', timeout=1).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def iniciar_servidor(args):
+    """Bootstrap em um SQLite temporário e gunicorn local com `--workers` workers"""
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    banco = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    banco.close()
+    ambiente = dict(os.environ, DATABASE_URL=f'sqlite:///{banco.name}', GUNICORN_WARMUP='false',
+                    RATE_LIMIT_ENABLED='false')
+    subprocess.run([sys.executable, 'bootstrap.py'], cwd=diretorio, env=ambiente, check=True,
+                   stdout=subprocess.DEVNULL)
+    porta = porta_livre()
+    comando = ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}',
+               '--workers', str(args.workers), '--worker-class', 'gthread', '--threads', '8', 'run:app']
+    processo = subprocess.Popen(comando, cwd=diretorio, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{porta}'
+    if not aguardar_servidor(base_url):
+        processo.terminate()
+        sys.exit('Servidor não respondeu a /api/ping a tempo')
+    return processo, base_url, banco.name
+
+
+def login(base_url, email, senha):
+    resposta = requests.post(f'{base_url}/api/auth/login', json={'email': email, 'senha': senha})
+    resposta.raise_for_status()
+    return {'Authorization': f"Bearer {resposta.json()['access_token']}"}
+
+
+def preparar(args, base_url):
+    """Cria desafios e alunos, e inicia todos os desafios; retorna ([ids], [headers])"""
+    professor = login(base_url, *PROFESSOR)
+    lote = uuid.uuid4().hex[:6]
+    desafio_ids = []
+    for i in range(args.desafios):
+        resposta = requests.post(f'{base_url}/api/professor/desafios', headers=professor, json={
+            'titulo': f'Concorrência {lote} {i}', 'descricao': 'x', 'perguntas': [],
+            'desafio_pratico': 'x', 'video_url': '', 'turma_id': None
+        })
+        resposta.raise_for_status()
+    # A resposta da criação não traz o id: busca pelo título no catálogo
+    catalogo = requests.get(f'{base_url}/api/desafios', headers=professor).json()['desafios']
+    desafio_ids = [d['desafio_id'] for d in catalogo if d['titulo'].startswith(f'Concorrência {lote}')]
+
+    alunos = []
+    for i in range(args.alunos):
+        email = f'concorrencia-{lote}-{i}@humaniq.test'
+        requests.post(f'{base_url}/api/users/register',
+                      json={'nome': f'Aluno {i}', 'email': email, 'senha': SENHA_PADRAO}).raise_for_status()
+        headers = login(base_url, email, SENHA_PADRAO)
+        for desafio_id in desafio_ids:
+            requests.post(f'{base_url}/api/desafios/{desafio_id}/iniciar', headers=headers).raise_for_status()
+        alunos.append(headers)
+    return desafio_ids, alunos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='XP exato com conclusões simultâneas do mesmo desafio')
+    parser.add_argument('--base-url', help='Servidor em execução (padrão: sobe um gunicorn local)')
+    parser.add_argument('--workers', type=int, default=4, help='Workers do gunicorn local')
+    parser.add_argument('--alunos', type=int, default=20)
+    parser.add_argument('--desafios', type=int, default=5)
+    parser.add_argument('--repeticoes', type=int, default=8, help='POST /concluir simultâneos por par')
+    parser.add_argument('--threads', type=int, default=64)
+    args = parser.parse_args()
+
+    servidor, banco = None, None
+    base_url = args.base_url
+    if not base_url:
+        servidor, base_url, banco = iniciar_servidor(args)
+    try:
+        print(f'Preparando {args.alunos} alunos e {args.desafios} desafios em {base_url}...')
+        desafio_ids, alunos = preparar(args, base_url)
+
+        chamadas = [(aluno, desafio_id) for aluno in range(len(alunos)) for desafio_id in desafio_ids
+                    for _ in range(args.repeticoes)]
+        random.shuffle(chamadas)
+        sucessos = Counter()
+        falhas = Counter()
+        sessoes = threading.local()
+        largada = threading.Barrier(args.threads)
+
+        def concluir(chamada):
+            aluno, desafio_id = chamada
+            sessao = getattr(sessoes, 'sessao', None)
+            if sessao is None:
+                sessao = sessoes.sessao = requests.Session()
+                largada.wait()  # todas as threads disparam juntas
+            resposta = sessao.post(f'{base_url}/api/desafios/{desafio_id}/concluir', headers=alunos[aluno])
+            if resposta.status_code != 200:
+                falhas[resposta.status_code] += 1
+            elif 'sucesso' in resposta.json()['message']:
+                sucessos[(aluno, desafio_id)] += 1
+
+        print(f'Disparando {len(chamadas)} conclusões com {args.threads} threads...')
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as executor:
+            list(executor.map(concluir, chamadas))
+        print(f'Concluído em {time.perf_counter() - inicio:.2f}s')
+
+        esperado = len(desafio_ids) * XP_POR_DESAFIO
+        erros = []
+        if falhas:
+            erros.append(f'respostas com erro: {dict(falhas)}')
+        duplicadas = {par: n for par, n in sucessos.items() if n != 1}
+        faltando = len(alunos) * len(desafio_ids) - len(sucessos)
+        if duplicadas or faltando:
+            erros.append(f'conclusões: {len(duplicadas)} pares premiados mais de uma vez, {faltando} sem conclusão')
+        for aluno, headers in enumerate(alunos):
+            perfil = requests.get(f'{base_url}/api/users/me', headers=headers).json()['usuario']
+            total = xp_acumulado(perfil['nivel'], perfil['xp'])
+            if total != esperado:
+                erros.append(f'aluno {aluno}: nível {perfil["nivel"]}, xp {perfil["xp"]} (total {total}, esperado {esperado})')
+
+        if erros:
+            print('FALHOU')
+            for erro in erros:
+                print(f'  - {erro}')
+            sys.exit(1)
+        print(f'OK: {len(alunos)} alunos com exatamente {esperado} XP cada')
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+        if banco:
+            os.unlink(banco)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,104 @@ class Config:
     # Configurações CORS
     CORS_HEADERS = 'Content-Type'
 
+    # Instrumentação SQL por requisição
+    SQL_DEBUG_HEADERS = os.environ.get('SQL_DEBUG_HEADERS', 'false').lower() == 'true'
+    SQL_SLOW_REQUEST_QUERIES = int(os.environ.get('SQL_SLOW_REQUEST_QUERIES', 30))
+    SQL_SLOW_REQUEST_MS = float(os.environ.get('SQL_SLOW_REQUEST_MS', 250))
+
+    # Profiling sob demanda (ver app/profiling.py)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'profiles'))
+    PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'folded')  # folded ou pstats (com gevent, sempre pstats)
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.001))
+    PROFILE_TOKEN_MAX_AGE = int(os.environ.get('PROFILE_TOKEN_MAX_AGE', 3600))
+
+    # Conexões abertas por worker no aquecimento (gunicorn post_worker_init)
+    WARMUP_POOL_CONNECTIONS = int(os.environ.get('WARMUP_POOL_CONNECTIONS', 2))
+
+    # Segundos que o catálogo de desafios em memória pode ficar sem recarregar
+    # (longo: as escritas de outros workers chegam pelo barramento de invalidação)
+    CATALOGO_TTL = float(os.environ.get('CATALOGO_TTL', 3600))
+    # Segmentos (status, turma, projeção) mantidos em memória; os menos usados saem primeiro
+    CATALOGO_MAX_SEGMENTOS = int(os.environ.get('CATALOGO_MAX_SEGMENTOS', 2048))
+
+    # Cache de representações (ver app/cache.py); CACHE_REDIS_URL ativa a camada compartilhada
+    CACHE_TTL = float(os.environ.get('CACHE_TTL', 3600))
+    CACHE_LOCAL_MAX_ITENS = int(os.environ.get('CACHE_LOCAL_MAX_ITENS', 2048))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+    CACHE_REDIS_PREFIX = os.environ.get('CACHE_REDIS_PREFIX', 'humaniq:')
+
+    # Barramento de invalidação entre workers (ver app/barramento.py)
+    CACHE_BUS = os.environ.get('CACHE_BUS', 'true').lower() == 'true'
+    CACHE_BUS_POLL_INTERVAL = float(os.environ.get('CACHE_BUS_POLL_INTERVAL', 1))
+    CACHE_BUS_RETENCAO = int(os.environ.get('CACHE_BUS_RETENCAO', 3600))
+
+    # Idempotency-Key nas rotas POST repetidas por clientes móveis (ver app/idempotencia.py)
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_WAIT = float(os.environ.get('IDEMPOTENCY_WAIT', 10))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+    IDEMPOTENCY_LOCAL_MAX_ITENS = int(os.environ.get('IDEMPOTENCY_LOCAL_MAX_ITENS', 1024))
+
+    # Revogação de JWT (ver app/revogacao.py): filtro de Bloom por worker
+    JWT_REVOGACAO_CAPACIDADE = int(os.environ.get('JWT_REVOGACAO_CAPACIDADE', 100000))
+    JWT_REVOGACAO_ERRO = float(os.environ.get('JWT_REVOGACAO_ERRO', 0.001))
+    JWT_REVOGACAO_RECARGA = float(os.environ.get('JWT_REVOGACAO_RECARGA', 3600))
+    JWT_REVOGACAO_MAX_CONFIRMADOS = int(os.environ.get('JWT_REVOGACAO_MAX_CONFIRMADOS', 4096))
+    # Segundos em que um refresh já trocado ainda é aceito (repetição do cliente recebe o mesmo par)
+    JWT_REFRESH_TOLERANCIA = int(os.environ.get('JWT_REFRESH_TOLERANCIA', 10))
+
+    # Limite de requisições por IP e por conta (ver app/limites.py): "capacidade/segundos", vazio desliga
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    # Os baldes por IP comportam uma escola inteira atrás de um mesmo NAT no início da aula;
+    # no login e no registro o balde da conta é por (email, IP), para que ninguém bloqueie
+    # a conta de outro aluno só tentando senhas com o email dele
+    RATE_LIMITS = {
+        'login': {
+            'ip': os.environ.get('RATE_LIMIT_LOGIN_IP', '300/60'),
+            'conta': os.environ.get('RATE_LIMIT_LOGIN_CONTA', '5/60'),
+        },
+        'registro': {
+            'ip': os.environ.get('RATE_LIMIT_REGISTRO_IP', '300/3600'),
+            'conta': os.environ.get('RATE_LIMIT_REGISTRO_CONTA', '3/3600'),
+        },
+        'entrar_turma': {
+            'ip': os.environ.get('RATE_LIMIT_ENTRAR_TURMA_IP', '300/60'),
+            'conta': os.environ.get('RATE_LIMIT_ENTRAR_TURMA_CONTA', '10/300'),
+        },
+    }
+    RATE_LIMIT_REDIS_URL = os.environ.get('RATE_LIMIT_REDIS_URL', '')
+    RATE_LIMIT_MAX_CHAVES = int(os.environ.get('RATE_LIMIT_MAX_CHAVES', 100000))
+    # Proxies confiáveis à frente da API (ex.: 1 no Render): o IP vem do X-Forwarded-For
+    RATE_LIMIT_PROXIES = int(os.environ.get('RATE_LIMIT_PROXIES', 0))
+
+    # Itens por include de /api/users/profile (padrão e máximo pedido em "include=nome:N")
+    PERFIL_INCLUDE_LIMITE = int(os.environ.get('PERFIL_INCLUDE_LIMITE', 20))
+    PERFIL_INCLUDE_LIMITE_MAXIMO = int(os.environ.get('PERFIL_INCLUDE_LIMITE_MAXIMO', 100))
+
+    # Alunos por página na busca do professor (/api/professor/alunos/search)
+    BUSCA_MAX_POR_PAGINA = int(os.environ.get('BUSCA_MAX_POR_PAGINA', 50))
+    # Até quantos alunos nas turmas do professor a busca percorre os alunos sem consultar o índice FTS5
+    BUSCA_VARREDURA_MAX_ALUNOS = int(os.environ.get('BUSCA_VARREDURA_MAX_ALUNOS', 10000))
+
+    # Máximo de requisições GET agrupadas em uma chamada a /api/batch
+    BATCH_MAX_REQUESTS = int(os.environ.get('BATCH_MAX_REQUESTS', 20))
+
+    # Stream SSE do dashboard do professor (ver app/eventos.py)
+    SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 2))
+    SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+    SSE_MAX_DURATION = float(os.environ.get('SSE_MAX_DURATION', 25))
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 2000))
+    # Validade do token que abre o stream (o dashboard pede um novo a cada reconexão)
+    SSE_TOKEN_MAX_AGE = int(os.environ.get('SSE_TOKEN_MAX_AGE', 60))
+    # Desligado pelo gunicorn.conf.py no worker sync, em que cada stream ocuparia um worker inteiro
+    SSE_DISPONIVEL = True
+
+    # Log de consultas lentas (0 desativa)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'slow_queries.log'))
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUPS = int(os.environ.get('SLOW_QUERY_LOG_BACKUPS', 5))
+
 class DevelopmentConfig(Config):
     DEBUG = True
 
@@ -1,7 +1,7 @@
 #!/bin/sh
 
-echo "▶ Executando seed.py..."
-python seed.py
+echo "▶ Executando bootstrap do banco..."
+python bootstrap.py
 
 echo "🚀 Iniciando servidor Gunicorn..."
-gunicorn --bind 0.0.0.0:5000 run:app
+gunicorn -c gunicorn.conf.py run:app
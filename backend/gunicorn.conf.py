@@ -0,0 +1,90 @@
+"""
+Configuração do gunicorn, toda controlada por variáveis de ambiente.
+
+    GUNICORN_BIND                0.0.0.0:5000
+    GUNICORN_WORKERS             2 * núcleos + 1
+    GUNICORN_WORKER_CLASS        gthread (padrão) | gevent | sync (sem o stream SSE)
+    GUNICORN_THREADS             threads por worker no gthread (padrão 4)
+    GUNICORN_WORKER_CONNECTIONS  greenlets por worker no gevent (padrão 100)
+    GUNICORN_PRELOAD             carrega a aplicação no master antes do fork (padrão true)
+    GUNICORN_MAX_REQUESTS        recicla o worker após N requisições (padrão 1000, 0 desativa)
+    GUNICORN_MAX_REQUESTS_JITTER variação aleatória do limite acima (padrão 100)
+    GUNICORN_TIMEOUT             segundos (padrão 30)
+    GUNICORN_KEEPALIVE           segundos (padrão 5)
+    GUNICORN_WARMUP              aquece pool e caches em cada worker (padrão true)
+"""
+import multiprocessing
+import os
+import shutil
+
+
+def _bool(nome, padrao):
+    return os.environ.get(nome, str(padrao)).lower() in ('1', 'true', 'yes', 'sim')
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+preload_app = _bool('GUNICORN_PRELOAD', True)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+aquecer_workers = _bool('GUNICORN_WARMUP', True)
+
+if worker_class == 'gevent':
+    # Com preload_app a aplicação é importada no master, então o monkey patch
+    # precisa acontecer aqui, antes de qualquer import de socket/threading.
+    from gevent import monkey
+    monkey.patch_all()
+    # O psycopg2 é uma extensão em C: sem o callback do psycogreen, cada
+    # consulta ao Postgres bloquearia todos os greenlets do worker.
+    try:
+        import psycopg2  # noqa: F401
+    except ImportError:
+        pass  # SQLite local: nada a ajustar
+    else:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+
+# Diretório compartilhado pelos workers para agregar as métricas Prometheus.
+# Precisa estar no ambiente antes de qualquer worker importar prometheus_client.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/humaniq-metrics')
+
+
+def on_starting(server):
+    """Limpa métricas de execuções anteriores"""
+    diretorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Conexões herdadas do master não podem ser compartilhadas entre processos
+        from app import db
+        app = server.app.wsgi()
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # No worker sync cada stream SSE aberto ocuparia o processo inteiro por
+    # SSE_MAX_DURATION segundos: a rota responde 503 e o dashboard fica sem tempo real
+    if worker.cfg.worker_class_str == 'sync':
+        worker.wsgi.config['SSE_DISPONIVEL'] = False
+    if not aquecer_workers:
+        return
+    from app.warmup import aquecer
+    conexoes = threads if worker_class == 'gthread' else None
+    decorrido = aquecer(worker.wsgi, conexoes=conexoes)
+    worker.log.info('Worker %s aquecido em %.0f ms', worker.pid, decorrido * 1000)
+
+
+def child_exit(server, worker):
+    """Descarta os gauges 'live' do worker que saiu"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,258 @@
+"""
+Gerador de carga ponta a ponta para o backend HUMANIQ.
+
+Simula alunos fazendo o desafio da semana ao mesmo tempo
+(login -> /me -> /desafios/destaque -> iniciar -> submeter -> concluir)
+enquanto professores consultam o dashboard e o relatório da turma.
+
+Uso:
+    python loadtest.py --alunos 2000 --concorrencia 200
+    python loadtest.py --iniciar-servidor --workers 4 --alunos 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SENHA_PADRAO = 'carga123'
+
+
+class Estatisticas:
+    """Acumula latências e erros por etapa de forma thread-safe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.erros = {}
+
+    def registrar(self, etapa, segundos, ok):
+        with self._lock:
+            self.latencias.setdefault(etapa, []).append(segundos)
+            if not ok:
+                self.erros[etapa] = self.erros.get(etapa, 0) + 1
+
+    def relatorio(self, duracao):
+        linhas = []
+        cabecalho = f"{'etapa':<22}{'req':>8}{'erros':>8}{'% erro':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+        linhas.append(cabecalho)
+        linhas.append('-' * len(cabecalho))
+        total = 0
+        total_erros = 0
+        for etapa, valores in self.latencias.items():
+            valores = sorted(valores)
+            erros = self.erros.get(etapa, 0)
+            total += len(valores)
+            total_erros += erros
+            linhas.append(
+                f"{etapa:<22}{len(valores):>8}{erros:>8}"
+                f"{erros / len(valores) * 100:>7.1f}%"
+                f"{len(valores) / duracao:>9.1f}"
+                f"{percentil(valores, 50) * 1000:>9.1f}"
+                f"{percentil(valores, 95) * 1000:>9.1f}"
+                f"{percentil(valores, 99) * 1000:>9.1f}"
+                f"{valores[-1] * 1000:>9.1f}"
+            )
+        linhas.append('-' * len(cabecalho))
+        taxa_erro = (total_erros / total * 100) if total else 0
+        linhas.append(f"Total: {total} requisições em {duracao:.1f}s "
+                      f"({total / duracao:.1f} req/s), {total_erros} erros ({taxa_erro:.2f}%)")
+        return '\n'.join(linhas)
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por nearest-rank de uma lista já ordenada"""
+    if not valores_ordenados:
+        return 0
+    indice = max(0, int(round(p / 100 * len(valores_ordenados))) - 1)
+    return valores_ordenados[min(indice, len(valores_ordenados) - 1)]
+
+
+class Cliente:
+    """Sessão HTTP de um usuário virtual"""
+
+    def __init__(self, base_url, estatisticas, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.estatisticas = estatisticas
+        self.timeout = timeout
+        self.sessao = requests.Session()
+        self.token = None
+
+    def chamar(self, etapa, metodo, caminho, json=None, esperado=(200, 201)):
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        inicio = time.perf_counter()
+        try:
+            resposta = self.sessao.request(metodo, self.base_url + caminho, json=json,
+                                           headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self.estatisticas.registrar(etapa, time.perf_counter() - inicio, False)
+            return None
+        decorrido = time.perf_counter() - inicio
+        ok = resposta.status_code in esperado
+        if etapa:
+            self.estatisticas.registrar(etapa, decorrido, ok)
+        return resposta if ok else None
+
+    def login(self, email, senha, etapa='login'):
+        resposta = self.chamar(etapa, 'POST', '/api/auth/login', json={'email': email, 'senha': senha})
+        if resposta is None:
+            return False
+        self.token = resposta.json()['access_token']
+        return True
+
+
+def preparar_usuarios(args):
+    """Cria (idempotentemente) professores, turmas e alunos usados no teste"""
+    descartavel = Estatisticas()
+    codigos_turma = []
+    turmas_por_professor = []
+
+    for i in range(args.professores):
+        cliente = Cliente(args.base_url, descartavel, args.timeout)
+        email = f'carga-professor-{i}@humaniq.test'
+        cliente.chamar(None, 'POST', '/api/auth/register', json={
+            'nome': f'Professor Carga {i}', 'email': email,
+            'senha': SENHA_PADRAO, 'tipo_usuario': 'professor'
+        }, esperado=(201, 409))
+        if not cliente.login(email, SENHA_PADRAO, etapa=None):
+            sys.exit(f'Não foi possível autenticar {email}')
+
+        resposta = cliente.chamar(None, 'GET', '/api/professor/turmas')
+        turmas = resposta.json()['turmas'] if resposta is not None else []
+        if not turmas:
+            resposta = cliente.chamar(None, 'POST', '/api/professor/turmas',
+                                      json={'nome': f'Turma Carga {i}'})
+            turmas = [resposta.json()['turma']]
+        codigos_turma.append(turmas[0]['codigo'])
+        turmas_por_professor.append((email, turmas[0]['id']))
+
+    def preparar_aluno(i):
+        cliente = Cliente(args.base_url, descartavel, args.timeout)
+        email = f'carga-aluno-{i}@humaniq.test'
+        cliente.chamar(None, 'POST', '/api/auth/register', json={
+            'nome': f'Aluno Carga {i}', 'email': email, 'senha': SENHA_PADRAO
+        }, esperado=(201, 409))
+        if codigos_turma and cliente.login(email, SENHA_PADRAO, etapa=None):
+            cliente.chamar(None, 'POST', '/api/turma/entrar',
+                           json={'codigo': codigos_turma[i % len(codigos_turma)]},
+                           esperado=(200, 400))
+        return email
+
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        emails = list(executor.map(preparar_aluno, range(args.alunos)))
+
+    return emails, turmas_por_professor
+
+
+def fluxo_aluno(args, estatisticas, email):
+    """Fluxo do desafio semanal de um aluno"""
+    cliente = Cliente(args.base_url, estatisticas, args.timeout)
+    if not cliente.login(email, SENHA_PADRAO):
+        return
+    cliente.chamar('me', 'GET', '/api/users/me')
+
+    resposta = cliente.chamar('desafios/destaque', 'GET', '/api/desafios/destaque')
+    if resposta is None:
+        return
+    desafio = resposta.json()['desafio']
+    desafio_id = desafio['desafio_id']
+
+    cliente.chamar('iniciar', 'POST', f'/api/desafios/{desafio_id}/iniciar')
+    respostas_quiz = {str(p['id']): 0 for p in (desafio.get('perguntas') or [])}
+    cliente.chamar('submeter', 'POST', f'/api/desafios/{desafio_id}/submeter',
+                   json={'respostasQuiz': respostas_quiz})
+    cliente.chamar('concluir', 'POST', f'/api/desafios/{desafio_id}/concluir')
+
+
+def fluxo_professor(args, estatisticas, email, turma_id, parar):
+    """Professor atualizando dashboard e relatório enquanto os alunos trabalham"""
+    cliente = Cliente(args.base_url, estatisticas, args.timeout)
+    if not cliente.login(email, SENHA_PADRAO, etapa='login professor'):
+        return
+    while not parar.is_set():
+        cliente.chamar('professor/dashboard', 'GET', '/api/professor/dashboard')
+        cliente.chamar('professor/relatorio', 'GET', f'/api/professor/relatorio-turma/{turma_id}')
+        parar.wait(args.intervalo_professor)
+
+
+def aguardar_servidor(base_url, timeout=30):
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            if requests.get(base_url.rstrip('/') + '/api/ping', timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+def iniciar_servidor(args):
+    """Sobe um gunicorn local apontando para run:app"""
+    endereco = args.base_url.split('://', 1)[-1].rstrip('/')
+    comando = ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', endereco,
+               '--workers', str(args.workers), 'run:app']
+    print(f"Iniciando servidor: {' '.join(comando)}")
+    # Todos os alunos simulados saem do mesmo IP: sem isso o limite de login/registro os recusaria
+    ambiente = dict(os.environ, RATE_LIMIT_ENABLED='false')
+    processo = subprocess.Popen(comando, cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente)
+    if not aguardar_servidor(args.base_url):
+        processo.terminate()
+        sys.exit('Servidor não respondeu a /api/ping a tempo')
+    return processo
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do backend HUMANIQ')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--alunos', type=int, default=2000, help='Número de alunos virtuais')
+    parser.add_argument('--professores', type=int, default=5, help='Número de professores virtuais')
+    parser.add_argument('--concorrencia', type=int, default=100, help='Alunos simultâneos')
+    parser.add_argument('--intervalo-professor', type=float, default=1.0,
+                        help='Segundos entre atualizações do dashboard do professor')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Timeout por requisição (s)')
+    parser.add_argument('--iniciar-servidor', action='store_true',
+                        help='Sobe um gunicorn local antes do teste')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do gunicorn com --iniciar-servidor')
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(args) if args.iniciar_servidor else None
+    try:
+        print(f"Preparando {args.professores} professores e {args.alunos} alunos...")
+        emails, turmas_por_professor = preparar_usuarios(args)
+
+        estatisticas = Estatisticas()
+        parar = threading.Event()
+        professores = [
+            threading.Thread(target=fluxo_professor,
+                             args=(args, estatisticas, email, turma_id, parar), daemon=True)
+            for email, turma_id in turmas_por_professor
+        ]
+
+        print(f"Executando fluxo de {len(emails)} alunos com concorrência {args.concorrencia}...")
+        inicio = time.perf_counter()
+        for thread in professores:
+            thread.start()
+        with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+            list(executor.map(lambda email: fluxo_aluno(args, estatisticas, email), emails))
+        parar.set()
+        for thread in professores:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        print()
+        print(estatisticas.relatorio(duracao))
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -8,4 +8,8 @@ config_name = os.environ.get('FLASK_CONFIG', 'default')
 app = create_app(config_name)
 
 if __name__ == '__main__':
+    # Servidor de desenvolvimento: garante o schema antes de subir
+    from bootstrap import executar_bootstrap
+    with app.app_context():
+        executar_bootstrap()
     app.run(host='0.0.0.0', port=5000)
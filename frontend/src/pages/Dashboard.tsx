@@ -6,7 +6,7 @@ import Layout from '../components/Layout';
 import Card from '../components/Card';
 import Button from '../components/Button';
 import { useAuth } from '../contexts/AuthContext';
-import api from '../services/api';
+import { batchGet } from '../services/api';
 
 interface Challenge {
   desafio_id: number;
@@ -39,39 +39,40 @@ const Dashboard: React.FC = () => {
     const fetchDashboardData = async () => {
       setLoading(true);
       try {
-        // Buscar desafio da semana
-        try {
-          const challengeResponse = await api.get('/desafios/destaque');
-          setWeeklyChallenge(challengeResponse.data.desafio);
-        } catch (err) {
+        // Desafio da semana, desafios recentes e progresso em uma única chamada
+        const respostas = await batchGet(['/desafios/destaque', '/desafios', '/users/me']);
+        
+        const destaque = respostas['/desafios/destaque'];
+        if (destaque.status === 200) {
+          setWeeklyChallenge(destaque.body.desafio);
+        } else {
           console.log('Nenhum desafio em destaque');
         }
         
-        // Buscar desafios recentes
-        try {
-          const recentResponse = await api.get('/desafios');
+        const recentes = respostas['/desafios'];
+        const desafiosRecentes = recentes.status === 200 ? recentes.body.desafios || [] : [];
+        if (recentes.status === 200) {
           setRecentChallenges(
-            (recentResponse.data.desafios || []).map((d: any) => ({
+            desafiosRecentes.map((d: any) => ({
               ...d,
               concluido: d.progresso?.status === 'concluído'
             }))
           );
-        } catch (err) {
+        } else {
           console.log('Erro ao buscar desafios');
         }
         
-        // Buscar progresso do usuário
-        try {
-          const progressResponse = await api.get('/users/me');
+        const me = respostas['/users/me'];
+        if (me.status === 200) {
           setProgress({
-            desafios_concluidos: progressResponse.data.usuario.desafios_concluidos || 0,
-            totalDesafios: recentChallenges.length || 0,
-            sequencia: progressResponse.data.usuario.sequencia || 0,
-            nivel: progressResponse.data.usuario.nivel || 1,
-            xp: progressResponse.data.usuario.xp || 0,
-            proximo_nivel_xp: progressResponse.data.usuario.proximo_nivel_xp || 20
+            desafios_concluidos: me.body.usuario.desafios_concluidos || 0,
+            totalDesafios: desafiosRecentes.length || 0,
+            sequencia: me.body.usuario.sequencia || 0,
+            nivel: me.body.usuario.nivel || 1,
+            xp: me.body.usuario.xp || 0,
+            proximo_nivel_xp: me.body.usuario.proximo_nivel_xp || 20
           });
-        } catch (err) {
+        } else {
           console.log('Erro ao buscar progresso');
         }
         
@@ -37,6 +37,7 @@ const DashboardProfessor: React.FC = () => {
   const [estatisticas, setEstatisticas] = useState<Estatisticas | null>(null);
   const [turmas, setTurmas] = useState<Turma[]>([]);
   const [loading, setLoading] = useState(true);
+  const [ultimoEvento, setUltimoEvento] = useState<number | null>(null);
   const { user } = useAuth();
   const navigate = useNavigate();
 
@@ -44,11 +45,76 @@ const DashboardProfessor: React.FC = () => {
     carregarDashboard();
   }, []);
 
+  // Atualizações em tempo real: o backend publica deltas via SSE a partir do
+  // último evento refletido no dashboard carregado. O EventSource não envia o
+  // header Authorization: cada conexão usa um token de stream de curta duração,
+  // e a reconexão é feita aqui (com token novo) em vez da automática do navegador.
+  useEffect(() => {
+    if (ultimoEvento === null) return;
+
+    let fonte: EventSource | null = null;
+    let espera: ReturnType<typeof setTimeout> | undefined;
+    let encerrado = false;
+    let ultimo = ultimoEvento;
+
+    const aplicarDelta = (evento: MessageEvent) => {
+      ultimo = Number(evento.lastEventId) || ultimo;
+      const { turma_id, delta } = JSON.parse(evento.data);
+      setEstatisticas((atual) => {
+        if (!atual) return atual;
+        const total_alunos = atual.total_alunos + (delta.total_alunos || 0);
+        const alunos_com_teste = atual.alunos_com_teste + (delta.alunos_com_teste || 0);
+        return {
+          ...atual,
+          total_alunos,
+          alunos_com_teste,
+          taxa_conclusao_teste: total_alunos > 0 ? (alunos_com_teste / total_alunos) * 100 : 0
+        };
+      });
+      if (delta.total_alunos) {
+        setTurmas((atuais) =>
+          atuais.map((turma) =>
+            turma.id === turma_id ? { ...turma, total_alunos: turma.total_alunos + delta.total_alunos } : turma
+          )
+        );
+      }
+    };
+    const tipos = ['aluno_entrou', 'aluno_saiu', 'teste_concluido', 'desafio_concluido'];
+
+    const conectar = async () => {
+      let token: string;
+      try {
+        token = (await api.post('/professor/eventos/token')).data.token;
+      } catch (error) {
+        // 503: servidor sem suporte ao stream; o dashboard fica com os dados carregados
+        return;
+      }
+      if (encerrado) return;
+      fonte = new EventSource(
+        `${api.defaults.baseURL}/professor/eventos?token=${encodeURIComponent(token)}&last_event_id=${ultimo}`
+      );
+      tipos.forEach((tipo) => fonte!.addEventListener(tipo, aplicarDelta as EventListener));
+      fonte.onerror = () => {
+        // Fim do stream (SSE_MAX_DURATION) ou queda: reconecta com um token novo
+        fonte?.close();
+        if (!encerrado) espera = setTimeout(conectar, 2000);
+      };
+    };
+    conectar();
+
+    return () => {
+      encerrado = true;
+      clearTimeout(espera);
+      fonte?.close();
+    };
+  }, [ultimoEvento]);
+
   const carregarDashboard = async () => {
     try {
       const response = await api.get('/professor/dashboard');
       setEstatisticas(response.data.estatisticas);
       setTurmas(response.data.turmas);
+      setUltimoEvento(response.data.ultimo_evento ?? 0);
     } catch (error) {
       console.error('Erro ao carregar dashboard:', error);
     } finally {
@@ -98,19 +98,19 @@ const Profile: React.FC = () => {
       setLoading(true);
       try {
         // Buscar dados do perfil
-        const profileResponse = await api.get('/users/profile'); // Ajustado para `/profile`
+        const profileResponse = await api.get('/users/profile', { params: { include: '' } }); // Só o cabeçalho do perfil
         setProfile(profileResponse.data.perfil);
         setEditName(profileResponse.data.perfil.nome);
         setEditEmail(profileResponse.data.perfil.email);
         
-        // Buscar progresso do usuário
-        const progressResponse = await api.get('/users/progresso'); // Ajustado para `/progresso`
+        // Buscar a evolução do usuário agrupada por semana (um ponto por semana com conclusões)
+        const progressResponse = await api.get('/users/progresso/serie', { params: { periodo: 'semana' } });
         const chartData: ProgressData = {
-          labels: progressResponse.data.progresso.resultados.map((r: any) => r.data_conclusao),
+          labels: progressResponse.data.serie.map((p: any) => new Date(`${p.inicio}T00:00:00`).toLocaleDateString('pt-BR')),
           datasets: [
             {
               label: 'XP Acumulado',
-              data: progressResponse.data.progresso.resultados.map((r: any) => r.pontuacao),
+              data: progressResponse.data.serie.map((p: any) => p.xp_acumulado),
               borderColor: '#9340FF',
               backgroundColor: 'rgba(147, 64, 255, 0.2)',
             },
@@ -307,7 +307,7 @@ const Profile: React.FC = () => {
       setIsEditing(false);
       
       // Atualizar o perfil exibido
-      const profileResponse = await api.get('/users/profile');
+      const profileResponse = await api.get('/users/profile', { params: { include: '' } }); // Só o cabeçalho do perfil
       setProfile(profileResponse.data);
       
       // Limpar campos de senha
@@ -27,7 +27,7 @@ const ProfileProfessor: React.FC = () => {
     const fetchProfile = async () => {
       setLoading(true);
       try {
-        const res = await api.get('/users/profile');
+        const res = await api.get('/users/profile', { params: { include: '' } }); // Só o cabeçalho do perfil
         setEditName(res.data.perfil.nome);
         setEditEmail(res.data.perfil.email);
       } catch {
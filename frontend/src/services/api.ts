@@ -41,4 +41,23 @@ api.interceptors.response.use(
   }
 );
 
+export interface BatchResponse<T = any> {
+  id: string | number;
+  status: number;
+  body: T;
+}
+
+// Executa várias requisições GET em uma única chamada a /api/batch.
+// Retorna as respostas indexadas pelo caminho pedido (ex.: '/users/me').
+export const batchGet = async (paths: string[]): Promise<Record<string, BatchResponse>> => {
+  const response = await api.post('/batch', {
+    requests: paths.map((path) => ({ id: path, path })),
+  });
+  const responses: Record<string, BatchResponse> = {};
+  for (const item of response.data.responses as BatchResponse[]) {
+    responses[item.id] = item;
+  }
+  return responses;
+};
+
 export default api;
\ No newline at end of file
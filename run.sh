@@ -15,8 +15,8 @@ echo ""
 echo "📱 Frontend: http://localhost:3000"
 echo "🔌 Backend API: http://localhost:5000"
 echo ""
-echo "💾 Para inicializar o banco de dados, execute:"
-echo "docker compose exec backend python seed.py"
+echo "💾 O banco é inicializado automaticamente (bootstrap.py). Para forçar, execute:"
+echo "docker compose exec backend python bootstrap.py --forcar"
 echo ""
 echo "⏹️ Para parar os serviços, execute:"
 echo "docker compose down"